@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+⏱️ Keyboard/template micro-benchmark
+Compares building reply markup and welcome text per update (the old way)
+against the prebuilt registry. Run: python benchmarks/bench_templates.py
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from templates import KeyboardRegistry, WELCOME_TEXT
+
+ITERATIONS = 20000
+
+
+def per_update(name: str):
+    keyboard = [
+        [InlineKeyboardButton("🎲 Roll Dice", callback_data="roll"),
+         InlineKeyboardButton("🎮 Play Game", callback_data="game")],
+        [InlineKeyboardButton("😂 Tell Joke", callback_data="joke"),
+         InlineKeyboardButton("🤓 Fun Fact", callback_data="fact")],
+        [InlineKeyboardButton("🧠 Quick Quiz", callback_data="quiz"),
+         InlineKeyboardButton("🐱 Cute Animal", callback_data="animal")],
+        [InlineKeyboardButton("📊 My Stats", callback_data="stats"),
+         InlineKeyboardButton("❓ Help", callback_data="help")]
+    ]
+    return WELCOME_TEXT.text.format(name=name), InlineKeyboardMarkup(keyboard)
+
+
+def prebuilt(registry: KeyboardRegistry, name: str):
+    return WELCOME_TEXT.render(name=name), registry.main_menu
+
+
+def measure(label: str, func, *args):
+    started = time.perf_counter()
+    for _ in range(ITERATIONS):
+        func(*args)
+    elapsed = time.perf_counter() - started
+
+    # Peak memory allocated while handling a single update
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{label:<12} {elapsed / ITERATIONS * 1e6:8.2f} µs/update  {peak - baseline:6d} bytes allocated/update")
+
+
+def main():
+    registry = KeyboardRegistry()
+    measure("per-update", per_update, "Alice")
+    measure("prebuilt", prebuilt, registry, "Alice")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+🏋️ Offline load test
+Feeds synthetic updates through the Application built by setup_application,
+with a local fake Bot API server standing in for Telegram, and reports
+throughput, p50/p99 latency and memory growth per update kind, and where
+the time went by handler (the names given to metrics.instrument).
+
+    python benchmarks/loadtest.py --updates 2000 --output baseline.json
+    python benchmarks/loadtest.py --compare baseline.json
+
+tracemalloc stays on for the whole run, so absolute numbers are lower
+than production; compare runs made with the same options.
+"""
+
+import argparse
+import asyncio
+import gc
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Configure the bot for an isolated, offline run before importing it
+TOKEN = '123456:LOADTEST'
+os.environ['BOT_TOKEN'] = TOKEN
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='bot-loadtest-'))
+os.environ.setdefault('USER_STORE', 'memory')
+os.environ['METRICS_PORT'] = '0'
+
+from aiohttp import web
+from telegram import Update
+from telegram.ext import TypeHandler
+
+import bot as bot_module
+from outbound import OutboundLimiter
+from throttle import InboundThrottle
+
+# Per-request INFO logs would dominate the measurement
+logging.getLogger().setLevel(logging.WARNING)
+logging.getLogger('httpx').setLevel(logging.WARNING)
+
+COMMANDS = ['/start', '/help', '/joke', '/fact', '/quote', '/animal', '/math 12*(3+4)', '/stats', '/leaderboard', '/about']
+TEXTS = ['hello there', 'how are you', 'thanks, awesome bot', '12+30', 'what is this']
+CALLBACKS = ['joke', 'fact', 'animal', 'quote', 'stats', 'help', 'quiz']
+DEFAULT_MIX = 'command=4,text=3,callback=2,guess=1'
+
+
+class FakeBotAPI:
+    """Minimal Bot API server: answers every method with a plausible result"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = {}
+        self._message_ids = itertools.count(1000)
+        self._runner = None
+        self.base_url = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f'http://127.0.0.1:{port}/bot'
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+    async def _handle(self, request):
+        method = request.match_info['method']
+        self.calls[method] = self.calls.get(method, 0) + 1
+        if self.latency:
+            # Simulated network round trip to Telegram
+            await asyncio.sleep(self.latency)
+        if request.content_type == 'application/json':
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+
+        if method == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'LoadTest', 'username': 'loadtest_bot'}
+        elif method in ('sendMessage', 'editMessageText'):
+            chat_id = int(params.get('chat_id') or 1)
+            result = {
+                'message_id': int(params.get('message_id') or next(self._message_ids)),
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'text': params.get('text', ''),
+            }
+        else:
+            result = True
+        return web.json_response({'ok': True, 'result': result})
+
+
+class UpdateFactory:
+    """Builds synthetic update payloads"""
+
+    def __init__(self, users: int):
+        self.users = list(range(10_000, 10_000 + users))
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._guess_plans = {}
+
+    def _user(self, user_id: int) -> dict:
+        return {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}'}
+
+    def message(self, user_id: int, text: str) -> dict:
+        message = {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': self._user(user_id),
+            'text': text,
+        }
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        return {'update_id': next(self._update_ids), 'message': message}
+
+    def callback(self, user_id: int, data: str) -> dict:
+        update_id = next(self._update_ids)
+        return {
+            'update_id': update_id,
+            'callback_query': {
+                'id': str(update_id),
+                'from': self._user(user_id),
+                'chat_instance': str(user_id),
+                'data': data,
+                'message': {
+                    'message_id': next(self._message_ids),
+                    'date': int(time.time()),
+                    'chat': {'id': user_id, 'type': 'private'},
+                    'text': 'menu',
+                },
+            },
+        }
+
+    def make(self, kind: str) -> dict:
+        user_id = random.choice(self.users)
+        if kind == 'command':
+            return self.message(user_id, random.choice(COMMANDS))
+        if kind == 'text':
+            return self.message(user_id, random.choice(TEXTS))
+        if kind == 'callback':
+            return self.callback(user_id, random.choice(CALLBACKS))
+        if kind == 'dice':
+            return self.message(user_id, '/roll')
+        if kind == 'guess':
+            # Each user cycles through /game followed by three guesses
+            plan = self._guess_plans.get(user_id)
+            if not plan:
+                plan = self._guess_plans[user_id] = ['/game'] + [str(random.randint(1, 10)) for _ in range(3)]
+            return self.message(user_id, plan.pop(0))
+        raise ValueError(f"Unknown update kind: {kind}")
+
+
+class Harness:
+    """Runs phases of updates through the application and collects results"""
+
+    def __init__(self, application, factory: UpdateFactory, concurrency: int, metrics):
+        self.application = application
+        self.metrics = metrics
+        self.factory = factory
+        self.concurrency = concurrency
+        self._pending = {}
+        self._latencies = []
+        self._slots = None
+        application.add_handler(TypeHandler(Update, self._done), group=1000)
+
+    async def _done(self, update, context):
+        started = self._pending.pop(update.update_id, None)
+        if started is not None:
+            self._latencies.append(time.perf_counter() - started)
+            self._slots.release()
+
+    async def run_phase(self, kinds, weights, count: int) -> dict:
+        self._latencies = []
+        self._slots = asyncio.Semaphore(self.concurrency)
+        payloads = [self.factory.make(kind) for kind in random.choices(kinds, weights, k=count)]
+        updates = [Update.de_json(payload, self.application.bot) for payload in payloads]
+
+        gc.collect()
+        memory_before, _ = tracemalloc.get_traced_memory()
+        handlers_before = self.metrics.handler_latency.snapshot()
+        started = time.perf_counter()
+        for update in updates:
+            await self._slots.acquire()
+            self._pending[update.update_id] = time.perf_counter()
+            await self.application.update_queue.put(update)
+        while self._pending:
+            await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - started
+        handlers = self.handler_breakdown(handlers_before, self.metrics.handler_latency.snapshot())
+        gc.collect()
+        memory_after, _ = tracemalloc.get_traced_memory()
+
+        latencies = sorted(self._latencies)
+        return {
+            'updates': count,
+            'seconds': round(elapsed, 4),
+            'throughput': round(count / elapsed, 2),
+            'p50_ms': round(latencies[len(latencies) // 2] * 1000, 3),
+            'p99_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 3),
+            'memory_growth_kb': round((memory_after - memory_before) / 1024, 1),
+            'handlers': handlers,
+        }
+
+    def handler_breakdown(self, before: dict, after: dict) -> dict:
+        """Calls, mean and p99 bucket of each handler during a phase, most total time first"""
+        buckets = self.metrics.handler_latency.buckets
+        handlers = []
+        for (name,), series in after.items():
+            old = before.get((name,), [0] * len(series))
+            delta = [new - was for new, was in zip(series, old)]
+            calls = delta[-1]
+            if not calls:
+                continue
+            # Upper bound of the bucket holding the 99th percentile call
+            p99_le = None
+            for bound, cumulative in zip(buckets, itertools.accumulate(delta[:-2])):
+                if cumulative >= calls * 0.99:
+                    p99_le = bound * 1000
+                    break
+            handlers.append((delta[-2], name, {
+                'calls': calls,
+                'total_ms': round(delta[-2] * 1000, 3),
+                'mean_ms': round(delta[-2] / calls * 1000, 3),
+                'p99_le_ms': p99_le,
+            }))
+        return {name: stats for _, name, stats in sorted(handlers, key=lambda item: item[0], reverse=True)}
+
+
+def print_phase(kind: str, result: dict):
+    summary = {key: value for key, value in result.items() if key != 'handlers'}
+    print(f"{kind:<10} {json.dumps(summary)}")
+    for name, stats in result['handlers'].items():
+        p99 = f"<={stats['p99_le_ms']:g}ms" if stats['p99_le_ms'] is not None else '>10s'
+        print(f"    {name:<20} {stats['calls']:>6} calls  mean {stats['mean_ms']:>9.3f}ms  p99 {p99}")
+
+
+def parse_mix(text: str):
+    kinds, weights = [], []
+    for part in text.split(','):
+        kind, _, weight = part.partition('=')
+        kinds.append(kind.strip())
+        weights.append(float(weight or 1))
+    return kinds, weights
+
+
+async def run(args) -> dict:
+    random.seed(args.seed)
+    fake = FakeBotAPI(args.api_latency)
+    await fake.start()
+
+    bot = bot_module.MyAwesomeBot()
+    if not args.real_limits:
+        # Measure handler cost, not Telegram's flood limits
+        bot.outbound = OutboundLimiter(global_rate=1e9, chat_rate=1e9, chat_burst=1e9)
+        bot.outbound.on_api_call = bot.observe_api_call
+    # Throttled updates never reach the harness's completion handler
+    bot.throttle = InboundThrottle(limit=0, press_window=0)
+    application = bot.setup_application(base_url=fake.base_url)
+    harness = Harness(application, UpdateFactory(args.users), args.concurrency, bot.metrics)
+
+    tracemalloc.start()
+    await application.initialize()
+    await application.post_init(application)
+    await application.start()
+
+    kinds, weights = parse_mix(args.mix)
+    phases = {}
+    for kind in kinds:
+        phases[kind] = await harness.run_phase([kind], [1], args.updates)
+        print_phase(kind, phases[kind])
+    phases['mixed'] = await harness.run_phase(kinds, weights, args.updates)
+    print_phase('mixed', phases['mixed'])
+
+    await application.stop()
+    await application.post_stop(application)
+    await application.shutdown()
+    await application.post_shutdown(application)
+    tracemalloc.stop()
+    await fake.stop()
+
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'updates_per_phase': args.updates,
+            'users': args.users,
+            'concurrency': args.concurrency,
+            'mix': args.mix,
+            'real_limits': args.real_limits,
+            'api_latency': args.api_latency,
+            'api_calls': fake.calls,
+        },
+        'phases': phases,
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> int:
+    """Print per-phase deltas; return the number of regressions"""
+    regressions = 0
+    for phase, result in current['phases'].items():
+        old = baseline['phases'].get(phase)
+        if not old:
+            continue
+        throughput = result['throughput'] / old['throughput'] - 1
+        p99 = result['p99_ms'] / old['p99_ms'] - 1 if old['p99_ms'] else 0.0
+        regressed = throughput < -tolerance or p99 > tolerance
+        regressions += regressed
+        print(f"{phase:<10} throughput {throughput:+.1%}  p99 {p99:+.1%}{'  ⚠️ REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--updates', type=int, default=1000, help='updates per phase')
+    parser.add_argument('--users', type=int, default=200, help='distinct synthetic users')
+    parser.add_argument('--concurrency', type=int, default=64, help='max updates in flight')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='kind=weight list (kinds: command, text, callback, guess, dice)')
+    parser.add_argument('--api-latency', type=float, default=0.05, help='simulated Bot API round trip in seconds')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--real-limits', action='store_true', help="keep the outbound limiter's Telegram rates")
+    parser.add_argument('--output', help='write results as JSON (a baseline for --compare)')
+    parser.add_argument('--compare', help='baseline JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='allowed relative regression')
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
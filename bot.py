@@ -6,192 +6,211 @@ Created with ❤️ for the community
 """
 
 import os
+import re
 import logging
 import random
 import asyncio
-import aiohttp
+import time
 from datetime import datetime
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes
-
-# Configure logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+from telegram import MessageEntity, Update
+from telegram.ext import Application, ApplicationHandlerStop, CommandHandler, MessageHandler, CallbackQueryHandler, TypeHandler, filters, ContextTypes
+from telegram.error import TelegramError
+
+from reminders import ReminderStore, ReminderScheduler
+from sessions import NumberGuessSession, create_session_store
+from storage import UserStats, create_backend
+from outbound import OutboundLimiter, animation_frame
+from router import CallbackRouter
+from processing import ChatOrderedUpdateProcessor
+from intents import IntentMatcher
+from metrics import Metrics, MetricsServer
+from catalog import CatalogError, ContentCatalog
+from quiz import QuizEngine, DIFFICULTIES, decode_answer
+from stats import StatsEngine
+from throttle import InboundThrottle, ALLOWED, THROTTLED
+from broadcast import Broadcaster
+from lifecycle import Lifecycle, SETUP_METHODS
+import logs
+from templates import KeyboardRegistry, RenderCache, WELCOME_TEXT, HELP_TEXT, ABOUT_TEXT, QUOTE_TEXT, STATS_TEXT
+
+# Configure logging: JSON records written off the event loop (LOG_* settings)
+log_pipeline = logs.setup_from_env()
 logger = logging.getLogger(__name__)
 
 # Bot configuration
 BOT_TOKEN = os.environ.get('BOT_TOKEN')
 PORT = int(os.environ.get('PORT', 8000))
 WEBHOOK_URL = os.environ.get('WEBHOOK_URL', '')
+DATA_DIR = os.environ.get('DATA_DIR', 'data')
+INTENTS_FILE = os.environ.get('INTENTS_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'intents.json'))
+CONTENT_DIR = os.environ.get('CONTENT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'content'))
+CATALOG_RELOAD_INTERVAL = float(os.environ.get('CATALOG_RELOAD_INTERVAL', 30))
+RENDER_CACHE_BYTES = int(os.environ.get('RENDER_CACHE_BYTES', 4 * 1024 * 1024))
+QUIZ_ROUND_LENGTH = int(os.environ.get('QUIZ_ROUND_LENGTH', 5))
+# Relative weights of easy, medium and hard questions
+QUIZ_DIFFICULTY_WEIGHTS = dict(zip(DIFFICULTIES, (float(w) for w in os.environ.get('QUIZ_DIFFICULTY_WEIGHTS', '3,2,1').split(','))))
+SESSION_TTL = int(os.environ.get('SESSION_TTL', 900))
+MAX_SESSIONS = int(os.environ.get('MAX_SESSIONS', 10000))
+MAX_USERS = int(os.environ.get('MAX_USERS', 100000))
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', MAX_USERS))
+SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'memory')
+WORKERS = int(os.environ.get('WORKERS', 1))
+WEATHER_API_KEY = os.environ.get('WEATHER_API_KEY', '')
+WEATHER_PROVIDER = os.environ.get('WEATHER_PROVIDER', 'openweathermap')
+WEATHER_CACHE_TTL = int(os.environ.get('WEATHER_CACHE_TTL', 600))
+USER_STORE = os.environ.get('USER_STORE', 'sqlite')
+STATS_FLUSH_INTERVAL = float(os.environ.get('STATS_FLUSH_INTERVAL', 5))
+# Event log size at which it is folded into the stats checkpoint
+STATS_COMPACT_BYTES = int(os.environ.get('STATS_COMPACT_BYTES', 2 * 1024 * 1024))
+MATH_WORKERS = int(os.environ.get('MATH_WORKERS', 0))
+MAX_CONCURRENT_UPDATES = int(os.environ.get('MAX_CONCURRENT_UPDATES', 64))
+MAX_PENDING_PER_CHAT = int(os.environ.get('MAX_PENDING_PER_CHAT', 20))
+MAX_PENDING_UPDATES = int(os.environ.get('MAX_PENDING_UPDATES', 5000))
+METRICS_HOST = os.environ.get('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.environ.get('METRICS_PORT', 9000))
+THROTTLE_LIMIT = float(os.environ.get('THROTTLE_LIMIT', 30))
+THROTTLE_WINDOW = float(os.environ.get('THROTTLE_WINDOW', 60))
+PRESS_DEDUPE_WINDOW = float(os.environ.get('PRESS_DEDUPE_WINDOW', 1.0))
+# Users allowed to /broadcast, as comma-separated Telegram user ids
+ADMIN_IDS = frozenset(int(user_id) for user_id in os.environ.get('ADMIN_IDS', '').replace(',', ' ').split())
+BROADCAST_RATE = float(os.environ.get('BROADCAST_RATE', 25))
+BROADCAST_CHUNK_SIZE = int(os.environ.get('BROADCAST_CHUNK_SIZE', 500))
+# Seconds in-flight updates get to finish after SIGTERM
+DRAIN_TIMEOUT = float(os.environ.get('DRAIN_TIMEOUT', 15))
+
+# Dice animation: full (3 frames), single (one frame) or none
+DICE_ANIMATION_MODES = ('full', 'single', 'none')
+DICE_ANIMATION = os.environ.get('DICE_ANIMATION', 'full')
+DICE_DEGRADE_QUEUE_DEPTH = int(os.environ.get('DICE_DEGRADE_QUEUE_DEPTH', 20))
+DICE_DEGRADE_ERROR_RATE = float(os.environ.get('DICE_DEGRADE_ERROR_RATE', 0.05))
+
+MATH_CHARS = re.compile(r'[^\d+\-*/().\s]')
+
+# Bounded in-memory storage (for free hosting)
+game_sessions = create_session_store(
+    SESSION_BACKEND,
+    os.path.join(DATA_DIR, 'sessions.db'),
+    max_size=MAX_SESSIONS,
+    ttl=SESSION_TTL
+)
+
+def command_argument(message) -> str:
+    """Text after the leading /command, with its line breaks and spacing kept
 
-# Simple in-memory storage (for free hosting)
-user_data = {}
-game_sessions = {}
+    context.args splits on whitespace, which would flatten multi-line text.
+    Entity offsets count UTF-16 code units.
+    """
+    text = message.text or ''
+    for entity in message.entities:
+        if entity.type == MessageEntity.BOT_COMMAND and entity.offset == 0:
+            end = 2 * (entity.offset + entity.length)
+            rest = text.encode('utf-16-le')[end:].decode('utf-16-le')
+            return rest[1:] if rest[:1] in (' ', '\n') else rest
+    return text
 
 class MyAwesomeBot:
-    def __init__(self):
-        self.jokes = [
-            "Why don't scientists trust atoms? Because they make up everything! 😂",
-            "What do you call a bear with no teeth? A gummy bear! 🐻",
-            "Why did the math book look sad? It had too many problems! 📚",
-            "What do you call a sleeping bull? A bulldozer! 😴",
-            "Why don't eggs tell jokes? They'd crack each other up! 🥚",
-            "What's orange and sounds like a parrot? A carrot! 🥕",
-            "Why did the cookie go to the doctor? Because it felt crumbly! 🍪",
-            "What do you call a dinosaur that loves to sleep? A dino-snore! 🦕"
-        ]
-        
-        self.fun_facts = [
-            "🐙 Octopuses have three hearts and blue blood!",
-            "🍯 Honey never spoils - archaeologists have found 3000-year-old honey that's still edible!",
-            "🐧 Penguins can jump 6 feet in the air!",
-            "🌙 A day on Venus is longer than its year!",
-            "🦋 Butterflies taste with their feet!",
-            "🐨 Koalas sleep 20-22 hours per day!",
-            "🌟 There are more stars in the universe than grains of sand on all Earth's beaches!",
-            "🐬 Dolphins have names for each other!",
-            "🌍 Earth is the only planet not named after a god!",
-            "🧠 Your brain uses about 20% of your body's energy!"
-        ]
-        
-        self.animals = [
-            ("🐶", "Dog"), ("🐱", "Cat"), ("🐰", "Rabbit"), ("🐼", "Panda"),
-            ("🐨", "Koala"), ("🦊", "Fox"), ("🐸", "Frog"), ("🐧", "Penguin"),
-            ("🦋", "Butterfly"), ("🐢", "Turtle"), ("🐝", "Bee"), ("🦁", "Lion"),
-            ("🐯", "Tiger"), ("🐺", "Wolf"), ("🦉", "Owl"), ("🐙", "Octopus")
-        ]
-        
-        self.quotes = [
-            ("The only way to do great work is to love what you do.", "Steve Jobs"),
-            ("Life is what happens to you while you're busy making other plans.", "John Lennon"),
-            ("The future belongs to those who believe in the beauty of their dreams.", "Eleanor Roosevelt"),
-            ("It is during our darkest moments that we must focus to see the light.", "Aristotle"),
-            ("The only impossible journey is the one you never begin.", "Tony Robbins"),
-            ("In the middle of every difficulty lies opportunity.", "Albert Einstein"),
-            ("Believe you can and you're halfway there.", "Theodore Roosevelt")
-        ]
-        
-        self.quiz_questions = [
-            {
-                "question": "What's the largest planet in our solar system?",
-                "options": ["🌍 Earth", "🪐 Jupiter", "🔴 Mars", "💫 Venus"],
-                "correct": 1,
-                "explanation": "Jupiter is the largest planet - it's so big that all other planets could fit inside it!"
-            },
-            {
-                "question": "How many hearts does an octopus have?",
-                "options": ["❤️ 1", "💕 2", "💖 3", "💝 4"],
-                "correct": 2,
-                "explanation": "Octopuses have 3 hearts! Two pump blood to the gills, one pumps to the rest of the body."
-            },
-            {
-                "question": "What's the fastest land animal?",
-                "options": ["🐆 Cheetah", "🦁 Lion", "🐎 Horse", "🐕 Greyhound"],
-                "correct": 0,
-                "explanation": "Cheetahs can run up to 70 mph (113 km/h) in short bursts!"
-            },
-            {
-                "question": "Which element has the chemical symbol 'Au'?",
-                "options": ["🥈 Silver", "🥇 Gold", "🔶 Copper", "⚡ Aluminum"],
-                "correct": 1,
-                "explanation": "Au comes from the Latin word 'aurum' meaning gold!"
-            }
-        ]
+    def __init__(self, shard=None):
+        # (index, count) when running as one of several scale-out workers
+        self.shard = shard
+        self.application = None
+        self.reminders = None
+        self.users = UserStats(
+            create_backend(USER_STORE, DATA_DIR),
+            cache_size=USER_CACHE_SIZE,
+            flush_interval=STATS_FLUSH_INTERVAL
+        )
+        self.stats = StatsEngine(
+            os.path.join(DATA_DIR, 'events.log'),
+            writer=shard[0] if shard else 0,
+            flush_interval=STATS_FLUSH_INTERVAL,
+            compact_bytes=STATS_COMPACT_BYTES
+        )
+        # Built on first use (math_engine, weather_service): rarely used, and aiohttp's client is slow to import
+        self.math = None
+        self.weather = None
+        self.metrics = Metrics()
+        self.metrics_server = None
+        self.outbound = OutboundLimiter()
+        self.outbound.on_api_call = self.observe_api_call
+        self.lifecycle = Lifecycle(
+            os.path.join(DATA_DIR, f'state-{shard[0]}.pickle' if shard else 'state.pickle'),
+            drain_timeout=DRAIN_TIMEOUT
+        )
+        self.update_processor = ChatOrderedUpdateProcessor(
+            max_concurrent_updates=MAX_CONCURRENT_UPDATES,
+            max_pending_per_chat=MAX_PENDING_PER_CHAT,
+            max_pending=MAX_PENDING_UPDATES
+        )
+        self.callback_router = None
+        self.throttle = InboundThrottle(
+            limit=THROTTLE_LIMIT,
+            window=THROTTLE_WINDOW,
+            press_window=PRESS_DEDUPE_WINDOW,
+            max_users=MAX_USERS
+        )
+        self.broadcaster = Broadcaster(
+            self.users,
+            os.path.join(DATA_DIR, f'broadcast-{shard[0]}.json' if shard else 'broadcast.json'),
+            rate=BROADCAST_RATE,
+            chunk_size=BROADCAST_CHUNK_SIZE,
+            on_finish=self.report_broadcast
+        )
+        self.intents = IntentMatcher.from_file(INTENTS_FILE)
+
+        self.content = ContentCatalog(
+            CONTENT_DIR,
+            os.path.join(DATA_DIR, 'catalog'),
+            reload_interval=CATALOG_RELOAD_INTERVAL,
+            max_users=MAX_SESSIONS,
+            ttl=SESSION_TTL
+        )
+        self.quiz = QuizEngine(
+            self.content,
+            round_length=QUIZ_ROUND_LENGTH,
+            weights=QUIZ_DIFFICULTY_WEIGHTS,
+            max_users=MAX_SESSIONS,
+            ttl=SESSION_TTL
+        )
+        
+        # Keyboards are immutable, so build them once and share them
+        self.keyboards = KeyboardRegistry()
+        # Pre-rendered /start and /stats texts
+        self.renders = RenderCache(max_bytes=RENDER_CACHE_BYTES)
 
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Welcome message with interactive menu"""
         user = update.effective_user
         
         # Store user data
-        user_data[user.id] = {
-            'name': user.first_name,
-            'username': user.username,
-            'joined': datetime.now().isoformat(),
-            'commands_used': user_data.get(user.id, {}).get('commands_used', 0)
-        }
-        
-        welcome_text = f"""
-🎉 **Welcome {user.first_name}!** 🎉
-
-I'm your friendly bot assistant! Here's what I can do:
-
-🎮 **Games & Fun:**
-• `/roll` - Roll a dice
-• `/game` - Number guessing game  
-• `/quiz` - Quick trivia questions
-• `/animal` - Random cute animal
-• `/joke` - Funny jokes
-• `/fact` - Amazing fun facts
-
-🔧 **Useful Tools:**
-• `/math` - Simple calculator
-• `/weather` - Weather information
-• `/quote` - Daily inspiration
-• `/reminder` - Set reminders
-• `/help` - Show all commands
-
-✨ **Just send me any message and I'll chat with you!**
-
-Try clicking the buttons below! 👇
-        """
+        await self.users.save_profile(user.id, user.first_name, user.username, datetime.now().isoformat())
+        self.renders.invalidate('stats', user.id)
         
-        keyboard = [
-            [InlineKeyboardButton("🎲 Roll Dice", callback_data="roll"),
-             InlineKeyboardButton("🎮 Play Game", callback_data="game")],
-            [InlineKeyboardButton("😂 Tell Joke", callback_data="joke"),
-             InlineKeyboardButton("🤓 Fun Fact", callback_data="fact")],
-            [InlineKeyboardButton("🧠 Quick Quiz", callback_data="quiz"),
-             InlineKeyboardButton("🐱 Cute Animal", callback_data="animal")],
-            [InlineKeyboardButton("📊 My Stats", callback_data="stats"),
-             InlineKeyboardButton("❓ Help", callback_data="help")]
-        ]
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await update.message.reply_text(welcome_text, parse_mode='Markdown', reply_markup=reply_markup)
+        # Depends only on the name, so users with the same first name share it
+        welcome_text = self.renders.render(
+            'welcome', user.first_name, (), lambda: WELCOME_TEXT.render(name=user.first_name)
+        )
+        await update.effective_message.reply_text(welcome_text, parse_mode='Markdown', reply_markup=self.keyboards.main_menu)
 
     async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Show all available commands"""
-        help_text = """
-🤖 **Bot Commands Help** 🤖
-
-**🎮 Games & Entertainment:**
-• `/roll` - Roll a 6-sided dice
-• `/game` - Start number guessing game
-• `/quiz` - Quick trivia questions
-• `/joke` - Get a random joke
-• `/fact` - Learn something amazing
-• `/animal` - See a cute animal
-
-**🔧 Utility Commands:**
-• `/math <expression>` - Calculate math
-• `/weather <city>` - Get weather info
-• `/quote` - Daily inspiration
-• `/reminder <min> <text>` - Set reminder
-• `/stats` - Your personal statistics
-• `/about` - About this bot
-
-**💬 Chat Features:**
-• Send any text for friendly responses
-• Send math like "10+5" and I'll solve it
-• Ask questions and I'll try to help!
-
-Made with ❤️ for you! Need help? Just ask! 😊
-        """
-        await update.message.reply_text(help_text, parse_mode='Markdown')
+        await update.effective_message.reply_text(HELP_TEXT, parse_mode='Markdown')
+
+    def dice_animation_mode(self) -> str:
+        """Pick the dice animation, degrading one step per overloaded signal"""
+        modes = DICE_ANIMATION_MODES
+        level = modes.index(DICE_ANIMATION) if DICE_ANIMATION in modes else 0
+        if self.outbound.queue_depth >= DICE_DEGRADE_QUEUE_DEPTH:
+            level += 1
+        if self.outbound.error_rate >= DICE_DEGRADE_ERROR_RATE:
+            level += 1
+        return modes[min(level, len(modes) - 1)]
 
     async def roll_dice(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Roll dice with animation"""
         user_id = update.effective_user.id
-        self.update_user_stats(user_id)
+        self.update_user_stats(user_id, 'roll')
         
-        rolling_msg = await update.message.reply_text("🎲 Rolling dice... ")
-        
-        # Animation effect
-        for i in range(3):
-            await asyncio.sleep(0.5)
-            await rolling_msg.edit_text(f"🎲 Rolling dice{'.' * (i+1)} ")
+        mode = self.dice_animation_mode()
         
         result = random.randint(1, 6)
         dice_faces = ["⚀", "⚁", "⚂", "⚃", "⚄", "⚅"]
@@ -204,26 +223,40 @@ Made with ❤️ for you! Need help? Just ask! 😊
         else:
             message = f"{dice_emoji} **You rolled {result}!** 👍\nNice roll!"
         
-        keyboard = [[InlineKeyboardButton("🎲 Roll Again", callback_data="roll")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = self.keyboards.roll_again
+        
+        if mode == 'none':
+            await update.effective_message.reply_text(message, parse_mode='Markdown', reply_markup=reply_markup)
+            return
+        
+        rolling_msg = await update.effective_message.reply_text("🎲 Rolling dice... ")
+        
+        # Animation effect
+        frames = 3 if mode == 'full' else 0
+        for i in range(frames):
+            await asyncio.sleep(0.5)
+            # Cosmetic frames: the rate limiter may drop these under load
+            await context.bot.edit_message_text(
+                f"🎲 Rolling dice{'.' * (i+1)} ",
+                chat_id=rolling_msg.chat_id,
+                message_id=rolling_msg.message_id,
+                rate_limit_args=animation_frame(rolling_msg.chat_id, rolling_msg.message_id)
+            )
+        if not frames:
+            await asyncio.sleep(0.5)
         
         await rolling_msg.edit_text(message, parse_mode='Markdown', reply_markup=reply_markup)
 
     async def start_game(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Start number guessing game"""
         user_id = update.effective_user.id
-        self.update_user_stats(user_id)
+        self.update_user_stats(user_id, 'game')
         
         secret_number = random.randint(1, 10)
         
-        game_sessions[user_id] = {
-            'type': 'number_guess',
-            'number': secret_number,
-            'attempts': 0,
-            'max_attempts': 3
-        }
+        game_sessions.set(user_id, NumberGuessSession(secret_number, max_attempts=3))
         
-        await update.message.reply_text(
+        await update.effective_message.reply_text(
             "🎮 **Number Guessing Game!**\n\n"
             "I'm thinking of a number between 1 and 10! 🤔\n"
             "You have **3 attempts** to guess it!\n\n"
@@ -234,103 +267,85 @@ Made with ❤️ for you! Need help? Just ask! 😊
     async def quick_quiz(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Quick trivia quiz"""
         user_id = update.effective_user.id
-        self.update_user_stats(user_id)
+        self.update_user_stats(user_id, 'quiz')
         
-        question_data = random.choice(self.quiz_questions)
-        
-        game_sessions[user_id] = {
-            'type': 'quiz',
-            'question': question_data
-        }
-        
-        keyboard = []
-        for i, option in enumerate(question_data['options']):
-            keyboard.append([InlineKeyboardButton(option, callback_data=f"quiz_{i}")])
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        try:
+            session = await self.quiz.new_round(user_id)
+            question_text, reply_markup = await self.quiz_question(session)
+        except CatalogError as e:
+            # No playable questions, or an unreadable catalog
+            logger.warning("Quiz unavailable: %s", e)
+            await update.effective_message.reply_text("❌ The quiz is not available right now. Please try again later!")
+            return
+        game_sessions.set(user_id, session)
         
-        await update.message.reply_text(
-            f"🧠 **Quick Quiz!**\n\n{question_data['question']}",
-            reply_markup=reply_markup
-        )
+        await update.effective_message.reply_text(question_text, parse_mode='Markdown', reply_markup=reply_markup)
+
+    async def quiz_question(self, session):
+        """Text and answer keyboard for the session's current question"""
+        asked = await self.quiz.question(session.current)
+        if asked is None:
+            return "❌ This question is no longer available. Try /quiz again!", self.keyboards.another_quiz
+        version, question_data = asked
+        header = f"🧠 **Quick Quiz!** ({session.position + 1}/{len(session.questions)})"
+        return f"{header}\n\n{question_data['question']}", self.keyboards.quiz(session.current, version, question_data['options'])
 
     async def tell_joke(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Tell a random joke"""
         user_id = update.effective_user.id
-        self.update_user_stats(user_id)
+        self.update_user_stats(user_id, 'joke')
         
-        joke = random.choice(self.jokes)
+        _, joke = await self.content.pick('jokes', user_id)
         
-        keyboard = [[InlineKeyboardButton("😂 Another Joke", callback_data="joke")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await update.message.reply_text(
+        await update.effective_message.reply_text(
             f"😄 **Here's a joke for you:**\n\n{joke}", 
             parse_mode='Markdown', 
-            reply_markup=reply_markup
+            reply_markup=self.keyboards.another_joke
         )
 
     async def fun_fact(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Share a fun fact"""
         user_id = update.effective_user.id
-        self.update_user_stats(user_id)
-        
-        fact = random.choice(self.fun_facts)
+        self.update_user_stats(user_id, 'fact')
         
-        keyboard = [[InlineKeyboardButton("🤓 Another Fact", callback_data="fact")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        _, fact = await self.content.pick('facts', user_id)
         
-        await update.message.reply_text(
+        await update.effective_message.reply_text(
             f"🧠 **Amazing Fact:**\n\n{fact}", 
             parse_mode='Markdown', 
-            reply_markup=reply_markup
+            reply_markup=self.keyboards.another_fact
         )
 
     async def cute_animal(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Show random cute animal"""
         user_id = update.effective_user.id
-        self.update_user_stats(user_id)
+        self.update_user_stats(user_id, 'animal')
         
-        emoji, name = random.choice(self.animals)
+        _, (emoji, name) = await self.content.pick('animals', user_id)
         
-        keyboard = [[InlineKeyboardButton("🐾 Another Animal", callback_data="animal")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await update.message.reply_text(
+        await update.effective_message.reply_text(
             f"{emoji} **Your cute animal:** {name}!\n💕 Isn't it adorable?", 
             parse_mode='Markdown', 
-            reply_markup=reply_markup
+            reply_markup=self.keyboards.another_animal
         )
 
     async def daily_quote(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Send inspiring quote"""
         user_id = update.effective_user.id
-        self.update_user_stats(user_id)
-        
-        quote, author = random.choice(self.quotes)
-        
-        quote_text = f"""
-✨ **Daily Inspiration** ✨
-
-"{quote}"
-
-— {author}
-
-🌟 Have an amazing day! 🌟
-        """
+        self.update_user_stats(user_id, 'quote')
         
-        keyboard = [[InlineKeyboardButton("✨ Another Quote", callback_data="quote")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        _, (quote, author) = await self.content.pick('quotes', user_id)
         
-        await update.message.reply_text(quote_text, parse_mode='Markdown', reply_markup=reply_markup)
+        quote_text = QUOTE_TEXT.render(quote=quote, author=author)
+        await update.effective_message.reply_text(quote_text, parse_mode='Markdown', reply_markup=self.keyboards.another_quote)
 
     async def calculate_math(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Simple math calculator"""
         user_id = update.effective_user.id
-        self.update_user_stats(user_id)
+        self.update_user_stats(user_id, 'math')
         
         if not context.args:
-            await update.message.reply_text(
+            await update.effective_message.reply_text(
                 "🧮 **Math Calculator**\n\n"
                 "Usage: `/math <expression>`\n\n"
                 "Examples:\n"
@@ -343,50 +358,67 @@ Made with ❤️ for you! Need help? Just ask! 😊
         
         expression = ' '.join(context.args)
         
+        from calc import MathError
         try:
-            import re
-            if re.match(r'^[\d\s+\-*/()\.,]+$', expression):
-                result = eval(expression)
-                await update.message.reply_text(
-                    f"🧮 **Math Result:**\n\n`{expression} = {result}`",
-                    parse_mode='Markdown'
-                )
-            else:
-                await update.message.reply_text("❌ Invalid expression! Only numbers and basic operators allowed.")
-        except Exception:
-            await update.message.reply_text("❌ Error in calculation. Please check your expression!")
+            result = await self.math_engine().evaluate(expression)
+        except MathError as e:
+            await update.effective_message.reply_text(f"❌ {e} Please check your expression!")
+            return
+        
+        await update.effective_message.reply_text(
+            f"🧮 **Math Result:**\n\n`{expression} = {result}`",
+            parse_mode='Markdown'
+        )
 
     async def weather_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Get weather (placeholder - requires API key)"""
+        """Get current weather for a city"""
         user_id = update.effective_user.id
-        self.update_user_stats(user_id)
+        self.update_user_stats(user_id, 'weather')
         
         if not context.args:
-            await update.message.reply_text(
+            await update.effective_message.reply_text(
                 "🌤️ **Weather Service**\n\n"
                 "Usage: `/weather <city name>`\n"
-                "Example: `/weather London`\n\n"
-                "Weather service requires API setup. Coming soon! ✨"
+                "Example: `/weather London`",
+                parse_mode='Markdown'
             )
             return
         
         city = ' '.join(context.args)
         
-        # Placeholder response (implement with actual weather API)
-        await update.message.reply_text(
-            f"🌤️ **Weather for {city.title()}**\n\n"
-            "Weather service is being set up! 🔧\n"
-            "Get a free API key from openweathermap.org to enable this feature.\n\n"
-            "Coming soon with real weather data! ☀️"
+        weather_service = self.weather_service()
+        if weather_service is None:
+            await update.effective_message.reply_text(
+                f"🌤️ **Weather for {city.title()}**\n\n"
+                "Weather service is being set up! 🔧\n"
+                "Get a free API key from openweathermap.org to enable this feature.\n\n"
+                "Coming soon with real weather data! ☀️"
+            )
+            return
+        
+        from weather import WeatherError
+        try:
+            weather = await weather_service.get(city)
+        except WeatherError as e:
+            await update.effective_message.reply_text(f"❌ {e}")
+            return
+        
+        await update.effective_message.reply_text(
+            f"🌤️ **Weather for {weather['city']}**\n\n"
+            f"☁️ {weather['description'].capitalize()}\n"
+            f"🌡️ **{weather['temp']:.0f}°C** (feels like {weather['feels_like']:.0f}°C)\n"
+            f"💧 Humidity: {weather['humidity']}%\n"
+            f"💨 Wind: {weather['wind']} m/s",
+            parse_mode='Markdown'
         )
 
     async def reminder_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Set a reminder"""
         user_id = update.effective_user.id
-        self.update_user_stats(user_id)
+        self.update_user_stats(user_id, 'reminder')
         
         if len(context.args) < 2:
-            await update.message.reply_text(
+            await update.effective_message.reply_text(
                 "⏰ **Set a Reminder**\n\n"
                 "Usage: `/reminder <minutes> <message>`\n\n"
                 "Examples:\n"
@@ -402,26 +434,24 @@ Made with ❤️ for you! Need help? Just ask! 😊
             reminder_text = ' '.join(context.args[1:])
             
             if minutes > 1440:  # More than 24 hours
-                await update.message.reply_text("❌ Maximum reminder time is 24 hours!")
+                await update.effective_message.reply_text("❌ Maximum reminder time is 24 hours!")
                 return
             
-            await update.message.reply_text(
+            await update.effective_message.reply_text(
                 f"⏰ **Reminder Set!**\n\n"
                 f"I'll remind you in **{minutes} minute{'s' if minutes != 1 else ''}**:\n"
                 f"📝 *{reminder_text}*",
                 parse_mode='Markdown'
             )
             
-            # Schedule reminder
-            asyncio.create_task(self.send_reminder(update.effective_chat.id, minutes, reminder_text))
+            # Schedule reminder (persisted, survives restarts)
+            await self.reminders.schedule(update.effective_chat.id, minutes * 60, reminder_text)
             
         except ValueError:
-            await update.message.reply_text("❌ Please enter a valid number of minutes!")
+            await update.effective_message.reply_text("❌ Please enter a valid number of minutes!")
 
-    async def send_reminder(self, chat_id: int, minutes: int, message: str):
-        """Send reminder after specified time"""
-        await asyncio.sleep(minutes * 60)
-        
+    async def send_reminder(self, chat_id: int, message: str):
+        """Send a due reminder through the running application's bot"""
         reminder_text = f"""
 🔔 **REMINDER ALERT!** 🔔
 
@@ -431,75 +461,149 @@ Made with ❤️ for you! Need help? Just ask! 😊
 Hope this helps! ✨
         """
         
-        try:
-            application = Application.builder().token(BOT_TOKEN).build()
-            await application.bot.send_message(
-                chat_id=chat_id, 
-                text=reminder_text, 
-                parse_mode='Markdown'
-            )
-        except Exception as e:
-            logger.error(f"Failed to send reminder: {e}")
+        await self.application.bot.send_message(
+            chat_id=chat_id, 
+            text=reminder_text, 
+            parse_mode='Markdown'
+        )
 
     async def show_stats(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Show user statistics"""
         user_id = update.effective_user.id
-        user_info = user_data.get(user_id, {})
+        user_info = await self.users.get(user_id)
         
         if not user_info:
-            await update.message.reply_text("❌ No stats available. Use /start first!")
+            await update.effective_message.reply_text("❌ No stats available. Use /start first!")
             return
         
-        joined_date = user_info.get('joined', 'Unknown')
+        player = self.stats.player(user_id)
+        rank, ranked = self.stats.rank(user_id)
+        # Everything the card shows, raw; a repeat /stats with the same inputs is served pre-rendered
+        inputs = (
+            user_info.name, user_info.joined, user_info.commands_used,
+            (player.games, player.wins, player.streak, player.best_streak) if player else None,
+            rank, ranked if rank else 0
+        )
+        stats_text = self.renders.render(
+            'stats', user_id, inputs, lambda: self.render_stats(user_info, player, rank, ranked)
+        )
+        await update.effective_message.reply_text(stats_text, parse_mode='Markdown')
+
+    def render_stats(self, user_info, player, rank, ranked) -> str:
+        """Format a user's statistics card"""
+        joined_date = user_info.joined or 'Unknown'
         if joined_date != 'Unknown':
             joined_date = datetime.fromisoformat(joined_date).strftime('%B %d, %Y')
         
-        commands_used = user_info.get('commands_used', 0)
+        commands_used = user_info.commands_used
         
-        stats_text = f"""
-📊 **Your Bot Statistics** 📊
-
-👤 **Name:** {user_info.get('name', 'Unknown')}
-📅 **Joined:** {joined_date}
-🎯 **Commands Used:** {commands_used}
-🏆 **Status:** {'Power User 🌟' if commands_used > 20 else 'Active User 💪' if commands_used > 5 else 'Getting Started 🌱'}
+        if commands_used > 20:
+            status = 'Power User 🌟'
+        elif commands_used > 5:
+            status = 'Active User 💪'
+        else:
+            status = 'Getting Started 🌱'
+        
+        return STATS_TEXT.render(
+            name=user_info.name or 'Unknown',
+            joined=joined_date,
+            commands_used=commands_used,
+            status=status,
+            games=player.games if player else 0,
+            win_rate=f"{player.win_rate:.0%}" if player else '-',
+            streak=player.streak if player else 0,
+            best_streak=player.best_streak if player else 0,
+            rank=f"#{rank} of {ranked}" if rank else 'Not ranked yet - win a game!'
+        )
 
-Thanks for using the bot! 🎉
-        """
+    async def leaderboard_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Show the players with the most wins"""
+        user_id = update.effective_user.id
+        self.update_user_stats(user_id, 'leaderboard')
         
-        await update.message.reply_text(stats_text, parse_mode='Markdown')
+        top = self.stats.top(10)
+        if not top:
+            await update.effective_message.reply_text("🏆 No winners yet! Be the first with /game or /quiz!")
+            return
+        
+        medals = ['🥇', '🥈', '🥉']
+        lines = []
+        for position, (player_id, wins) in enumerate(top):
+            record = await self.users.get(player_id)
+            name = record.name if record and record.name else 'Mystery Player'
+            badge = medals[position] if position < len(medals) else f"{position + 1}."
+            lines.append(f"{badge} {name} - **{wins}** win{'s' if wins != 1 else ''}")
+        
+        rank, ranked = self.stats.rank(user_id)
+        footer = f"You are **#{rank}** of {ranked}!" if rank else "Win a game to get on the board! 💪"
+        await update.effective_message.reply_text(
+            "🏆 **Leaderboard** 🏆\n\n" + '\n'.join(lines) + f"\n\n{footer}",
+            parse_mode='Markdown'
+        )
 
     async def about_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """About this bot"""
-        about_text = """
-🤖 **About This Bot** 🤖
-
-**Version:** 2.0.0
-**Features:** Games, utilities, fun facts, and more!
-**Status:** Running 24/7 on free hosting ⚡
-
-**What I can do:**
-✅ Interactive games and quizzes
-✅ Math calculator and utilities  
-✅ Fun facts and daily inspiration
-✅ Reminders and helpful tools
-✅ Friendly conversations
-
-**Free & Open Source** 💝
-This bot runs on free hosting and is available to everyone!
+        await update.effective_message.reply_text(ABOUT_TEXT, parse_mode='Markdown')
 
-**Developer:** Made with ❤️ for the Telegram community
-**Support:** If you find issues, let us know!
-
-Enjoy using the bot! 🌟
-        """
+    async def broadcast_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Admin only: message every user (/broadcast <text>, quote, status or cancel)"""
+        if update.effective_user.id not in ADMIN_IDS:
+            await update.effective_message.reply_text("❌ Broadcasts are for bot admins only.")
+            return
         
-        await update.message.reply_text(about_text, parse_mode='Markdown')
+        argument = command_argument(update.effective_message)
+        keyword = argument.strip().lower()
+        if not keyword or keyword == 'status':
+            await update.effective_message.reply_text(self.broadcast_status())
+            return
+        if keyword == 'cancel':
+            cancelled = await self.broadcaster.cancel()
+            await update.effective_message.reply_text("🛑 Broadcast cancelled." if cancelled else "No broadcast is running.")
+            return
+        
+        if keyword == 'quote':
+            # One quote of the day for everyone
+            _, (quote, author) = await self.content.pick('quotes', update.effective_user.id)
+            text, parse_mode = QUOTE_TEXT.render(quote=quote, author=author), 'Markdown'
+        else:
+            text, parse_mode = argument, None
+        
+        if self.broadcaster.start(self.application.bot, text, parse_mode, notify_chat_id=update.effective_chat.id):
+            await update.effective_message.reply_text("📣 Broadcast started! I'll report back when it's done.")
+        else:
+            await update.effective_message.reply_text("⏳ A broadcast is already running.\n\n" + self.broadcast_status())
+
+    def broadcast_status(self) -> str:
+        job = self.broadcaster.job or self.broadcaster.last_job
+        if job is None:
+            return "📣 No broadcasts yet.\nUsage: /broadcast <text>, /broadcast quote, /broadcast cancel"
+        state = "running" if self.broadcaster.running else "finished"
+        return (
+            f"📣 Broadcast {state}: {job.sent} delivered, {job.failed} failed, "
+            f"{job.pruned} blocked users removed ({job.rate:.1f} msg/s)"
+        )
+
+    async def report_broadcast(self, job):
+        """Tell the admin who started a broadcast how it went"""
+        if job.notify_chat_id is None:
+            return
+        await self.application.bot.send_message(
+            chat_id=job.notify_chat_id,
+            text=(
+                f"✅ Broadcast finished in {job.elapsed:.0f}s\n"
+                f"📬 Delivered: {job.sent}\n"
+                f"⚠️ Failed: {job.failed}\n"
+                f"🚫 Blocked users removed: {job.pruned}\n"
+                f"⚡ {job.rate:.1f} messages/s"
+            )
+        )
 
-    def update_user_stats(self, user_id: int):
-        """Update user command count"""
-        if user_id in user_data:
-            user_data[user_id]['commands_used'] = user_data[user_id].get('commands_used', 0) + 1
+    def update_user_stats(self, user_id: int, command: str):
+        """Update user command count (buffered, flushed in batches)"""
+        self.users.record_command(user_id)
+        self.stats.record_command(user_id, command)
+        # The command count on the user's stats card just changed
+        self.renders.invalidate('stats', user_id)
 
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle regular text messages"""
@@ -508,112 +612,79 @@ Enjoy using the bot! 🌟
         message = update.message.text.lower()
         
         # Handle game sessions
-        if user_id in game_sessions:
-            await self.handle_game_input(update, context)
+        session = game_sessions.get(user_id)
+        if session is not None:
+            await self.handle_game_input(update, context, session)
             return
         
         # Math expressions
         if any(op in message for op in ['+', '-', '*', '/', '=']) and any(c.isdigit() for c in message):
-            try:
-                import re
-                math_expr = re.sub(r'[^\d+\-*/().\s]', '', message)
-                if math_expr.strip():
-                    result = eval(math_expr)
-                    await update.message.reply_text(f"🧮 {math_expr.strip()} = **{result}**", parse_mode='Markdown')
+            math_expr = MATH_CHARS.sub('', message)
+            if math_expr.strip():
+                from calc import MathError
+                try:
+                    result = await self.math_engine().evaluate(math_expr)
+                except MathError:
+                    pass
+                else:
+                    await update.effective_message.reply_text(f"🧮 {math_expr.strip()} = **{result}**", parse_mode='Markdown')
                     return
-            except:
-                pass
         
         # Friendly responses
-        greetings = ['hello', 'hi', 'hey', 'good morning', 'good afternoon', 'good evening']
-        questions = ['how are you', 'what can you do', 'help me']
-        compliments = ['thank you', 'thanks', 'awesome', 'great', 'amazing', 'cool']
-        
-        if any(greeting in message for greeting in greetings):
-            responses = [
-                f"Hello {user_name}! 👋 How can I help you today?",
-                f"Hi there, {user_name}! 😊 What would you like to do?",
-                f"Hey {user_name}! 🎉 Ready for some fun? Try /roll or /game!"
-            ]
-        elif any(question in message for question in questions):
-            responses = [
-                f"I can do lots of things, {user_name}! Try /help to see all my commands! 🤖",
-                "I'm here to entertain and help you! Games, facts, math, and more! 🎯",
-                f"I'm doing great, {user_name}! I can play games, tell jokes, do math, and chat! 😄"
-            ]
-        elif any(compliment in message for compliment in compliments):
-            responses = [
-                f"You're very welcome, {user_name}! 😊 I'm happy to help!",
-                f"Aww, thanks {user_name}! 🥰 You're awesome too!",
-                "I'm glad you like it! Feel free to use me anytime! ✨"
-            ]
-        else:
-            responses = [
-                f"That's interesting, {user_name}! 🤔 Try /help to see what I can do!",
-                f"Cool message, {user_name}! 👍 Want to play a game? Try /game!",
-                f"Thanks for sharing, {user_name}! 😊 How about a fun fact? Try /fact!"
-            ]
+        intent, _ = self.intents.classify(message)
+        responses = self.intents.responses[intent]
         
-        response = random.choice(responses)
+        response = random.choice(responses).format(name=user_name)
         
         # Quick action buttons
-        keyboard = [
-            [InlineKeyboardButton("🎲 Roll Dice", callback_data="roll"),
-             InlineKeyboardButton("😂 Tell Joke", callback_data="joke")],
-            [InlineKeyboardButton("🎮 Play Game", callback_data="game"),
-             InlineKeyboardButton("❓ Help", callback_data="help")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await update.message.reply_text(response, reply_markup=reply_markup)
-
-    async def handle_game_input(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle game inputs"""
-        user_id = update.effective_user.id
-        session = game_sessions[user_id]
-        
-        if session['type'] == 'number_guess':
-            await self.handle_number_guess(update, context)
+        await update.effective_message.reply_text(response, reply_markup=self.keyboards.quick_actions)
 
-    async def handle_number_guess(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async def handle_game_input(self, update: Update, context: ContextTypes.DEFAULT_TYPE, session):
+        """Handle game inputs for the user's current session"""
+        if session.type == 'number_guess':
+            await self.handle_number_guess(update, context, session)
+
+    async def handle_number_guess(self, update: Update, context: ContextTypes.DEFAULT_TYPE, session):
         """Handle number guessing game"""
         user_id = update.effective_user.id
-        session = game_sessions[user_id]
         
         try:
             guess = int(update.message.text)
         except ValueError:
-            await update.message.reply_text("❌ Please send a number between 1 and 10!")
+            await update.effective_message.reply_text("❌ Please send a number between 1 and 10!")
             return
         
         if guess < 1 or guess > 10:
-            await update.message.reply_text("❌ Please guess between 1 and 10!")
+            await update.effective_message.reply_text("❌ Please guess between 1 and 10!")
             return
         
-        session['attempts'] += 1
-        secret = session['number']
+        session.attempts += 1
+        secret = session.number
         
         if guess == secret:
-            del game_sessions[user_id]
-            await update.message.reply_text(
+            game_sessions.pop(user_id)
+            self.stats.record_game(user_id, 'number_guess', won=True)
+            await update.effective_message.reply_text(
                 f"🎉 **CONGRATULATIONS!** 🎉\n\n"
                 f"You guessed it! The number was **{secret}**!\n"
-                f"You won in {session['attempts']} attempt{'s' if session['attempts'] > 1 else ''}! 🏆\n\n"
+                f"You won in {session.attempts} attempt{'s' if session.attempts > 1 else ''}! 🏆\n\n"
                 f"Play again with /game!",
                 parse_mode='Markdown'
             )
-        elif session['attempts'] >= session['max_attempts']:
-            del game_sessions[user_id]
-            await update.message.reply_text(
+        elif session.attempts >= session.max_attempts:
+            game_sessions.pop(user_id)
+            self.stats.record_game(user_id, 'number_guess', won=False)
+            await update.effective_message.reply_text(
                 f"😅 **Game Over!**\n\n"
                 f"The number was **{secret}**. Try again with /game!",
                 parse_mode='Markdown'
             )
         else:
-            remaining = session['max_attempts'] - session['attempts']
+            game_sessions.set(user_id, session)
+            remaining = session.max_attempts - session.attempts
             hint = "higher! 📈" if guess < secret else "lower! 📉"
             
-            await update.message.reply_text(
+            await update.effective_message.reply_text(
                 f"❌ Try {hint}\n"
                 f"Attempts remaining: **{remaining}** 🎯",
                 parse_mode='Markdown'
@@ -624,88 +695,248 @@ Enjoy using the bot! 🌟
         query = update.callback_query
         await query.answer()
         
-        # Create a fake message for handlers that expect update.message
-        class FakeMessage:
-            def __init__(self, original_message):
-                self.message_id = original_message.message_id
-                self.chat = original_message.chat
-                self.date = original_message.date
-        
-        update.message = FakeMessage(query.message)
-        
-        # Handle different button types
-        if query.data == "roll":
-            await self.roll_dice(update, context)
-        elif query.data == "joke":
-            await self.tell_joke(update, context)
-        elif query.data == "fact":
-            await self.fun_fact(update, context)
-        elif query.data == "animal":
-            await self.cute_animal(update, context)
-        elif query.data == "game":
-            await self.start_game(update, context)
-        elif query.data == "quiz":
-            await self.quick_quiz(update, context)
-        elif query.data == "quote":
-            await self.daily_quote(update, context)
-        elif query.data == "stats":
-            await self.show_stats(update, context)
-        elif query.data == "help":
-            await self.help_command(update, context)
-        elif query.data.startswith("quiz_"):
-            await self.handle_quiz_answer(update, context, query.data)
+        # Handlers reply via update.effective_message, which is the button's message here
+        await self.callback_router.dispatch(update, context)
 
     async def handle_quiz_answer(self, update: Update, context: ContextTypes.DEFAULT_TYPE, callback_data: str):
         """Handle quiz answer selection"""
         query = update.callback_query
         user_id = update.effective_user.id
         
-        if user_id not in game_sessions or game_sessions[user_id]['type'] != 'quiz':
+        session = game_sessions.get(user_id)
+        if session is None or session.type != 'quiz':
             await query.edit_message_text("❌ Quiz session expired. Try /quiz again!")
             return
         
-        answer_index = int(callback_data.split('_')[1])
-        question_data = game_sessions[user_id]['question']
+        answer = decode_answer(callback_data)
+        if answer is None or answer[0] != session.current:
+            # A button from an earlier question or round; the query is already answered
+            self.quiz.stale += 1
+            return
+        question_id, version, answer_index = answer
+        question_data = await self.quiz.current(question_id, version)
+        if question_data is None:
+            # The question was edited or removed by a catalog reload
+            game_sessions.pop(user_id)
+            await query.edit_message_text("❌ This question was updated. Try /quiz again!")
+            return
         correct_index = question_data['correct']
         
-        del game_sessions[user_id]  # Clear session
-        
-        if answer_index == correct_index:
+        won = answer_index == correct_index
+        session.position += 1
+        session.score += won
+        if won:
             result_text = f"🎉 **Correct!** 🎉\n\n{question_data['explanation']}\n\nWell done! 🏆"
         else:
             correct_option = question_data['options'][correct_index]
             result_text = f"❌ **Not quite!**\n\nThe correct answer was: {correct_option}\n\n{question_data['explanation']}\n\nTry another question! 💪"
         
-        keyboard = [[InlineKeyboardButton("🧠 Another Quiz", callback_data="quiz")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        if session.current is not None:
+            game_sessions.set(user_id, session)
+            question_text, reply_markup = await self.quiz_question(session)
+            await query.edit_message_text(f"{result_text}\n\n{question_text}", parse_mode='Markdown', reply_markup=reply_markup)
+            return
         
-        await query.edit_message_text(result_text, parse_mode='Markdown', reply_markup=reply_markup)
-
-    def setup_application(self):
+        game_sessions.pop(user_id)
+        # One game per round, won with more than half of the answers right
+        self.stats.record_game(user_id, 'quiz', won=session.score * 2 > len(session.questions))
+        result_text += f"\n\n🏁 **Round over!** You scored {session.score}/{len(session.questions)}"
+        await query.edit_message_text(result_text, parse_mode='Markdown', reply_markup=self.keyboards.another_quiz)
+
+    def math_engine(self):
+        """The math engine, built on first use"""
+        if self.math is None:
+            from calc import MathEngine
+            self.math = MathEngine(workers=MATH_WORKERS)
+        return self.math
+
+    def weather_service(self):
+        """Weather service for the configured provider, built on first use; None if not set up"""
+        if self.weather is None:
+            if WEATHER_PROVIDER != 'mock' and WEATHER_API_KEY in ('', 'your_weather_api_key_here'):
+                return None
+            from weather import WeatherService, OpenWeatherMapProvider, MockWeatherProvider
+            provider = MockWeatherProvider() if WEATHER_PROVIDER == 'mock' else OpenWeatherMapProvider(WEATHER_API_KEY)
+            self.weather = WeatherService(provider, ttl=WEATHER_CACHE_TTL)
+        return self.weather
+
+    def observe_api_call(self, endpoint: str, seconds: float, ok: bool):
+        """Record Bot API latency, and the first response sent after startup"""
+        self.metrics.observe_api_call(endpoint, seconds, ok)
+        if ok and self.lifecycle.first_response is None and endpoint not in SETUP_METHODS:
+            self.lifecycle.responded()
+
+    async def count_update(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Count incoming updates for throughput metrics"""
+        self.metrics.updates.inc()
+
+    async def throttle_update(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Stop updates from users over their budget before any handler runs"""
+        verdict = self.throttle.check(update)
+        if verdict == ALLOWED:
+            return
+        if verdict == THROTTLED:
+            # Only the first rejection per window gets a message
+            if update.callback_query:
+                await update.callback_query.answer("⏳ Slow down a little!")
+            elif update.effective_message:
+                await update.effective_message.reply_text("⏳ Whoa, slow down a little! Try again in a moment.")
+        elif update.callback_query:
+            # Duplicate or silenced press: an empty answer stops the client's loading spinner
+            try:
+                await update.callback_query.answer()
+            except TelegramError:
+                pass  # Too old to answer; the press is still dropped
+        raise ApplicationHandlerStop
+
+    async def error_handler(self, update: object, context: ContextTypes.DEFAULT_TYPE):
+        """Log errors raised by handlers"""
+        logger.error("Error while handling update: %s", context.error, exc_info=context.error)
+
+    async def post_init(self, application: Application):
+        """Start background services once the application is initialized"""
+        state = await self.lifecycle.load_state()
+        self.reminders = ReminderScheduler(
+            ReminderStore(os.path.join(DATA_DIR, 'reminders.db')),
+            self.send_reminder,
+            shard=self.shard
+        )
+        # Restore everything at once: reminders, the stat log, sessions and the users cached before the restart
+        downtime = time.time() - state['stopped_at'] if state else 0.0
+        restored_sessions = game_sessions.restore(state.get('sessions', ()), downtime)
+        _, _, restored_users = await asyncio.gather(
+            self.reminders.start(),
+            self.stats.start(),
+            self.users.preload(state.get('cached_users', ()))
+        )
+        if state:
+            logger.info("Restored %d game sessions and %d cached users", restored_sessions, restored_users)
+        self.users.start()
+        await self.broadcaster.resume(application.bot)
+        
+        if METRICS_PORT:
+            self.metrics.gauge('bot_outbound_queue_depth', 'Requests waiting for the global rate limit', lambda: self.outbound.queue_depth)
+            self.metrics.gauge('bot_outbound_flood_waits', 'Flood-limit (429) responses so far', lambda: self.outbound.retry_after_count)
+            self.metrics.gauge('bot_updates_in_flight', 'Updates being handled', lambda: self.update_processor.in_flight)
+            self.metrics.gauge('bot_updates_pending', 'Updates queued or being handled', lambda: self.update_processor.pending)
+            self.metrics.gauge('bot_updates_shed', 'Updates dropped by backpressure', lambda: self.update_processor.shed)
+            self.metrics.gauge('bot_game_sessions', 'Active game sessions', lambda: len(game_sessions))
+            self.metrics.gauge('bot_pending_reminders', 'Scheduled reminders', lambda: len(self.reminders))
+            self.metrics.gauge('bot_throttled_updates', 'Updates dropped for exceeding a user budget', lambda: self.throttle.throttled)
+            self.metrics.gauge('bot_duplicate_presses', 'Repeated button presses collapsed', lambda: self.throttle.duplicates)
+            self.metrics.gauge('bot_render_cache_hit_rate', 'Share of /start and /stats texts served pre-rendered', lambda: self.renders.stats()['hit_rate'])
+            self.metrics.gauge('bot_render_cache_bytes', 'Memory held by pre-rendered texts', lambda: self.renders.bytes)
+            self.metrics.gauge('bot_first_response_seconds', 'Process start to first response', lambda: self.lifecycle.stats()['first_response_seconds'] or 'NaN')
+            self.metrics.gauge('bot_restart_gap_seconds', 'Previous process stopping to first response', lambda: self.lifecycle.stats()['restart_gap_seconds'] or 'NaN')
+            self.metrics.gauge('bot_broadcast_sent', 'Broadcast messages delivered', lambda: self.broadcaster.sent)
+            self.metrics.gauge('bot_broadcast_failed', 'Broadcast messages that failed', lambda: self.broadcaster.failed)
+            self.metrics.gauge('bot_broadcast_pruned', 'Users removed after blocking the bot', lambda: self.broadcaster.pruned)
+            self.metrics.gauge('bot_log_queue_depth', 'Log records waiting for the writer thread', lambda: log_pipeline.queue.qsize())
+            self.metrics.gauge('bot_log_records_dropped', 'Log records dropped because the queue was full', lambda: log_pipeline.handler.dropped)
+            self.metrics.gauge('bot_log_records_sampled_out', 'Info and debug records skipped by sampling', lambda: log_pipeline.sampler.sampled_out)
+            self.metrics.gauge('bot_broadcast_rate', 'Recipients per second of the current or last broadcast', lambda: self.broadcaster.stats()['rate'])
+            port = METRICS_PORT + (self.shard[0] if self.shard else 0)
+            self.metrics_server = MetricsServer(self.metrics, METRICS_HOST, port)
+            await self.metrics_server.start()
+
+    async def post_stop(self, application: Application):
+        """Pause work that still needs the bot, before its connections close"""
+        await asyncio.gather(self.broadcaster.stop(), self.reminders.stop())
+        logger.info("Broadcast stats: %s", self.broadcaster.stats())
+
+    async def post_shutdown(self, application: Application):
+        """Stop background services"""
+        if self.metrics_server:
+            await self.metrics_server.stop()
+        logger.info("Session store stats: %s", game_sessions.stats())
+        await asyncio.gather(self.users.stop(), self.stats.stop())
+        # What exists only in memory, for the next start to restore
+        await self.lifecycle.save_state({
+            'sessions': game_sessions.snapshot(),
+            'cached_users': self.users.cached_user_ids(),
+        })
+        logger.info("Lifecycle stats: %s", self.lifecycle.stats())
+        logger.info("Stats engine: %s, commands: %s", self.stats.stats(), self.stats.command_counts())
+        if self.math:
+            self.math.close()
+        logger.info("Render cache stats: %s", self.renders.stats())
+        logger.info("Quiz engine stats: %s", self.quiz.stats())
+        logger.info("Content catalog stats: %s", self.content.stats())
+        self.content.close()
+        if self.weather:
+            await self.weather.close()
+            logger.info("Weather stats: %s", self.weather.stats())
+        logger.info("Outbound stats: %s", self.outbound.stats())
+        logger.info("Update processor stats: %s", self.update_processor.stats())
+        logger.info("Inbound throttle stats: %s", self.throttle.stats())
+        logger.info("Callback route stats: %s", self.callback_router.report())
+        logger.info("User store stats: %s", self.users.stats())
+        logger.info("Logging stats: %s", log_pipeline.stats())
+
+    def setup_application(self, base_url: str = None, updater: bool = True):
         """Setup the bot application with all handlers"""
-        application = Application.builder().token(BOT_TOKEN).build()
+        builder = (
+            Application.builder()
+            .token(BOT_TOKEN)
+            .rate_limiter(self.outbound)
+            .concurrent_updates(self.update_processor)
+            .post_init(self.post_init)
+            .post_stop(self.post_stop)
+            .post_shutdown(self.post_shutdown)
+        )
+        if base_url:
+            # Alternative Bot API server (e.g. the load-test fake)
+            builder = builder.base_url(base_url)
+        if not updater:
+            # Updates are fed in by a scale-out listener instead
+            builder = builder.updater(None)
+        application = builder.build()
+        self.application = application
+        track = self.metrics.instrument
+        
+        # Count every update, then apply per-user budgets, before any handler runs
+        application.add_handler(TypeHandler(Update, self.count_update), group=-2)
+        application.add_handler(TypeHandler(Update, self.throttle_update), group=-1)
         
         # Command handlers
-        application.add_handler(CommandHandler("start", self.start_command))
-        application.add_handler(CommandHandler("help", self.help_command))
-        application.add_handler(CommandHandler("roll", self.roll_dice))
-        application.add_handler(CommandHandler("game", self.start_game))
-        application.add_handler(CommandHandler("quiz", self.quick_quiz))
-        application.add_handler(CommandHandler("joke", self.tell_joke))
-        application.add_handler(CommandHandler("fact", self.fun_fact))
-        application.add_handler(CommandHandler("animal", self.cute_animal))
-        application.add_handler(CommandHandler("quote", self.daily_quote))
-        application.add_handler(CommandHandler("math", self.calculate_math))
-        application.add_handler(CommandHandler("weather", self.weather_command))
-        application.add_handler(CommandHandler("reminder", self.reminder_command))
-        application.add_handler(CommandHandler("stats", self.show_stats))
-        application.add_handler(CommandHandler("about", self.about_command))
+        application.add_handler(CommandHandler("start", track("start", self.start_command)))
+        application.add_handler(CommandHandler("help", track("help", self.help_command)))
+        application.add_handler(CommandHandler("roll", track("roll", self.roll_dice)))
+        application.add_handler(CommandHandler("game", track("game", self.start_game)))
+        application.add_handler(CommandHandler("quiz", track("quiz", self.quick_quiz)))
+        application.add_handler(CommandHandler("joke", track("joke", self.tell_joke)))
+        application.add_handler(CommandHandler("fact", track("fact", self.fun_fact)))
+        application.add_handler(CommandHandler("animal", track("animal", self.cute_animal)))
+        application.add_handler(CommandHandler("quote", track("quote", self.daily_quote)))
+        application.add_handler(CommandHandler("math", track("math", self.calculate_math)))
+        application.add_handler(CommandHandler("weather", track("weather", self.weather_command)))
+        application.add_handler(CommandHandler("reminder", track("reminder", self.reminder_command)))
+        application.add_handler(CommandHandler("stats", track("stats", self.show_stats)))
+        application.add_handler(CommandHandler("leaderboard", track("leaderboard", self.leaderboard_command)))
+        application.add_handler(CommandHandler("about", track("about", self.about_command)))
+        application.add_handler(CommandHandler("broadcast", track("broadcast", self.broadcast_command)))
+        
+        # Button callback routes
+        router = CallbackRouter()
+        router.add("roll", self.roll_dice)
+        router.add("joke", self.tell_joke)
+        router.add("fact", self.fun_fact)
+        router.add("animal", self.cute_animal)
+        router.add("game", self.start_game)
+        router.add("quiz", self.quick_quiz)
+        router.add("quote", self.daily_quote)
+        router.add("stats", self.show_stats)
+        router.add("help", self.help_command)
+        router.add_prefix("quiz_", self.handle_quiz_answer)
+        self.callback_router = router
         
         # Button callback handler
-        application.add_handler(CallbackQueryHandler(self.button_callback))
+        application.add_handler(CallbackQueryHandler(track("callback", self.button_callback)))
         
         # Message handler for regular text
-        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_message))
+        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, track("message", self.handle_message)))
+        
+        application.add_error_handler(self.error_handler)
         
         return application
 
@@ -718,23 +949,24 @@ def main():
         print("Please set your bot token from BotFather")
         return
     
-    bot = MyAwesomeBot()
-    application = bot.setup_application()
+    if WEBHOOK_URL and WORKERS > 1:
+        # Production scale-out: one listener, WORKERS worker processes
+        import scaleout
+        print(f"🌐 Starting sharded webhook server on port {PORT} with {WORKERS} workers...")
+        scaleout.run(BOT_TOKEN, WEBHOOK_URL, PORT, WORKERS, DATA_DIR)
+        return
     
-    # Check if running in webhook mode (production) or polling mode (development)
     if WEBHOOK_URL:
-        # Production mode with webhooks
+        # Production mode with webhooks; the port is bound before the bot warms up
+        import startup
         print(f"🌐 Starting webhook server on port {PORT}...")
-        application.run_webhook(
-            listen="0.0.0.0",
-            port=PORT,
-            url_path=BOT_TOKEN,
-            webhook_url=f"{WEBHOOK_URL}/{BOT_TOKEN}"
-        )
-    else:
-        # Development mode with polling
-        print("🔧 Running in development mode with polling...")
-        application.run_polling(allowed_updates=Update.ALL_TYPES)
+        startup.run(BOT_TOKEN, WEBHOOK_URL, PORT, MyAwesomeBot)
+        return
+    
+    # Development mode (and fallback after webhook outages) with polling
+    import polling
+    print("🔧 Running in development mode with polling...")
+    polling.run(MyAwesomeBot())
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,251 @@
+"""
+📣 Broadcasts
+Sends one message to every stored user. Recipients are streamed from the
+user store in id order, a chunk at a time, and sent at bulk priority under
+their own rate cap, so interactive replies keep most of the global budget.
+Progress is checkpointed after every chunk and on shutdown; an interrupted
+broadcast resumes after the last user it reached. Users who blocked the bot
+are removed from the store.
+"""
+
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import time
+
+from telegram.error import BadRequest, Forbidden, TelegramError
+
+from outbound import PRIORITY_BULK, TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastJob:
+    """Content and progress of one broadcast, as saved in the checkpoint"""
+    __slots__ = ('text', 'parse_mode', 'notify_chat_id', 'last_id', 'sent', 'failed', 'pruned', 'elapsed')
+
+    def __init__(self, text: str, parse_mode: str = None, notify_chat_id: int = None, last_id: int = 0,
+                 sent: int = 0, failed: int = 0, pruned: int = 0, elapsed: float = 0.0):
+        self.text = text
+        self.parse_mode = parse_mode
+        self.notify_chat_id = notify_chat_id
+        # Every user with an id up to last_id has been handled
+        self.last_id = last_id
+        self.sent = sent
+        self.failed = failed
+        self.pruned = pruned
+        self.elapsed = elapsed
+
+    @property
+    def processed(self) -> int:
+        return self.sent + self.failed + self.pruned
+
+    @property
+    def rate(self) -> float:
+        """Recipients handled per second of sending"""
+        return self.processed / self.elapsed if self.elapsed else 0.0
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class Broadcaster:
+    """Runs at most one broadcast at a time through the application's bot
+
+    rate caps sends per second (keep it below the outbound limiter's global
+    rate to leave room for replies) and max_in_flight bounds concurrent
+    sends. on_finish, if set, is awaited with the finished job.
+    """
+
+    def __init__(self, users, checkpoint_path: str, rate: float = 25, chunk_size: int = 500,
+                 max_in_flight: int = 10, on_finish=None):
+        self.users = users
+        self.checkpoint_path = checkpoint_path
+        self.rate = rate
+        self.chunk_size = chunk_size
+        self.max_in_flight = max_in_flight
+        self.on_finish = on_finish
+        self.job = None
+        self.last_job = None
+        self._task = None
+        self._stopping = False
+        self.sent = 0
+        self.failed = 0
+        self.pruned = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, bot, text: str, parse_mode: str = None, notify_chat_id: int = None) -> bool:
+        """Begin a broadcast; False if one is already running"""
+        if self.running:
+            return False
+        self._launch(bot, BroadcastJob(text, parse_mode, notify_chat_id))
+        return True
+
+    async def resume(self, bot) -> bool:
+        """Continue a broadcast interrupted by a restart, if there is one"""
+        job = await asyncio.to_thread(self._load_checkpoint)
+        if job is None:
+            return False
+        logger.info("Resuming broadcast after user %s (%d recipients done)", job.last_id, job.processed)
+        self._launch(bot, job)
+        return True
+
+    async def stop(self, timeout: float = 10.0):
+        """Finish in-flight sends and checkpoint, so the broadcast resumes on the next start"""
+        if not self.running:
+            return
+        self._stopping = True
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout)
+        except asyncio.TimeoutError:
+            # The checkpoint from the last chunk stays; that chunk is sent again
+            self._task.cancel()
+            # Returns once a checkpoint write in progress has landed, so cancel() can remove it
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+        self._task = None
+
+    async def cancel(self) -> bool:
+        """Abandon the running broadcast for good"""
+        if not self.running:
+            return False
+        await self.stop()
+        await asyncio.to_thread(self._remove_checkpoint)
+        self.last_job, self.job = self.job, None
+        return True
+
+    def _launch(self, bot, job: BroadcastJob):
+        self.job = job
+        self._stopping = False
+        self._task = asyncio.create_task(self._run(bot, job))
+
+    async def _run(self, bot, job: BroadcastJob):
+        bucket = TokenBucket(self.rate, 1)
+        slots = asyncio.Semaphore(self.max_in_flight)
+        started = time.monotonic()
+        elapsed_before = job.elapsed
+        try:
+            async for chunk in self.users.user_ids(self.chunk_size, after_id=job.last_id):
+                blocked = []
+                sends = []
+                for user_id in chunk:
+                    delay = bucket.reserve(time.monotonic())
+                    if delay:
+                        await asyncio.sleep(delay)
+                    await slots.acquire()
+                    if self._stopping:
+                        slots.release()
+                        break
+                    sends.append(asyncio.create_task(self._send(bot, job, user_id, blocked, slots)))
+                    job.last_id = user_id
+                await asyncio.gather(*sends)
+                if blocked:
+                    await self.users.remove(blocked)
+                job.elapsed = elapsed_before + time.monotonic() - started
+                await self._write_checkpoint(job)
+                logger.info(
+                    "Broadcast progress: %d sent, %d failed, %d pruned, %.1f/s",
+                    job.sent, job.failed, job.pruned, job.rate
+                )
+                if self._stopping:
+                    logger.info("Broadcast paused after user %s", job.last_id)
+                    return
+        except Exception as e:
+            # Keep the checkpoint: the broadcast resumes on the next start
+            logger.error("Broadcast stopped after user %s: %s", job.last_id, e)
+            return
+
+        job.elapsed = elapsed_before + time.monotonic() - started
+        await asyncio.to_thread(self._remove_checkpoint)
+        self.last_job, self.job = job, None
+        logger.info(
+            "Broadcast finished: %d sent, %d failed, %d pruned in %.0fs (%.1f/s)",
+            job.sent, job.failed, job.pruned, job.elapsed, job.rate
+        )
+        if self.on_finish:
+            try:
+                await self.on_finish(job)
+            except Exception as e:
+                logger.error("Broadcast report failed: %s", e)
+
+    async def _send(self, bot, job: BroadcastJob, user_id: int, blocked: list, slots: asyncio.Semaphore):
+        try:
+            # Flood waits are retried by the outbound limiter
+            await bot.send_message(
+                chat_id=user_id,
+                text=job.text,
+                parse_mode=job.parse_mode,
+                rate_limit_args={'priority': PRIORITY_BULK}
+            )
+        except Forbidden:
+            # Blocked the bot or deleted their account
+            blocked.append(user_id)
+            job.pruned += 1
+            self.pruned += 1
+        except BadRequest as e:
+            if 'chat not found' in e.message.lower():
+                blocked.append(user_id)
+                job.pruned += 1
+                self.pruned += 1
+            else:
+                job.failed += 1
+                self.failed += 1
+                logger.warning("Broadcast to %s failed: %s", user_id, e)
+        except TelegramError as e:
+            job.failed += 1
+            self.failed += 1
+            logger.warning("Broadcast to %s failed: %s", user_id, e)
+        else:
+            job.sent += 1
+            self.sent += 1
+        finally:
+            slots.release()
+
+    async def _write_checkpoint(self, job: BroadcastJob):
+        write = asyncio.ensure_future(asyncio.to_thread(self._save_checkpoint, job))
+        try:
+            await asyncio.shield(write)
+        except asyncio.CancelledError:
+            # The thread cannot be interrupted: wait for it, so nothing writes after the task ends
+            await write
+            raise
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, encoding='utf-8') as f:
+                return BroadcastJob(**json.load(f))
+        except FileNotFoundError:
+            return None
+        except (ValueError, TypeError) as e:
+            logger.error("Ignoring unreadable broadcast checkpoint: %s", e)
+            return None
+
+    def _save_checkpoint(self, job: BroadcastJob):
+        directory = os.path.dirname(self.checkpoint_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.checkpoint_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(job.to_dict(), f)
+        os.replace(temp_path, self.checkpoint_path)
+
+    def _remove_checkpoint(self):
+        try:
+            os.remove(self.checkpoint_path)
+        except FileNotFoundError:
+            pass
+
+    def stats(self) -> dict:
+        job = self.job or self.last_job
+        return {
+            'running': self.running,
+            'sent': self.sent,
+            'failed': self.failed,
+            'pruned': self.pruned,
+            'rate': round(job.rate, 2) if job else 0.0,
+        }
@@ -0,0 +1,167 @@
+"""
+🧮 Safe math engine
+Evaluates arithmetic with an AST walker instead of eval, with hard limits on
+size, magnitude and time so a single expression can never stall the bot.
+"""
+
+import ast
+import asyncio
+import math
+import operator
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from sessions import SessionStore
+
+MAX_LENGTH = 200
+MAX_NODES = 100
+MAX_MAGNITUDE = 10 ** 100
+MAX_EXPONENT = 1000
+TIME_LIMIT = 0.05
+
+BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+
+UNARY_OPERATORS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+
+class MathError(ValueError):
+    """Expression rejected or failed; the message is safe to show to users"""
+
+
+def parse(expression: str):
+    """Parse and validate an expression, returning (tree, node_count)"""
+    if len(expression) > MAX_LENGTH:
+        raise MathError("Expression is too long!")
+    try:
+        tree = ast.parse(expression.strip(), mode='eval')
+    except SyntaxError:
+        raise MathError("Invalid expression!")
+
+    nodes = 0
+    for node in ast.walk(tree):
+        nodes += 1
+        if nodes > MAX_NODES:
+            raise MathError("Expression is too complex!")
+        if isinstance(node, ast.Constant):
+            if type(node.value) not in (int, float):
+                raise MathError("Only numbers are allowed!")
+        elif isinstance(node, ast.BinOp):
+            if type(node.op) not in BINARY_OPERATORS:
+                raise MathError("Unsupported operator!")
+        elif isinstance(node, ast.UnaryOp):
+            if type(node.op) not in UNARY_OPERATORS:
+                raise MathError("Unsupported operator!")
+        elif not isinstance(node, (ast.Expression, ast.operator, ast.unaryop)):
+            raise MathError("Only numbers and basic operators allowed!")
+    return tree, nodes
+
+
+def _check(value):
+    if isinstance(value, float) and not math.isfinite(value):
+        raise MathError("Result is too large!")
+    if abs(value) > MAX_MAGNITUDE:
+        raise MathError("Result is too large!")
+    return value
+
+
+def _power(base, exponent):
+    if abs(exponent) > MAX_EXPONENT and abs(base) not in (0, 1):
+        raise MathError("Exponent is too large!")
+    if base and exponent > 0 and exponent * math.log10(abs(base)) > math.log10(MAX_MAGNITUDE):
+        raise MathError("Result is too large!")
+    return operator.pow(base, exponent)
+
+
+def _evaluate_node(node, deadline: float):
+    if time.perf_counter() > deadline:
+        raise MathError("Calculation took too long!")
+    if isinstance(node, ast.Expression):
+        return _evaluate_node(node.body, deadline)
+    if isinstance(node, ast.Constant):
+        return _check(node.value)
+    if isinstance(node, ast.UnaryOp):
+        return UNARY_OPERATORS[type(node.op)](_evaluate_node(node.operand, deadline))
+    left = _evaluate_node(node.left, deadline)
+    right = _evaluate_node(node.right, deadline)
+    op_type = type(node.op)
+    try:
+        if op_type is ast.Pow:
+            result = _power(left, right)
+        else:
+            result = BINARY_OPERATORS[op_type](left, right)
+    except ZeroDivisionError:
+        raise MathError("Division by zero!")
+    except OverflowError:
+        raise MathError("Result is too large!")
+    if isinstance(result, complex):
+        raise MathError("Result is not a real number!")
+    return _check(result)
+
+
+def evaluate(expression: str, time_limit: float = TIME_LIMIT):
+    """Evaluate an arithmetic expression synchronously within the limits"""
+    tree, _ = parse(expression)
+    return _evaluate_node(tree, time.perf_counter() + time_limit)
+
+
+class MathEngine:
+    """Cached evaluator that can offload heavy expressions to a worker process"""
+
+    def __init__(self, workers: int = 0, cache_size: int = 1024, heavy_nodes: int = 40, timeout: float = 1.0):
+        self.heavy_nodes = heavy_nodes
+        self.timeout = timeout
+        self._cache = SessionStore(max_size=cache_size)
+        self._pool = ProcessPoolExecutor(max_workers=workers) if workers else None
+        self.hits = 0
+        self.misses = 0
+
+    async def evaluate(self, expression: str):
+        """Return the result or raise MathError"""
+        key = ' '.join(expression.split())
+        cached = self._cache.get(key)
+        if cached is not None:
+            self.hits += 1
+            if isinstance(cached, str):
+                # A fresh exception each time: re-raising one instance would grow its traceback
+                raise MathError(cached)
+            return cached
+        self.misses += 1
+
+        try:
+            tree, nodes = parse(key)
+            if self._pool and nodes > self.heavy_nodes:
+                loop = asyncio.get_running_loop()
+                try:
+                    result = await asyncio.wait_for(
+                        loop.run_in_executor(self._pool, evaluate, key, self.timeout),
+                        timeout=self.timeout
+                    )
+                except asyncio.TimeoutError:
+                    raise MathError("Calculation took too long!")
+            else:
+                result = _evaluate_node(tree, time.perf_counter() + TIME_LIMIT)
+        except MathError as e:
+            # Only the message, so the cache does not keep the handler's frames alive
+            self._cache.set(key, str(e))
+            raise
+
+        self._cache.set(key, result)
+        return result
+
+    def close(self):
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'cache': self._cache.stats()}
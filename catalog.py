@@ -0,0 +1,298 @@
+"""
+📚 Content catalog
+Jokes, facts, animals, quotes and quiz questions compiled from JSON-lines
+sources into compact, memory-mapped files. Items are decoded only when
+picked, each user gets every item once before any repeats, and edited
+sources are picked up without a restart.
+"""
+
+import asyncio
+import json
+import logging
+import mmap
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from array import array
+
+from sessions import SessionStore
+
+logger = logging.getLogger(__name__)
+
+# File layout: header | UTF-8 JSON records | (count + 1) uint32 offsets
+MAGIC = b'BCAT'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sIII')  # magic, format version, item count, index position
+OFFSET = struct.Struct('<I')
+SPAN = struct.Struct('<II')
+
+
+class CatalogError(Exception):
+    pass
+
+
+def build_catalog(source: str, target: str) -> int:
+    """Compile a JSON-lines source into a catalog file and return its item count
+
+    The file is written next to the target and renamed into place, so
+    readers always see either the old or the new catalog. Each build gets
+    its own temporary file: scale-out workers sharing the build directory
+    may compile the same catalog at once.
+    """
+    directory = os.path.dirname(target)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    fd, temp = tempfile.mkstemp(prefix=f"{os.path.basename(target)}.", suffix='.tmp', dir=directory or '.')
+    os.close(fd)
+    try:
+        count = _write_catalog(source, temp)
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+    os.replace(temp, target)
+    return count
+
+
+def _write_catalog(source: str, path: str) -> int:
+    offsets = array('I')
+    with open(source, 'rb') as src, open(path, 'wb') as out:
+        out.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, 0))
+        position = HEADER.size
+        for line_number, line in enumerate(src, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                raise CatalogError(f"{source}:{line_number}: {e}") from None
+            record = json.dumps(item, ensure_ascii=False, separators=(',', ':')).encode()
+            offsets.append(position)
+            out.write(record)
+            position += len(record)
+        if position > 0xFFFFFFFF:
+            raise CatalogError(f"{source} is too large for the catalog format")
+        offsets.append(position)
+        if sys.byteorder != 'little':
+            offsets.byteswap()
+        offsets.tofile(out)
+        out.seek(0)
+        out.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(offsets) - 1, position))
+    return len(offsets) - 1
+
+
+class Catalog:
+    """One memory-mapped catalog file
+
+    Nothing is read until the first access. Items are decoded from the
+    map on every access; the offset index is never copied into memory.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.version = 0
+        self._file = None
+        self._map = None
+        self._count = 0
+        self._index = 0
+        self._identity = None
+
+    def __len__(self):
+        if self._map is None:
+            self.load()
+        return self._count
+
+    def __getitem__(self, index: int):
+        if self._map is None:
+            self.load()
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        start, end = SPAN.unpack_from(self._map, self._index + index * OFFSET.size)
+        return json.loads(self._map[start:end])
+
+    def checksum(self, index: int) -> int:
+        """CRC32 of an item's encoded record: changes whenever the item does, no decoding"""
+        if self._map is None:
+            self.load()
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        start, end = SPAN.unpack_from(self._map, self._index + index * OFFSET.size)
+        return zlib.crc32(self._map[start:end])
+
+    def load(self):
+        """Map the file, replacing any previously mapped version"""
+        f = open(self.path, 'rb')
+        try:
+            st = os.fstat(f.fileno())
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            f.close()
+            raise
+        magic, fmt, count, index = HEADER.unpack_from(mapped, 0)
+        if magic != MAGIC or fmt != FORMAT_VERSION:
+            mapped.close()
+            f.close()
+            raise CatalogError(f"{self.path} is not a catalog file (format {fmt})")
+        self.close()
+        self._file, self._map = f, mapped
+        self._count, self._index = count, index
+        self._identity = (st.st_ino, st.st_mtime_ns, st.st_size)
+        self.version += 1
+
+    def changed(self) -> bool:
+        """Whether the file on disk differs from the mapped one"""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        return (st.st_ino, st.st_mtime_ns, st.st_size) != self._identity
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+            self._map = self._file = None
+
+
+class SeenSet:
+    """Bitset of the catalog items one user has already been shown"""
+    __slots__ = ('bits', 'size', 'seen')
+
+    def __init__(self, size: int):
+        self.size = size
+        self.reset()
+
+    def reset(self):
+        self.bits = bytearray((self.size + 7) // 8)
+        self.seen = 0
+        if self.size % 8:
+            # Mark the padding bits as seen so they are never picked
+            self.bits[-1] = 0xFF & ~((1 << (self.size % 8)) - 1)
+
+    def pick(self, rng) -> int:
+        """Mark and return a random unseen index, starting over once all are seen"""
+        if self.seen >= self.size:
+            self.reset()
+        bits = self.bits
+        # Random probes almost always hit while most items are unseen
+        for _ in range(8):
+            index = rng.randrange(self.size)
+            if not bits[index >> 3] & (1 << (index & 7)):
+                return self._mark(index)
+        # Mostly seen: scan from a random byte for one with a free bit
+        start = rng.randrange(len(bits))
+        for offset in range(len(bits)):
+            byte_index = (start + offset) % len(bits)
+            free = ~bits[byte_index] & 0xFF
+            if free:
+                bit = rng.choice([b for b in range(8) if free & (1 << b)])
+                return self._mark(byte_index * 8 + bit)
+        raise AssertionError("seen count out of sync with bitset")
+
+    def _mark(self, index: int) -> int:
+        self.bits[index >> 3] |= 1 << (index & 7)
+        self.seen += 1
+        return index
+
+
+class ContentCatalog:
+    """Every content kind, compiled on demand from source_dir into build_dir
+
+    Each kind is a `<kind>.jsonl` source compiled to `<kind>.cat`. At most
+    once per reload_interval, an access checks whether the source was
+    edited (recompiled off the event loop) or the compiled file was
+    replaced (remapped). Per-user seen sets are kept in a bounded LRU.
+    """
+
+    def __init__(self, source_dir: str, build_dir: str, reload_interval: float = 30,
+                 max_users: int = 10000, ttl: float = None):
+        self.source_dir = source_dir
+        self.build_dir = build_dir
+        self.reload_interval = reload_interval
+        self._catalogs = {}
+        self._checked = {}  # kind -> monotonic time of the last reload check
+        self._seen = SessionStore(max_size=max_users, ttl=ttl)
+        self._lock = asyncio.Lock()
+        self._random = random.Random()
+        self.reloads = 0
+
+    async def catalog(self, kind: str) -> Catalog:
+        """The catalog for a kind, compiled and reloaded as needed"""
+        catalog = self._catalogs.get(kind)
+        now = time.monotonic()
+        if catalog is not None and now - self._checked[kind] < self.reload_interval:
+            return catalog
+        async with self._lock:
+            catalog = self._catalogs.get(kind)
+            if catalog is not None and now - self._checked[kind] < self.reload_interval:
+                return catalog
+            self._checked[kind] = now
+            source = os.path.join(self.source_dir, f"{kind}.jsonl")
+            target = os.path.join(self.build_dir, f"{kind}.cat")
+            if self._stale(source, target):
+                try:
+                    count = await asyncio.to_thread(build_catalog, source, target)
+                except (CatalogError, OSError) as e:
+                    if catalog is None:
+                        raise
+                    # Keep serving the last good version until the source is fixed
+                    logger.error("Could not recompile %s catalog: %s", kind, e)
+                else:
+                    logger.info("Compiled %d %s into %s", count, kind, target)
+            if catalog is None:
+                catalog = self._catalogs[kind] = Catalog(target)
+                catalog.load()
+            elif catalog.changed():
+                catalog.load()
+                self.reloads += 1
+                logger.info("Reloaded %s catalog (%d items)", kind, len(catalog))
+            return catalog
+
+    @staticmethod
+    def _stale(source: str, target: str) -> bool:
+        try:
+            source_mtime = os.stat(source).st_mtime_ns
+        except FileNotFoundError:
+            # Compiled catalogs may be shipped without their sources
+            return False
+        try:
+            return os.stat(target).st_mtime_ns < source_mtime
+        except FileNotFoundError:
+            return True
+
+    async def get(self, kind: str, index: int):
+        """Item by index, or None if the catalog no longer has it"""
+        catalog = await self.catalog(kind)
+        if not 0 <= index < len(catalog):
+            return None
+        return catalog[index]
+
+    async def pick(self, kind: str, user_id: int):
+        """Random (index, item) the user has not seen since their last full cycle"""
+        catalog = await self.catalog(kind)
+        if not len(catalog):
+            raise CatalogError(f"The {kind} catalog is empty")
+        key = (kind, user_id)
+        seen = self._seen.get(key)
+        if seen is None or seen.size != len(catalog):
+            # New user, or the catalog was resized by a reload
+            seen = SeenSet(len(catalog))
+            self._seen.set(key, seen)
+        index = seen.pick(self._random)
+        return index, catalog[index]
+
+    def close(self):
+        for catalog in self._catalogs.values():
+            catalog.close()
+
+    def stats(self) -> dict:
+        return {
+            'items': {kind: len(catalog) for kind, catalog in self._catalogs.items()},
+            'reloads': self.reloads,
+            'tracked_users': len(self._seen),
+        }
@@ -0,0 +1,204 @@
+"""
+📥 Webhook ingress
+Acknowledges webhook calls as soon as the body is read. Raw bodies wait in
+a bounded queue and one consumer task decodes them in arrival order,
+handing each to the application only once the update processor has room
+for it. Redelivered update_ids are acknowledged and dropped; a full queue,
+or a chat whose backlog is at the processor's limit, answers 503 so
+Telegram redelivers later instead of the update being shed after it was
+acknowledged.
+"""
+
+import asyncio
+import json
+import logging
+import re
+from collections import deque
+
+from aiohttp import web
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+logger = logging.getLogger(__name__)
+
+# update_id is a top-level integer and no nested Bot API object has one,
+# so a search finds it without decoding the body
+UPDATE_ID = re.compile(rb'"update_id"\s*:\s*(\d+)')
+# Telegram writes a message's chat before any nested message, and a chat's
+# id first, so the first match is the chat the update belongs to
+CHAT_ID = re.compile(rb'"chat"\s*:\s*\{\s*"id"\s*:\s*(-?\d+)')
+FROM_ID = re.compile(rb'"from"\s*:\s*\{\s*"id"\s*:\s*(\d+)')
+
+
+class RecentIds:
+    """Bounded set of recently seen update ids; the oldest are forgotten first"""
+
+    def __init__(self, size: int = 10000):
+        self.size = size
+        self._order = deque()
+        self._ids = set()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, update_id):
+        return update_id in self._ids
+
+    def add(self, update_id):
+        if update_id in self._ids:
+            return
+        self._ids.add(update_id)
+        self._order.append(update_id)
+        if len(self._order) > self.size:
+            self._ids.discard(self._order.popleft())
+
+
+def ordering_key(body: bytes):
+    """The update processor's ordering key (chat id, else ('user', id)), found without decoding
+
+    A best guess for uncommon update shapes: it only decides early 503s,
+    and the consumer's admission is what keeps updates from being shed.
+    """
+    match = CHAT_ID.search(body)
+    if match is not None:
+        return int(match.group(1))
+    match = FROM_ID.search(body)
+    if match is not None:
+        return ('user', int(match.group(1)))
+    return None
+
+
+class WebhookIngress:
+    """Webhook listener feeding an Application's update queue
+
+    Until go_live() is called, bodies stay queued; a fast_path object (with
+    answer(update) -> webhook reply or None) may answer some of them
+    directly in the meantime.
+    """
+
+    def __init__(self, token: str, fast_path=None, queue_size: int = 1000, dedupe_window: int = 10000):
+        self.token = token
+        self.fast_path = fast_path
+        self.application = None
+        self._queue = asyncio.Queue(maxsize=queue_size)
+        # Queued bodies per ordering key, to refuse chats that are already backed up
+        self._queued = {}
+        self._seen = RecentIds(dedupe_window)
+        self._runner = None
+        self._consumer = None
+        self.received = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.malformed = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    async def start(self, host: str, port: int):
+        app = web.Application()
+        app.router.add_post(f'/{self.token}', self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+    async def stop(self, timeout: float = 5.0):
+        """Stop accepting calls, then hand over what was already acknowledged"""
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+        if self._consumer:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Dropping %d acknowledged updates at shutdown", self._queue.qsize())
+            self._consumer.cancel()
+            self._consumer = None
+
+    def go_live(self, application) -> int:
+        """Start feeding the application; returns how many updates were waiting"""
+        self.application = application
+        self._consumer = asyncio.create_task(self._consume())
+        return self._queue.qsize()
+
+    async def _handle(self, request):
+        body = await request.read()
+        self.received += 1
+        match = UPDATE_ID.search(body)
+        if match is None:
+            self.malformed += 1
+            return web.Response(status=400)
+        update_id = int(match.group(1))
+        if update_id in self._seen:
+            self.duplicates += 1
+            return web.Response()
+
+        if self.application is None and self.fast_path is not None:
+            try:
+                reply = self.fast_path.answer(loads(body))
+            except ValueError:
+                self.malformed += 1
+                return web.Response(status=400)
+            if reply is not None:
+                self._seen.add(update_id)
+                return web.json_response(reply)
+
+        key = ordering_key(body)
+        if self._backed_up(key):
+            return self._reject()
+        try:
+            self._queue.put_nowait((key, body))
+        except asyncio.QueueFull:
+            return self._reject()
+        self._queued[key] = self._queued.get(key, 0) + 1
+        self._seen.add(update_id)
+        return web.Response()
+
+    def _backed_up(self, key) -> bool:
+        """Whether the chat already has as many updates waiting as the processor will take"""
+        processor = self.application.update_processor if self.application else None
+        if key is None or not hasattr(processor, 'pending_for'):
+            return False
+        return self._queued.get(key, 0) + processor.pending_for(key) >= processor.max_pending_per_chat
+
+    def _reject(self):
+        # Not marked as seen, so Telegram's redelivery is accepted later
+        self.rejected += 1
+        return web.Response(status=503, headers={'Retry-After': '1'})
+
+    async def _consume(self):
+        from telegram import Update
+
+        bot = self.application.bot
+        wait_for_room = getattr(self.application.update_processor, 'wait_for_room', None)
+        while True:
+            key, body = await self._queue.get()
+            try:
+                update = Update.de_json(loads(body), bot)
+            except Exception as e:
+                self.malformed += 1
+                logger.error("Could not decode update: %s", e)
+            else:
+                if wait_for_room is not None:
+                    # Wait for room rather than let the processor shed an acknowledged update;
+                    # meanwhile the queue fills and new calls are refused with 503
+                    await wait_for_room(update)
+                await self.application.update_queue.put(update)
+            finally:
+                count = self._queued.pop(key, 1) - 1
+                if count:
+                    self._queued[key] = count
+                self._queue.task_done()
+
+    def stats(self) -> dict:
+        return {
+            'received': self.received,
+            'duplicates': self.duplicates,
+            'rejected': self.rejected,
+            'malformed': self.malformed,
+            'queue_depth': self._queue.qsize(),
+        }
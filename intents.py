@@ -0,0 +1,74 @@
+"""
+💬 Intent matcher
+Classifies free text against keyword tables in a single pass using an
+Aho-Corasick automaton built once at startup.
+"""
+
+import json
+from collections import deque
+
+
+class IntentMatcher:
+    """Substring keyword matcher; earlier intents win when several match"""
+
+    def __init__(self, intents, fallback):
+        self.names = [intent['name'] for intent in intents]
+        self.responses = {intent['name']: intent['responses'] for intent in intents}
+        self.fallback = fallback['name']
+        self.responses[self.fallback] = fallback['responses']
+        self._build([(keyword.lower(), index) for index, intent in enumerate(intents) for keyword in intent['keywords']])
+
+    @classmethod
+    def from_file(cls, path: str):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['intents'], data['fallback'])
+
+    def _build(self, keywords):
+        # State 0 is the root; each state has goto edges, a fail link and outputs
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for keyword, intent_index in keywords:
+            state = 0
+            for char in keyword:
+                nxt = self._goto[state].get(char)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][char] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = nxt
+            self._out[state].append((len(keyword), intent_index))
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(char, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def classify(self, text: str):
+        """Return (intent, spans) where spans are (start, end) of the winning intent's keywords"""
+        goto, fail, out = self._goto, self._fail, self._out
+        best = len(self.names)
+        spans = []
+        state = 0
+        for position, char in enumerate(text.lower()):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, intent_index in out[state]:
+                if intent_index < best:
+                    best = intent_index
+                    spans = []
+                if intent_index == best:
+                    spans.append((position + 1 - length, position + 1))
+        if best == len(self.names):
+            return self.fallback, []
+        return self.names[best], spans
@@ -0,0 +1,122 @@
+"""
+🔄 Process lifecycle
+Graceful stop and warm restart. On SIGTERM the entry point stops taking
+updates and in-flight handlers get a deadline to finish; state that only
+lives in memory (game sessions, which users were cached) is written to a
+snapshot that the next start restores in one bulk load. The time from
+process start, and from the previous process's SIGTERM, to the first
+response is measured so deploy blips can be tracked.
+"""
+
+import asyncio
+import logging
+import os
+import pickle
+import signal
+import time
+
+logger = logging.getLogger(__name__)
+
+# Wall-clock time this module was first imported, i.e. close to process start
+PROCESS_STARTED = time.time()
+
+# Bot API calls made while starting up or polling, which are not responses to users
+SETUP_METHODS = frozenset({'getMe', 'getUpdates', 'setWebhook', 'deleteWebhook', 'getWebhookInfo'})
+
+
+class Lifecycle:
+    """Stop signal, drain deadline, snapshot file and restart timings for one process"""
+
+    def __init__(self, snapshot_path: str, drain_timeout: float = 20.0):
+        self.snapshot_path = snapshot_path
+        self.drain_timeout = drain_timeout
+        self._stop = asyncio.Event()
+        self.stop_requested = None
+        # When the previous process began stopping, from its snapshot
+        self.previous_stop = None
+        self.first_response = None
+        self.aborted = 0
+
+    def install_signal_handlers(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.request_stop)
+
+    def request_stop(self):
+        if self._stop.is_set():
+            return
+        self.stop_requested = time.time()
+        logger.info("Stop requested; no longer taking updates")
+        self._stop.set()
+
+    async def wait(self):
+        await self._stop.wait()
+
+    async def drain(self, application, processor) -> bool:
+        """Let queued and in-flight updates finish; abort what is left at the deadline
+
+        Call after intake has stopped and before application.stop(), which
+        would otherwise wait for every handler without a limit.
+        """
+        started = time.monotonic()
+        deadline = started + self.drain_timeout
+        while application.update_queue.qsize() or processor.pending:
+            if time.monotonic() >= deadline:
+                self.aborted = processor.abort()
+                logger.warning("Drain deadline of %gs passed; aborted %d updates", self.drain_timeout, self.aborted)
+                return False
+            await asyncio.sleep(0.05)
+        logger.info("Drained in-flight updates in %.2fs", time.monotonic() - started)
+        return True
+
+    def responded(self, at: float = None):
+        """Record the first response to a user (at is a wall-clock time, default now)"""
+        if self.first_response is not None:
+            return
+        self.first_response = time.time() if at is None else at
+        if self.previous_stop is None:
+            logger.info("First response %.2fs after process start", self.first_response - PROCESS_STARTED)
+        else:
+            logger.info(
+                "First response %.2fs after process start, %.2fs after the previous process began stopping",
+                self.first_response - PROCESS_STARTED, self.first_response - self.previous_stop
+            )
+
+    async def load_state(self) -> dict:
+        """The previous process's snapshot (consumed, so it is restored only once), or {}"""
+        state = await asyncio.to_thread(self._read_snapshot)
+        self.previous_stop = state.get('stopped_at')
+        return state
+
+    async def save_state(self, state: dict):
+        state = dict(state, stopped_at=self.stop_requested or time.time())
+        await asyncio.to_thread(self._write_snapshot, state)
+
+    def _read_snapshot(self) -> dict:
+        try:
+            with open(self.snapshot_path, 'rb') as f:
+                state = pickle.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.error("Ignoring unreadable state snapshot: %s", e)
+            state = {}
+        os.remove(self.snapshot_path)
+        return state
+
+    def _write_snapshot(self, state: dict):
+        directory = os.path.dirname(self.snapshot_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.snapshot_path}.tmp"
+        with open(temp_path, 'wb') as f:
+            pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self.snapshot_path)
+
+    def stats(self) -> dict:
+        first = self.first_response
+        return {
+            'first_response_seconds': round(first - PROCESS_STARTED, 3) if first else None,
+            'restart_gap_seconds': round(first - self.previous_stop, 3) if first and self.previous_stop else None,
+            'aborted_updates': self.aborted,
+        }
@@ -0,0 +1,259 @@
+"""
+📝 Logging
+Log records are handed to a bounded queue on the calling thread and
+formatted and written by a background thread, so log I/O never blocks the
+event loop. Records are JSON objects carrying the update being handled
+(update id, chat, user), the handler it reached and the time spent on it
+so far. Below WARNING, each level keeps a fixed number of records per
+second and samples the rest, so logging cost stays bounded at peak.
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+try:
+    import orjson
+
+    def dumps(obj) -> str:
+        return orjson.dumps(obj, default=str).decode()
+except ImportError:
+    def dumps(obj) -> str:
+        return json.dumps(obj, default=str, ensure_ascii=False)
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Records per second kept in full, then the share of the rest kept, by level
+DEFAULT_SAMPLING = {logging.DEBUG: (20, 0.0), logging.INFO: (100, 0.05)}
+
+# Attributes every LogRecord has; anything else came in through extra=
+RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+CONTEXT_FIELDS = ('update_id', 'chat_id', 'user_id', 'handler', 'latency_ms', 'sample_rate')
+
+
+class UpdateContext:
+    """The update the current task is handling"""
+    __slots__ = ('update_id', 'chat_id', 'user_id', 'handler', 'started')
+
+    def __init__(self, update_id, chat_id, user_id):
+        self.update_id = update_id
+        self.chat_id = chat_id
+        self.user_id = user_id
+        self.handler = None
+        self.started = time.perf_counter()
+
+    @property
+    def latency_ms(self) -> float:
+        return round((time.perf_counter() - self.started) * 1000, 1)
+
+
+_current = contextvars.ContextVar('update_context', default=None)
+
+
+def bind_update(update) -> contextvars.Token:
+    """Attach an update to records logged by the current task, until unbind()"""
+    chat = getattr(update, 'effective_chat', None)
+    user = getattr(update, 'effective_user', None)
+    return _current.set(UpdateContext(
+        getattr(update, 'update_id', None),
+        chat.id if chat else None,
+        user.id if user else None
+    ))
+
+
+def unbind(token: contextvars.Token):
+    _current.reset(token)
+
+
+def current():
+    """The UpdateContext of the current task, or None outside update handling"""
+    return _current.get()
+
+
+def set_handler(name: str):
+    context = _current.get()
+    if context is not None:
+        context.handler = name
+
+
+class ContextFilter(logging.Filter):
+    """Copies the current update context onto records
+
+    Runs on the logging thread, since context variables are not visible
+    from the writer thread. Values passed through extra= take precedence.
+    """
+
+    def filter(self, record) -> bool:
+        context = _current.get()
+        if context is not None and not hasattr(record, 'update_id'):
+            record.update_id = context.update_id
+            record.chat_id = context.chat_id
+            record.user_id = context.user_id
+            record.handler = context.handler
+            if not hasattr(record, 'latency_ms'):
+                record.latency_ms = context.latency_ms
+        return True
+
+
+class LevelSampler(logging.Filter):
+    """Keeps the first burst records per second of a level, then a random share
+
+    sampling maps a level to (burst, rate); levels not listed, WARNING and
+    above in the default table, always pass. Sampled records carry their
+    sample_rate so counts can be scaled back up downstream.
+    """
+
+    def __init__(self, sampling: dict = None):
+        super().__init__()
+        self.sampling = DEFAULT_SAMPLING if sampling is None else sampling
+        self._second = 0
+        self._counts = {}
+        self._random = random.Random()
+        self.sampled_out = 0
+
+    def filter(self, record) -> bool:
+        limits = self.sampling.get(record.levelno)
+        if limits is None:
+            return True
+        burst, rate = limits
+        second = int(record.created)
+        if second != self._second:
+            self._second = second
+            self._counts.clear()
+        count = self._counts.get(record.levelno, 0) + 1
+        self._counts[record.levelno] = count
+        if count <= burst:
+            return True
+        if rate and self._random.random() < rate:
+            record.sample_rate = rate
+            return True
+        self.sampled_out += 1
+        return False
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, context and extras"""
+
+    def format(self, record) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for name in CONTEXT_FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                entry[name] = value
+        for name, value in vars(record).items():
+            if name not in RECORD_ATTRIBUTES and name not in entry:
+                entry[name] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = record.stack_info
+        return dumps(entry)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops records, and counts them, when the queue is full"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._exceptions = logging.Formatter()
+
+    def prepare(self, record):
+        # Resolve arguments and tracebacks now: the objects may change or be freed before the writer gets to them
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self._exceptions.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogPipeline:
+    """Root handler feeding a background writer thread"""
+
+    def __init__(self, level=logging.INFO, fmt: str = 'json', queue_size: int = 10000,
+                 sampling: dict = None, stream=None):
+        self.queue = queue.Queue(queue_size)
+        self.sampler = LevelSampler(sampling)
+        self.handler = DroppingQueueHandler(self.queue)
+        # Sample first, so dropped records never pay for context or formatting
+        self.handler.addFilter(self.sampler)
+        self.handler.addFilter(ContextFilter())
+        writer = logging.StreamHandler(sys.stderr if stream is None else stream)
+        writer.setFormatter(JsonFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT))
+        self.listener = QueueListener(self.queue, writer)
+        self.level = level
+        self.running = False
+
+    def start(self):
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        root.addHandler(self.handler)
+        root.setLevel(self.level)
+        self.listener.start()
+        self.running = True
+        # Write out whatever is still queued when the process exits
+        atexit.register(self.stop)
+
+    def stop(self):
+        if self.running:
+            self.running = False
+            self.listener.stop()
+
+    def stats(self) -> dict:
+        return {
+            'queued': self.queue.qsize(),
+            'dropped': self.handler.dropped,
+            'sampled_out': self.sampler.sampled_out,
+        }
+
+
+def parse_sampling(spec: str) -> dict:
+    """'INFO:100:0.05,DEBUG:20:0' -> {level: (burst per second, rate)}"""
+    sampling = {}
+    for item in spec.replace(' ', '').split(','):
+        if not item:
+            continue
+        level, burst, rate = item.split(':')
+        sampling[logging.getLevelName(level.upper())] = (int(burst), float(rate))
+    return sampling
+
+
+_pipeline = None
+
+
+def setup_from_env() -> LogPipeline:
+    """Install the pipeline configured by the LOG_* variables (once per process)"""
+    global _pipeline
+    if _pipeline is None:
+        sampling = os.environ.get('LOG_SAMPLING')
+        _pipeline = LogPipeline(
+            level=os.environ.get('LOG_LEVEL', 'INFO').upper(),
+            fmt=os.environ.get('LOG_FORMAT', 'json'),
+            queue_size=int(os.environ.get('LOG_QUEUE_SIZE', 10000)),
+            sampling=parse_sampling(sampling) if sampling is not None else None
+        )
+        _pipeline.start()
+    return _pipeline
@@ -0,0 +1,245 @@
+"""
+📈 Metrics and instrumentation
+Counters, gauges and histograms rendered in Prometheus text format, a
+handler wrapper that times every update, and a sampling profiler that can
+be switched on and off at runtime.
+"""
+
+import bisect
+import functools
+import logging
+import sys
+import threading
+import time
+from collections import Counter as TallyCounter
+
+import logs
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ''
+    pairs = ','.join(f'{n}="{str(v)}"' for n, v in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for label_values, value in self._values.items():
+            yield f"{self.name}{_labels(self.label_names, label_values)} {value}"
+
+
+class Gauge:
+    """Gauge read from a callback at scrape time"""
+
+    def __init__(self, name: str, help_text: str, func):
+        self.name = name
+        self.help = help_text
+        self.func = func
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        yield f"{self.name} {self.func()}"
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, *label_values):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def snapshot(self) -> dict:
+        """label values -> copy of [bucket counts..., sum, count]"""
+        return {label_values: list(series) for label_values, series in self._series.items()}
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        names = self.label_names + ('le',)
+        for label_values, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                yield f"{self.name}_bucket{_labels(names, label_values + (bound,))} {cumulative}"
+            yield f"{self.name}_bucket{_labels(names, label_values + ('+Inf',))} {series[-1]}"
+            yield f"{self.name}_sum{_labels(self.label_names, label_values)} {series[-2]}"
+            yield f"{self.name}_count{_labels(self.label_names, label_values)} {series[-1]}"
+
+
+class SamplingProfiler:
+    """Samples the event loop thread's stack from a background thread"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples = TallyCounter()
+        self._thread = None
+        self._stop = threading.Event()
+        self._target = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self):
+        if self.running:
+            return
+        self._target = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self.running:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        """Stacks in collapsed format (one 'frame;frame;frame count' per line)"""
+        return '\n'.join(f"{stack} {count}" for stack, count in self.samples.most_common())
+
+
+class Metrics:
+    """Registry of every metric the bot exports"""
+
+    def __init__(self):
+        self._metrics = []
+        self.updates = self.counter('bot_updates_total', 'Updates received')
+        self.handler_calls = self.counter('bot_handler_calls_total', 'Handler invocations', ('handler',))
+        self.handler_errors = self.counter('bot_handler_errors_total', 'Handler exceptions', ('handler',))
+        self.handler_latency = self.histogram('bot_handler_seconds', 'Handler latency', ('handler',))
+        self.api_calls = self.counter('bot_api_calls_total', 'Bot API calls', ('endpoint', 'outcome'))
+        self.api_latency = self.histogram('bot_api_seconds', 'Bot API call latency', ('endpoint',))
+        self.profiler = SamplingProfiler()
+
+    def counter(self, name: str, help_text: str, labels=()) -> Counter:
+        metric = Counter(name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labels=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, help_text: str, func) -> Gauge:
+        metric = Gauge(name, help_text, func)
+        self._metrics.append(metric)
+        return metric
+
+    def instrument(self, name: str, handler):
+        """Wrap a handler coroutine to record its count, errors and latency"""
+        @functools.wraps(handler)
+        async def wrapper(*args, **kwargs):
+            logs.set_handler(name)
+            started = time.perf_counter()
+            try:
+                return await handler(*args, **kwargs)
+            except Exception:
+                self.handler_errors.inc(name)
+                raise
+            finally:
+                self.handler_calls.inc(name)
+                self.handler_latency.observe(time.perf_counter() - started, name)
+        return wrapper
+
+    def observe_api_call(self, endpoint: str, seconds: float, ok: bool):
+        self.api_calls.inc(endpoint, 'ok' if ok else 'error')
+        self.api_latency.observe(seconds, endpoint)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsServer:
+    """Serves /metrics and the profiler toggle on a local port
+
+    aiohttp's server is imported only when started, so importing this
+    module stays cheap when metrics are switched off.
+    """
+
+    def __init__(self, metrics: Metrics, host: str, port: int):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    async def start(self):
+        from aiohttp import web
+        app = web.Application()
+        app.router.add_get('/metrics', self._metrics)
+        app.router.add_get('/debug/profile', self._profile)
+        app.router.add_post('/debug/profile/start', self._profile_start)
+        app.router.add_post('/debug/profile/stop', self._profile_stop)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info("Metrics available at http://%s:%s/metrics", self.host, self.port)
+
+    async def stop(self):
+        self.metrics.profiler.stop()
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _metrics(self, request):
+        from aiohttp import web
+        return web.Response(text=self.metrics.render(), content_type='text/plain', charset='utf-8')
+
+    async def _profile(self, request):
+        from aiohttp import web
+        return web.Response(text=self.metrics.profiler.collapsed())
+
+    async def _profile_start(self, request):
+        from aiohttp import web
+        self.metrics.profiler.samples.clear()
+        self.metrics.profiler.start()
+        return web.Response(text='profiling started\n')
+
+    async def _profile_stop(self, request):
+        from aiohttp import web
+        self.metrics.profiler.stop()
+        return web.Response(text='profiling stopped\n')
@@ -0,0 +1,262 @@
+"""
+🚦 Outbound rate limiting
+A BaseRateLimiter for the Bot API with per-chat and global token buckets,
+a priority queue for the global budget, droppable animation frames and
+automatic RetryAfter handling.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_REPLY = 0
+PRIORITY_ANIMATION = 1
+# Broadcasts yield the global budget to everything interactive
+PRIORITY_BULK = 2
+
+
+def animation_frame(chat_id: int, message_id: int) -> dict:
+    """rate_limit_args for a cosmetic edit that may be dropped or coalesced"""
+    return {'priority': PRIORITY_ANIMATION, 'droppable': True, 'coalesce_key': (chat_id, message_id)}
+
+
+class TokenBucket:
+    """Reservation-based token bucket (tokens may go negative to queue callers)"""
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self, now: float) -> bool:
+        """Take a token only if one is available right now"""
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def reserve(self, now: float) -> float:
+        """Take a token and return how long the caller must wait for it"""
+        self._refill(now)
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class OutboundLimiter(BaseRateLimiter):
+    """Paces Bot API calls to stay under Telegram's flood limits
+
+    Requests first wait for their chat's bucket, then queue for the global
+    budget in priority order. Replies to private chats only take a chat
+    token if one is free: Telegram tolerates short bursts there, and
+    pacing a user's own replies just delays them. Group replies, bulk
+    sends and animations are paced. Droppable requests (animation frames)
+    are skipped instead of queued when there is no spare capacity, and a
+    newer frame for the same message replaces an older one still queued.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = 30,
+        chat_rate: float = 1,
+        chat_burst: float = 3,
+        group_rate: float = 20 / 60,
+        max_animation_depth: int = 10,
+        max_retries: int = 5,
+    ):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.max_animation_depth = max_animation_depth
+        self.max_retries = max_retries
+
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats = {}
+        self._queue = []
+        self._seq = itertools.count()
+        self._latest_frame = {}
+        self._wakeup = None
+        self._pump_task = None
+        self._paused_until = 0.0
+
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.retry_after_count = 0
+        self.errors = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        # Exponentially weighted share of recent calls that failed or hit 429
+        self.error_rate = 0.0
+        # Optional hook called as on_api_call(endpoint, seconds, ok)
+        self.on_api_call = None
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    async def initialize(self) -> None:
+        # The Updater initializes the bot a second time; keep a single pump
+        if self._pump_task:
+            return
+        self._wakeup = asyncio.Event()
+        self._pump_task = asyncio.create_task(self._pump())
+
+    async def shutdown(self) -> None:
+        if self._pump_task:
+            self._pump_task.cancel()
+            try:
+                await self._pump_task
+            except asyncio.CancelledError:
+                pass
+            self._pump_task = None
+
+    @staticmethod
+    def _is_group(chat_id) -> bool:
+        # Negative ids are groups and channels, which have a much lower limit
+        return isinstance(chat_id, int) and chat_id < 0
+
+    def _chat_bucket(self, chat_id, now: float) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if self._is_group(chat_id):
+                bucket = TokenBucket(self.group_rate, 1)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chats[chat_id] = bucket
+            if len(self._chats) > 10000:
+                self._chats = {key: b for key, b in self._chats.items() if not b.idle(now)}
+        return bucket
+
+    async def _pump(self):
+        """Release queued requests against the global bucket in priority order"""
+        while True:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            delay = self._global.reserve(now)
+            if delay:
+                await asyncio.sleep(delay)
+            while self._queue:
+                _, _, future = heapq.heappop(self._queue)
+                if not future.done():
+                    future.set_result(None)
+                    break
+
+    async def _acquire_global(self, priority: int):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), future))
+        self._wakeup.set()
+        await future
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        options = rate_limit_args or {}
+        priority = options.get('priority', PRIORITY_REPLY)
+        droppable = options.get('droppable', False)
+        coalesce_key = options.get('coalesce_key')
+        chat_id = data.get('chat_id')
+        started = time.monotonic()
+
+        if droppable:
+            if self.queue_depth >= self.max_animation_depth or started < self._paused_until:
+                self.dropped += 1
+                return True
+            if chat_id is not None and not self._chat_bucket(chat_id, started).try_take(started):
+                self.dropped += 1
+                return True
+            if coalesce_key is not None:
+                seq = next(self._seq)
+                self._latest_frame[coalesce_key] = seq
+        elif chat_id is not None:
+            bucket = self._chat_bucket(chat_id, started)
+            if priority == PRIORITY_REPLY and not self._is_group(chat_id):
+                # Still counted, so animations and bulk sends to the chat back off
+                bucket.try_take(started)
+            else:
+                delay = bucket.reserve(started)
+                if delay:
+                    await asyncio.sleep(delay)
+
+        if droppable and coalesce_key is not None:
+            try:
+                await self._acquire_global(priority)
+            finally:
+                # Also when cancelled while queued, so entries never outlive their frame
+                latest = self._latest_frame.get(coalesce_key)
+                if latest == seq:
+                    del self._latest_frame[coalesce_key]
+            if latest != seq:
+                # A newer frame for the same message superseded this one while queued
+                self.coalesced += 1
+                return True
+        else:
+            await self._acquire_global(priority)
+
+        waited = time.monotonic() - started
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+
+        for attempt in range(self.max_retries + 1):
+            call_started = time.monotonic()
+            try:
+                result = await callback(*args, **kwargs)
+                self.sent += 1
+                self._record_outcome(endpoint, time.monotonic() - call_started, False)
+                return result
+            except RetryAfter as e:
+                self.retry_after_count += 1
+                self._record_outcome(endpoint, time.monotonic() - call_started, True)
+                retry_after = float(e.retry_after)
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                if droppable:
+                    self.dropped += 1
+                    return True
+                if attempt == self.max_retries:
+                    raise
+                logger.warning("Flood limit hit on %s, retrying in %ss", endpoint, retry_after)
+                await asyncio.sleep(retry_after)
+            except Exception:
+                self.errors += 1
+                self._record_outcome(endpoint, time.monotonic() - call_started, True)
+                raise
+
+    def _record_outcome(self, endpoint: str, seconds: float, failed: bool):
+        if self.on_api_call:
+            self.on_api_call(endpoint, seconds, not failed)
+        self.error_rate = self.error_rate * 0.95 + (0.05 if failed else 0.0)
+
+    def stats(self) -> dict:
+        return {
+            'queue_depth': self.queue_depth,
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'coalesced': self.coalesced,
+            'retry_after': self.retry_after_count,
+            'errors': self.errors,
+            'error_rate': self.error_rate,
+            'avg_wait': self.total_wait / self.sent if self.sent else 0.0,
+            'max_wait': self.max_wait,
+        }
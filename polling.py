@@ -0,0 +1,219 @@
+"""
+📡 Polling engine
+Long-polling loop used instead of Updater.start_polling. It subscribes only
+to the update types the registered handlers consume, sizes each request
+from the current load and hands every fetched batch to the application at
+once, so the concurrent update processor works on it in parallel.
+"""
+
+import asyncio
+import logging
+import time
+
+from telegram.error import Conflict, InvalidToken, RetryAfter, TelegramError
+from telegram.ext import (
+    CallbackQueryHandler, ChatJoinRequestHandler, ChatMemberHandler, ChosenInlineResultHandler,
+    CommandHandler, InlineQueryHandler, MessageHandler, PollAnswerHandler, PollHandler,
+    PreCheckoutQueryHandler, ShippingQueryHandler, TypeHandler
+)
+
+logger = logging.getLogger(__name__)
+
+# Update types each handler class can consume. Message-based handlers get
+# only new messages: the bot's handlers read update.message, so edits and
+# channel posts would just fail.
+HANDLER_UPDATE_TYPES = (
+    (CommandHandler, ('message',)),
+    (MessageHandler, ('message',)),
+    (CallbackQueryHandler, ('callback_query',)),
+    (InlineQueryHandler, ('inline_query',)),
+    (ChosenInlineResultHandler, ('chosen_inline_result',)),
+    (PollAnswerHandler, ('poll_answer',)),
+    (PollHandler, ('poll',)),
+    (ChatMemberHandler, ('my_chat_member', 'chat_member')),
+    (ChatJoinRequestHandler, ('chat_join_request',)),
+    (ShippingQueryHandler, ('shipping_query',)),
+    (PreCheckoutQueryHandler, ('pre_checkout_query',)),
+)
+
+
+def allowed_updates(application):
+    """Update types the application's handlers consume, or None for all of them
+
+    TypeHandlers only observe whatever arrives (counting, throttling), so
+    they do not widen the subscription.
+    """
+    types = set()
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            if isinstance(handler, TypeHandler):
+                continue
+            for handler_class, update_types in HANDLER_UPDATE_TYPES:
+                if isinstance(handler, handler_class):
+                    types.update(update_types)
+                    break
+            else:
+                # A handler we cannot map: don't risk filtering its updates out
+                return None
+    return sorted(types)
+
+
+class PollingEngine:
+    """Adaptive getUpdates loop feeding an Application's update queue
+
+    While the bot keeps up, the batch limit doubles each time a batch comes
+    back full; when the backlog passes high_water it halves, and fetching
+    pauses entirely until the backlog drains below low_water. Telegram
+    keeps undelivered updates, so pausing loses nothing. The long-poll
+    timeout is long while idle (fewer requests) and short while busy, so
+    backlog checks happen between batches without waiting on the network.
+    """
+
+    def __init__(self, application, backlog, min_limit: int = 10, max_limit: int = 100,
+                 idle_timeout: int = 30, busy_timeout: int = 1, high_water: int = 500, low_water: int = 100):
+        self.application = application
+        self.backlog = backlog
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.idle_timeout = idle_timeout
+        self.busy_timeout = busy_timeout
+        self.high_water = high_water
+        self.low_water = low_water
+        self.allowed_updates = allowed_updates(application)
+        self.limit = min_limit
+        self.timeout = idle_timeout
+        self._offset = None
+        self.started = None
+        self.requests = 0
+        self.updates = 0
+        self.errors = 0
+        self.pauses = 0
+
+    async def run(self):
+        """Poll until cancelled; raises on a wrong token or a competing poller"""
+        # A webhook left over from webhook mode makes getUpdates fail with Conflict
+        await self.application.bot.delete_webhook()
+        logger.info("Polling for %s", self.allowed_updates or 'all update types')
+        self.started = time.monotonic()
+        backoff = 1.0
+        while True:
+            if self.backlog() >= self.high_water:
+                self.pauses += 1
+                self.limit = max(self.min_limit, self.limit // 2)
+                while self.backlog() > self.low_water:
+                    await asyncio.sleep(0.05)
+            try:
+                batch = await self.application.bot.get_updates(
+                    offset=self._offset,
+                    limit=self.limit,
+                    timeout=self.timeout,
+                    allowed_updates=self.allowed_updates
+                )
+            except RetryAfter as e:
+                await asyncio.sleep(float(e.retry_after))
+                continue
+            except (InvalidToken, Conflict):
+                raise
+            except TelegramError as e:
+                # Long polls time out and networks blip; back off and retry
+                self.errors += 1
+                logger.warning("getUpdates failed: %s; retrying in %.0fs", e, backoff)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+            backoff = 1.0
+            self.requests += 1
+            self._tune(len(batch))
+            if not batch:
+                continue
+            self._offset = batch[-1].update_id + 1
+            self.updates += len(batch)
+            for update in batch:
+                self.application.update_queue.put_nowait(update)
+
+    async def acknowledge(self):
+        """Confirm the last fetched batch, so Telegram does not redeliver it after a restart"""
+        if self._offset is None:
+            return
+        try:
+            await self.application.bot.get_updates(
+                offset=self._offset, limit=1, timeout=0, allowed_updates=self.allowed_updates
+            )
+        except TelegramError as e:
+            logger.warning("Could not confirm the last updates: %s", e)
+
+    def _tune(self, fetched: int):
+        if not fetched:
+            self.timeout = self.idle_timeout
+            self.limit = self.min_limit
+            return
+        self.timeout = self.busy_timeout
+        backlog = self.backlog()
+        if backlog >= self.high_water:
+            self.limit = max(self.min_limit, self.limit // 2)
+        elif fetched >= self.limit and backlog < self.low_water:
+            self.limit = min(self.max_limit, self.limit * 2)
+
+    @property
+    def throughput(self) -> float:
+        """Updates fetched per second since start"""
+        if not self.started:
+            return 0.0
+        return self.updates / max(time.monotonic() - self.started, 1e-9)
+
+    def stats(self) -> dict:
+        return {
+            'allowed_updates': self.allowed_updates,
+            'requests': self.requests,
+            'updates': self.updates,
+            'updates_per_second': round(self.throughput, 2),
+            'errors': self.errors,
+            'pauses': self.pauses,
+            'limit': self.limit,
+            'timeout': self.timeout,
+        }
+
+
+async def serve(bot):
+    """Run the bot with PollingEngine until SIGTERM or SIGINT, then drain and stop"""
+    application = bot.setup_application(updater=False)
+    engine = PollingEngine(
+        application,
+        backlog=lambda: application.update_queue.qsize() + bot.update_processor.pending
+    )
+    metrics = bot.metrics
+    metrics.gauge('bot_polled_updates', 'Updates fetched by getUpdates', lambda: engine.updates)
+    metrics.gauge('bot_poll_requests', 'getUpdates calls made', lambda: engine.requests)
+    metrics.gauge('bot_poll_updates_per_second', 'Average fetch throughput since start', lambda: round(engine.throughput, 3))
+    metrics.gauge('bot_poll_batch_limit', 'Current getUpdates batch limit', lambda: engine.limit)
+    metrics.gauge('bot_poll_timeout_seconds', 'Current long-poll timeout', lambda: engine.timeout)
+
+    lifecycle = bot.lifecycle
+    lifecycle.install_signal_handlers()
+
+    await application.initialize()
+    await application.post_init(application)
+    await application.start()
+    poller = asyncio.create_task(engine.run())
+    stopper = asyncio.create_task(lifecycle.wait())
+    try:
+        await asyncio.wait((poller, stopper), return_when=asyncio.FIRST_COMPLETED)
+        if poller.done():
+            poller.result()
+    finally:
+        # Stop fetching, then let what was fetched finish before shutting down
+        for task in (poller, stopper):
+            task.cancel()
+        await asyncio.gather(poller, stopper, return_exceptions=True)
+        await engine.acknowledge()
+        await lifecycle.drain(application, bot.update_processor)
+        logger.info("Polling stats: %s", engine.stats())
+        await application.stop()
+        await application.post_stop(application)
+        await application.shutdown()
+        await application.post_shutdown(application)
+
+
+def run(bot):
+    """Blocking wrapper around serve()"""
+    asyncio.run(serve(bot))
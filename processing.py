@@ -0,0 +1,188 @@
+"""
+🧵 Concurrent update processing
+Runs updates from different chats in parallel while keeping each chat's
+updates strictly in arrival order.
+"""
+
+import asyncio
+import logging
+
+from telegram.ext import BaseUpdateProcessor
+
+import logs
+
+logger = logging.getLogger(__name__)
+
+
+class ChatQueue:
+    """Per-chat lock plus the number of updates waiting on it"""
+    __slots__ = ('lock', 'pending')
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.pending = 0
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Bounded worker pool with per-chat ordering
+
+    Each update first takes its chat's lock (FIFO, so arrival order is
+    kept), then one of max_concurrent_updates global slots. Chats with
+    more than max_pending_per_chat queued updates, or a process with more
+    than max_pending queued overall, shed new updates instead of growing
+    without bound.
+    """
+
+    def __init__(self, max_concurrent_updates: int = 64, max_pending_per_chat: int = 20, max_pending: int = 5000):
+        super().__init__(max_concurrent_updates)
+        self.max_pending_per_chat = max_pending_per_chat
+        self.max_pending = max_pending
+        self._chats = {}
+        self._tasks = set()
+        # ids of updates counted as pending by admit() before they arrived
+        self._admitted = set()
+        # Set whenever a pending update finishes, for intake waiting on admission
+        self._released = asyncio.Event()
+        self._closed = False
+        self.pending = 0
+        self.in_flight = 0
+        self.processed = 0
+        self.shed = 0
+
+    @staticmethod
+    def ordering_key(update):
+        """Chat id for ordering; falls back to the user for chatless updates"""
+        if not hasattr(update, 'effective_chat'):
+            return None
+        if update.effective_chat:
+            return update.effective_chat.id
+        if update.effective_user:
+            return ('user', update.effective_user.id)
+        return None
+
+    async def process_update(self, update, coroutine) -> None:
+        if self._closed:
+            if id(update) in self._admitted:
+                self._release(update, self.ordering_key(update))
+            coroutine.close()
+            return
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        # Each update runs in its own task, so records logged while handling it carry its ids
+        token = logs.bind_update(update)
+        try:
+            await self._process_in_order(update, coroutine)
+        except asyncio.CancelledError:
+            if not self._closed:
+                raise
+            # Aborted at shutdown: return normally so the application still marks the update done
+            coroutine.close()
+        finally:
+            logs.unbind(token)
+            self._tasks.discard(task)
+
+    async def _process_in_order(self, update, coroutine) -> None:
+        key = self.ordering_key(update)
+        if key is None:
+            await super().process_update(update, coroutine)
+            return
+
+        if id(update) in self._admitted:
+            # Already counted when it was admitted
+            self._admitted.discard(id(update))
+            queue = self._chats[key]
+        else:
+            queue = self._chats.get(key)
+            if queue is None:
+                queue = self._chats[key] = ChatQueue()
+            if queue.pending >= self.max_pending_per_chat or self.pending >= self.max_pending:
+                self.shed += 1
+                logger.warning("Dropping update %s: too many queued updates for %s", getattr(update, 'update_id', '?'), key)
+                coroutine.close()
+                if not queue.pending:
+                    del self._chats[key]
+                return
+            queue.pending += 1
+            self.pending += 1
+        try:
+            async with queue.lock:
+                await super().process_update(update, coroutine)
+        finally:
+            queue.pending -= 1
+            self.pending -= 1
+            if not queue.pending:
+                del self._chats[key]
+            self._released.set()
+
+    def pending_for(self, key) -> int:
+        queue = self._chats.get(key)
+        return queue.pending if queue else 0
+
+    def admit(self, update) -> bool:
+        """Count an update as pending ahead of time if there is room for it
+
+        For intake that can push back on its source (webhooks answer 503):
+        an update admitted before it is put on the application's queue is
+        never shed, and one that does not fit can wait or be refused.
+        """
+        key = self.ordering_key(update)
+        if key is None:
+            return True
+        if self.pending >= self.max_pending or self.pending_for(key) >= self.max_pending_per_chat:
+            return False
+        queue = self._chats.get(key)
+        if queue is None:
+            queue = self._chats[key] = ChatQueue()
+        queue.pending += 1
+        self.pending += 1
+        self._admitted.add(id(update))
+        return True
+
+    async def wait_for_room(self, update):
+        """Admit the update, waiting until a pending update finishes if it does not fit"""
+        while not self.admit(update):
+            self._released.clear()
+            await self._released.wait()
+
+    def _release(self, update, key):
+        self._admitted.discard(id(update))
+        queue = self._chats[key]
+        queue.pending -= 1
+        self.pending -= 1
+        if not queue.pending:
+            del self._chats[key]
+        self._released.set()
+
+    async def do_process_update(self, update, coroutine) -> None:
+        self.in_flight += 1
+        try:
+            await coroutine
+            # Queue wait plus handling time; sampled at peak like other info records
+            logger.info("Handled update")
+        finally:
+            self.in_flight -= 1
+            self.processed += 1
+
+    def abort(self) -> int:
+        """Cancel every queued and running update and refuse new ones; returns how many were cancelled"""
+        self._closed = True
+        tasks = [task for task in self._tasks if not task.done()]
+        for task in tasks:
+            task.cancel()
+        return len(tasks)
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {
+            'max_concurrent_updates': self.max_concurrent_updates,
+            'pending': self.pending,
+            'in_flight': self.in_flight,
+            'active_chats': len(self._chats),
+            'processed': self.processed,
+            'shed': self.shed,
+        }
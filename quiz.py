@@ -0,0 +1,207 @@
+"""
+🧠 Quiz engine
+Multi-question rounds drawn from the quiz catalog, which serves as the
+question bank. The engine keeps only question ids grouped by difficulty;
+sessions hold the ids of their round and per-user bitsets prevent repeats.
+Answer buttons carry the question id and a checksum of the question, so
+buttons from an earlier round or an edited question are rejected without
+decoding anything.
+"""
+
+import asyncio
+import logging
+import random
+from array import array
+
+from catalog import CatalogError
+from sessions import QuizSession, SessionStore
+
+logger = logging.getLogger(__name__)
+
+DIFFICULTIES = (1, 2, 3)
+# Relative chance of drawing each unseen question, by difficulty
+DEFAULT_WEIGHTS = {1: 3, 2: 2, 3: 1}
+
+ANSWER_PREFIX = 'quiz_'
+
+
+def encode_answer(question_id: int, version: int, answer: int) -> str:
+    """Callback data for an answer button (well under Telegram's 64 bytes)"""
+    return f"{ANSWER_PREFIX}{question_id:x}_{version:x}_{answer}"
+
+
+def decode_answer(data: str):
+    """(question id, version, answer index), or None for malformed or old-style data"""
+    try:
+        question_id, version, answer = data[len(ANSWER_PREFIX):].split('_')
+        return int(question_id, 16), int(version, 16), int(answer)
+    except ValueError:
+        return None
+
+
+class QuestionBank:
+    """Ids of the playable questions in one catalog version, by difficulty"""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.version = catalog.version
+        self.size = len(catalog)
+        # Difficulty of each question id; 0 marks an unplayable record
+        self.difficulty = bytearray(self.size)
+        self.levels = {level: array('I') for level in DIFFICULTIES}
+
+    def add(self, question_id: int, question) -> bool:
+        try:
+            options = question['options']
+            valid = bool(question['question']) and 0 <= question['correct'] < len(options)
+            level = min(max(int(question.get('difficulty', 1)), DIFFICULTIES[0]), DIFFICULTIES[-1])
+        except (KeyError, TypeError, ValueError):
+            valid = False
+        if not valid:
+            return False
+        self.difficulty[question_id] = level
+        self.levels[level].append(question_id)
+        return True
+
+    @property
+    def playable(self) -> int:
+        return sum(len(ids) for ids in self.levels.values())
+
+
+class QuizProgress:
+    """Questions one user has been asked since their last full pass of the bank"""
+    __slots__ = ('bank_version', 'bits', 'unseen')
+
+    def __init__(self, bank: QuestionBank):
+        self.bank_version = bank.version
+        self.reset(bank)
+
+    def reset(self, bank: QuestionBank):
+        self.bits = bytearray((bank.size + 7) // 8)
+        self.unseen = [0] + [len(bank.levels[level]) for level in DIFFICULTIES]
+
+    def seen(self, question_id: int) -> bool:
+        return bool(self.bits[question_id >> 3] & (1 << (question_id & 7)))
+
+    def mark(self, question_id: int, level: int):
+        self.bits[question_id >> 3] |= 1 << (question_id & 7)
+        self.unseen[level] -= 1
+
+
+class QuizEngine:
+    """Builds rounds from a ContentCatalog kind and validates answers
+
+    The bank index is rebuilt whenever the catalog is reloaded, yielding to
+    the event loop as it goes. Each question's chance of being drawn is its
+    difficulty's weight; a round is asked easiest first.
+    """
+
+    def __init__(self, content, kind: str = 'quiz', round_length: int = 5, weights: dict = None,
+                 max_users: int = 10000, ttl: float = None):
+        self.content = content
+        self.kind = kind
+        self.round_length = round_length
+        self.weights = DEFAULT_WEIGHTS if weights is None else weights
+        self._bank = None
+        self._bank_lock = asyncio.Lock()
+        self._progress = SessionStore(max_size=max_users, ttl=ttl)
+        self._random = random.Random()
+        self.rounds = 0
+        self.stale = 0
+
+    async def bank(self) -> QuestionBank:
+        catalog = await self.content.catalog(self.kind)
+        bank = self._bank
+        if bank is not None and bank.catalog is catalog and bank.version == catalog.version:
+            return bank
+        async with self._bank_lock:
+            while self._bank is None or self._bank.catalog is not catalog or self._bank.version != catalog.version:
+                bank = QuestionBank(catalog)
+                for question_id in range(bank.size):
+                    bank.add(question_id, catalog[question_id])
+                    if question_id % 1000 == 999:
+                        await asyncio.sleep(0)
+                if bank.version != catalog.version:
+                    continue  # Reloaded while indexing
+                skipped = bank.size - bank.playable
+                if skipped:
+                    logger.warning("Skipped %d malformed %s questions", skipped, self.kind)
+                self._bank = bank
+            return self._bank
+
+    async def new_round(self, user_id: int) -> QuizSession:
+        """A session holding the ids of the user's next round of questions"""
+        bank = await self.bank()
+        if not bank.playable:
+            raise CatalogError(f"The {self.kind} catalog has no playable questions")
+        progress = self._progress.get(user_id)
+        if progress is None or progress.bank_version != bank.version:
+            progress = QuizProgress(bank)
+            self._progress.set(user_id, progress)
+        picked = []
+        for _ in range(min(self.round_length, bank.playable)):
+            if not any(progress.unseen):
+                # Asked everything: start over, but not within this round
+                progress.reset(bank)
+                for question_id in picked:
+                    progress.mark(question_id, bank.difficulty[question_id])
+            picked.append(self._draw(bank, progress))
+        picked.sort(key=bank.difficulty.__getitem__)
+        self.rounds += 1
+        return QuizSession(array('I', picked))
+
+    def _draw(self, bank: QuestionBank, progress: QuizProgress) -> int:
+        """Mark and return an unseen question id, weighted by difficulty"""
+        weighted = [(level, self.weights.get(level, 1) * progress.unseen[level]) for level in DIFFICULTIES]
+        total = sum(weight for _, weight in weighted)
+        if total <= 0:
+            # Only zero-weight levels are left unseen: draw from them evenly
+            weighted = [(level, progress.unseen[level]) for level in DIFFICULTIES]
+            total = sum(weight for _, weight in weighted)
+        target = self._random.random() * total
+        level = None
+        for candidate, weight in weighted:
+            if weight:
+                level = candidate
+                if target < weight:
+                    break
+                target -= weight
+        ids = bank.levels[level]
+        # Random probes almost always hit while most of the level is unseen
+        for _ in range(8):
+            question_id = ids[self._random.randrange(len(ids))]
+            if not progress.seen(question_id):
+                progress.mark(question_id, level)
+                return question_id
+        start = self._random.randrange(len(ids))
+        for offset in range(len(ids)):
+            question_id = ids[(start + offset) % len(ids)]
+            if not progress.seen(question_id):
+                progress.mark(question_id, level)
+                return question_id
+        raise AssertionError("unseen count out of sync with bitset")
+
+    async def question(self, question_id: int):
+        """(version, question) for asking a question, or None if it is gone"""
+        catalog = await self.content.catalog(self.kind)
+        if not 0 <= question_id < len(catalog):
+            return None
+        return catalog.checksum(question_id), catalog[question_id]
+
+    async def current(self, question_id: int, version: int):
+        """The question an answer button was made for, or None if it has changed since"""
+        catalog = await self.content.catalog(self.kind)
+        if not 0 <= question_id < len(catalog) or catalog.checksum(question_id) != version:
+            self.stale += 1
+            return None
+        return catalog[question_id]
+
+    def stats(self) -> dict:
+        bank = self._bank
+        return {
+            'questions': bank.playable if bank else 0,
+            'by_difficulty': {level: len(ids) for level, ids in bank.levels.items()} if bank else {},
+            'rounds': self.rounds,
+            'stale_answers': self.stale,
+            'tracked_users': len(self._progress),
+        }
@@ -0,0 +1,203 @@
+"""
+⏰ Reminder scheduler
+Keeps pending reminders in a heap and persists them to SQLite so they survive restarts.
+A reminder is removed once it is delivered or can never be; failed sends are retried.
+"""
+
+import asyncio
+import heapq
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from telegram.error import BadRequest, Forbidden, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+
+class ReminderStore:
+    """SQLite-backed storage for pending reminders"""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS reminders ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+            'chat_id INTEGER NOT NULL, '
+            'due_at REAL NOT NULL, '
+            'message TEXT NOT NULL)'
+        )
+        self._conn.commit()
+
+    def add(self, chat_id: int, due_at: float, message: str) -> int:
+        """Persist a reminder and return its id"""
+        with self._lock:
+            cursor = self._conn.execute(
+                'INSERT INTO reminders (chat_id, due_at, message) VALUES (?, ?, ?)',
+                (chat_id, due_at, message)
+            )
+            self._conn.commit()
+            return cursor.lastrowid
+
+    def delete_many(self, reminder_ids):
+        """Remove delivered reminders in one transaction"""
+        with self._lock:
+            self._conn.executemany('DELETE FROM reminders WHERE id = ?', [(i,) for i in reminder_ids])
+            self._conn.commit()
+
+    def reschedule_many(self, rows):
+        """Move reminders to new due times, given (due_at, id) pairs, in one transaction"""
+        with self._lock:
+            self._conn.executemany('UPDATE reminders SET due_at = ? WHERE id = ?', rows)
+            self._conn.commit()
+
+    def load_all(self, shard=None):
+        """Return pending reminders as (due_at, id, chat_id, message) rows
+
+        With shard=(index, count), only reminders for chats owned by that
+        worker are returned.
+        """
+        with self._lock:
+            if shard is None:
+                return self._conn.execute('SELECT due_at, id, chat_id, message FROM reminders').fetchall()
+            index, count = shard
+            return self._conn.execute(
+                'SELECT due_at, id, chat_id, message FROM reminders '
+                'WHERE ((chat_id % ?) + ?) % ? = ?',
+                (count, count, count, index)
+            ).fetchall()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ReminderScheduler:
+    """Fires reminders in due order using a min-heap keyed by due time
+
+    A send that fails for good (the user blocked the bot, the chat is gone
+    or the request is rejected) drops the reminder. Other failures retry
+    it after retry_delay, doubling up to max_retry_delay, or after the
+    flood wait Telegram asked for; it is dropped after max_attempts sends.
+    """
+
+    def __init__(self, store: ReminderStore, callback, shard=None,
+                 retry_delay: float = 30.0, max_retry_delay: float = 3600.0, max_attempts: int = 10):
+        self.store = store
+        self.callback = callback
+        self.shard = shard
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.max_attempts = max_attempts
+        self._attempts = {}  # reminder id -> failed sends so far (since this process started)
+        self._heap = []
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._closing = False
+
+    def __len__(self):
+        return len(self._heap)
+
+    async def start(self):
+        """Bulk-load pending reminders and start the dispatch loop"""
+        rows = await asyncio.to_thread(self.store.load_all, self.shard)
+        self._heap = [tuple(row) for row in rows]
+        heapq.heapify(self._heap)
+        logger.info("Loaded %d pending reminders", len(self._heap))
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 5.0):
+        """Finish the reminders being sent (and mark them delivered), then close the store
+
+        Every scheduled reminder is already on disk, so nothing else needs saving.
+        """
+        if self._task:
+            self._closing = True
+            self._wakeup.set()
+            try:
+                await asyncio.wait_for(asyncio.shield(self._task), timeout)
+            except asyncio.TimeoutError:
+                # Undelivered ones stay in the store and are sent after the restart
+                self._task.cancel()
+                try:
+                    await self._task
+                except asyncio.CancelledError:
+                    pass
+            self._task = None
+        await asyncio.to_thread(self.store.close)
+
+    async def schedule(self, chat_id: int, delay_seconds: float, message: str) -> int:
+        """Persist a reminder and add it to the heap"""
+        due_at = time.time() + delay_seconds
+        reminder_id = await asyncio.to_thread(self.store.add, chat_id, due_at, message)
+        heapq.heappush(self._heap, (due_at, reminder_id, chat_id, message))
+        # Only wake the loop if the new reminder is now the earliest one
+        if self._heap[0][1] == reminder_id:
+            self._wakeup.set()
+        return reminder_id
+
+    async def _run(self):
+        while not self._closing:
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            delay = self._heap[0][0] - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            now = time.time()
+            due = []
+            while self._heap and self._heap[0][0] <= now:
+                due.append(heapq.heappop(self._heap))
+
+            finished = []
+            retries = []
+            for _, reminder_id, chat_id, message in due:
+                try:
+                    await self.callback(chat_id, message)
+                except (Forbidden, BadRequest) as e:
+                    # Sending it again would fail the same way
+                    logger.warning("Dropping reminder %s for chat %s: %s", reminder_id, chat_id, e)
+                except Exception as e:
+                    delay = self._retry_after(reminder_id, e)
+                    if delay is not None:
+                        logger.warning("Failed to send reminder %s, retrying in %.0fs: %s", reminder_id, delay, e)
+                        retries.append((time.time() + delay, reminder_id, chat_id, message))
+                        continue
+                    logger.error("Giving up on reminder %s after %d attempts: %s", reminder_id, self.max_attempts, e)
+                self._attempts.pop(reminder_id, None)
+                finished.append(reminder_id)
+
+            if finished:
+                await asyncio.to_thread(self.store.delete_many, finished)
+            if retries:
+                await asyncio.to_thread(
+                    self.store.reschedule_many, [(due_at, reminder_id) for due_at, reminder_id, _, _ in retries]
+                )
+                for retry in retries:
+                    heapq.heappush(self._heap, retry)
+
+    def _retry_after(self, reminder_id: int, error: Exception):
+        """Seconds until the next attempt, or None once attempts are used up"""
+        attempts = self._attempts.get(reminder_id, 0) + 1
+        if attempts >= self.max_attempts:
+            self._attempts.pop(reminder_id, None)
+            return None
+        self._attempts[reminder_id] = attempts
+        delay = min(self.max_retry_delay, self.retry_delay * 2 ** (attempts - 1))
+        if isinstance(error, RetryAfter):
+            delay = max(delay, float(error.retry_after))
+        return delay
@@ -0,0 +1,97 @@
+"""
+🔀 Callback router
+Dispatches inline-button callback data in O(1) for exact routes and
+O(len(data)) for prefix routes, with per-route latency counters.
+"""
+
+import time
+
+
+class RouteStats:
+    """Call count and latency totals for one route"""
+    __slots__ = ('count', 'errors', 'total_time', 'max_time')
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+
+class CallbackRouter:
+    """Exact-match table plus a prefix trie for patterned callback data
+
+    Exact handlers are called as handler(update, context); prefix handlers
+    also receive the full callback data.
+    """
+
+    _HANDLER = object()  # Trie key holding the (route, handler) of a prefix
+
+    def __init__(self):
+        self._exact = {}
+        self._trie = {}
+        self.stats = {}
+
+    def add(self, data: str, handler):
+        self._exact[data] = handler
+        self.stats[data] = RouteStats()
+
+    def add_prefix(self, prefix: str, handler):
+        node = self._trie
+        for char in prefix:
+            node = node.setdefault(char, {})
+        route = prefix + '*'
+        node[self._HANDLER] = (route, handler)
+        self.stats[route] = RouteStats()
+
+    def resolve(self, data: str):
+        """Return (route, handler, wants_data) or None"""
+        handler = self._exact.get(data)
+        if handler is not None:
+            return data, handler, False
+        match = None
+        node = self._trie
+        for char in data:
+            node = node.get(char)
+            if node is None:
+                break
+            # Keep the longest matching prefix
+            match = node.get(self._HANDLER, match)
+        if match is None:
+            return None
+        return match[0], match[1], True
+
+    async def dispatch(self, update, context) -> bool:
+        """Run the handler for the update's callback data; False if none matched"""
+        data = update.callback_query.data or ''
+        resolved = self.resolve(data)
+        if resolved is None:
+            return False
+        route, handler, wants_data = resolved
+        stats = self.stats[route]
+        started = time.perf_counter()
+        try:
+            if wants_data:
+                await handler(update, context, data)
+            else:
+                await handler(update, context)
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            stats.count += 1
+            stats.total_time += elapsed
+            stats.max_time = max(stats.max_time, elapsed)
+        return True
+
+    def report(self) -> dict:
+        return {
+            route: {
+                'count': s.count,
+                'errors': s.errors,
+                'avg_ms': s.total_time / s.count * 1000 if s.count else 0.0,
+                'max_ms': s.max_time * 1000,
+            }
+            for route, s in self.stats.items()
+        }
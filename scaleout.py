@@ -0,0 +1,164 @@
+"""
+🕸️ Scale-out mode
+One webhook listener process shards incoming updates by chat id across N
+worker processes. Each worker runs the normal Application without an
+Updater; sessions and user stats live in shared SQLite stores, so any
+worker sees the same state.
+"""
+
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import signal
+from queue import Full
+
+from aiohttp import web
+
+from ingress import RecentIds
+
+logger = logging.getLogger(__name__)
+
+# Update fields that carry a message, in the order Telegram documents them
+MESSAGE_FIELDS = ('message', 'edited_message', 'channel_post', 'edited_channel_post')
+
+
+def chat_key(update: dict) -> int:
+    """Chat id used for sharding; falls back to the sender for chatless updates"""
+    for field in MESSAGE_FIELDS:
+        if field in update:
+            return update[field]['chat']['id']
+    query = update.get('callback_query')
+    if query:
+        if query.get('message'):
+            return query['message']['chat']['id']
+        return query['from']['id']
+    for value in update.values():
+        if isinstance(value, dict) and isinstance(value.get('from'), dict):
+            return value['from']['id']
+    return 0
+
+
+def shard_for(chat_id: int, workers: int) -> int:
+    return chat_id % workers
+
+
+def worker_main(index: int, workers: int, queue):
+    """Entry point of a worker process"""
+    # Imported here so the module is loaded fresh with the shared-store settings
+    import bot as bot_module
+
+    asyncio.run(_run_worker(bot_module, index, workers, queue))
+
+
+async def _run_worker(bot_module, index: int, workers: int, queue):
+    from telegram import Update
+
+    bot = bot_module.MyAwesomeBot(shard=(index, workers))
+    application = bot.setup_application(updater=False)
+    loop = asyncio.get_running_loop()
+    # Let the listener decide when to stop; it sends a None sentinel
+    loop.add_signal_handler(signal.SIGTERM, lambda: None)
+    loop.add_signal_handler(signal.SIGINT, lambda: None)
+
+    await application.initialize()
+    await application.post_init(application)
+    await application.start()
+    logger.info("Worker %d/%d ready", index, workers)
+
+    while True:
+        body = await loop.run_in_executor(None, queue.get)
+        if body is None:
+            break
+        try:
+            update = Update.de_json(json.loads(body), application.bot)
+        except Exception as e:
+            logger.error("Worker %d could not decode update: %s", index, e)
+            continue
+        await application.update_queue.put(update)
+
+    await bot.lifecycle.drain(application, bot.update_processor)
+    await application.stop()
+    await application.post_stop(application)
+    await application.shutdown()
+    await application.post_shutdown(application)
+
+
+class ShardedWebhookServer:
+    """Receives webhook calls and forwards each body to its chat's worker"""
+
+    def __init__(self, token: str, webhook_url: str, host: str, port: int, workers: int):
+        self.token = token
+        self.webhook_url = webhook_url
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.queues = []
+        self.forwarded = 0
+        self.duplicates = 0
+        self._seen = RecentIds()
+
+    def run(self):
+        context = multiprocessing.get_context('spawn')
+        queues = [context.Queue(maxsize=10000) for _ in range(self.workers)]
+        processes = [
+            context.Process(target=worker_main, args=(i, self.workers, queues[i]), name=f'bot-worker-{i}')
+            for i in range(self.workers)
+        ]
+        for process in processes:
+            process.start()
+        self.queues = queues
+
+        app = web.Application()
+        app.router.add_post(f'/{self.token}', self._handle)
+        app.on_startup.append(self._set_webhook)
+        try:
+            web.run_app(app, host=self.host, port=self.port, access_log=None, print=None)
+        finally:
+            for queue in queues:
+                queue.put(None)
+            for process in processes:
+                process.join(timeout=30)
+                if process.is_alive():
+                    process.terminate()
+
+    async def _set_webhook(self, app):
+        from telegram import Bot
+
+        async with Bot(self.token) as bot:
+            await bot.set_webhook(url=f"{self.webhook_url}/{self.token}")
+        logger.info("Listening on %s:%s, sharding across %d workers", self.host, self.port, self.workers)
+
+    async def _handle(self, request):
+        body = await request.read()
+        try:
+            update = json.loads(body)
+            update_id = update['update_id']
+            key = chat_key(update)
+        except (ValueError, KeyError, TypeError):
+            return web.Response(status=400)
+        if update_id in self._seen:
+            # Redelivery of an update a worker already has
+            self.duplicates += 1
+            return web.Response()
+        try:
+            self.queues[shard_for(key, self.workers)].put_nowait(body)
+        except Full:
+            # Worker is saturated; Telegram will redeliver
+            return web.Response(status=503, headers={'Retry-After': '1'})
+        self._seen.add(update_id)
+        self.forwarded += 1
+        return web.Response()
+
+
+def run(token: str, webhook_url: str, port: int, workers: int, data_dir: str):
+    """Start the listener and worker processes (blocks until shutdown)"""
+    # Workers are spawned fresh and read these when importing bot.py
+    os.environ['SESSION_BACKEND'] = 'sqlite'
+    os.environ.setdefault('USER_STORE', 'sqlite')
+    # No per-worker user cache: reads go to the shared store
+    os.environ.setdefault('USER_CACHE_SIZE', '0')
+    os.environ.setdefault('STATS_FLUSH_INTERVAL', '1')
+    os.environ['DATA_DIR'] = data_dir
+    ShardedWebhookServer(token, webhook_url, '0.0.0.0', port, workers).run()
@@ -0,0 +1,267 @@
+"""
+🎮 Session store
+Bounded, evicting storage for per-user game sessions and user records.
+"""
+
+import os
+import pickle
+import sqlite3
+import sys
+import time
+from collections import OrderedDict
+
+
+class NumberGuessSession:
+    """State for the number guessing game"""
+    __slots__ = ('number', 'attempts', 'max_attempts')
+    type = 'number_guess'
+
+    def __init__(self, number: int, max_attempts: int = 3):
+        self.number = number
+        self.attempts = 0
+        self.max_attempts = max_attempts
+
+
+class QuizSession:
+    """State for a quiz round (stores question ids, not questions)"""
+    __slots__ = ('questions', 'position', 'score')
+    type = 'quiz'
+
+    def __init__(self, questions):
+        self.questions = questions
+        self.position = 0
+        self.score = 0
+
+    @property
+    def current(self):
+        """Id of the question being asked, or None once the round is over"""
+        return self.questions[self.position] if self.position < len(self.questions) else None
+
+
+class UserRecord:
+    """Compact per-user profile"""
+    __slots__ = ('name', 'username', 'joined', 'commands_used')
+
+    def __init__(self, name, username, joined: str, commands_used: int = 0):
+        self.name = name
+        self.username = username
+        self.joined = joined
+        self.commands_used = commands_used
+
+
+class SessionStore:
+    """LRU-ordered store with optional idle TTL and a hard size cap
+
+    Entries are kept in access order, so expired entries always sit at the
+    front and can be swept without scanning the whole store.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> [last_access, value]
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get(self, key, default=None):
+        """Return a live entry and mark it as recently used"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        now = time.monotonic()
+        if self.ttl is not None and now - entry[0] > self.ttl:
+            del self._entries[key]
+            self.expirations += 1
+            return default
+        entry[0] = now
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key, value):
+        """Insert or replace an entry, evicting the least recently used if full"""
+        now = time.monotonic()
+        self._entries[key] = [now, value]
+        self._entries.move_to_end(key)
+        self._expire(now)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key, default=None):
+        entry = self._entries.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def keys(self) -> list:
+        """Keys from least to most recently used"""
+        return list(self._entries)
+
+    def snapshot(self) -> list:
+        """(key, seconds since last use, value) for every entry, least recently used first"""
+        now = time.monotonic()
+        return [(key, now - last_used, value) for key, (last_used, value) in self._entries.items()]
+
+    def restore(self, items, downtime: float = 0.0) -> int:
+        """Bulk-load a snapshot, counting downtime as idle time; returns how many entries were live"""
+        now = time.monotonic()
+        restored = 0
+        for key, idle, value in items:
+            idle += downtime
+            if self.ttl is not None and idle > self.ttl:
+                continue
+            self._entries[key] = [now - idle, value]
+            self._entries.move_to_end(key)
+            restored += 1
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return restored
+
+    def _expire(self, now: float):
+        if self.ttl is None:
+            return
+        entries = self._entries
+        while entries:
+            key, entry = next(iter(entries.items()))
+            if now - entry[0] <= self.ttl:
+                break
+            del entries[key]
+            self.expirations += 1
+
+    def stats(self) -> dict:
+        """Size, eviction counters and an approximate memory footprint"""
+        approx_bytes = sys.getsizeof(self._entries)
+        if self._entries:
+            _, sample = next(iter(self._entries.values()))
+            # Every record of a store shares a slotted type, so one sample is representative
+            approx_bytes += len(self._entries) * (sys.getsizeof([0.0, None]) + sys.getsizeof(sample))
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'approx_bytes': approx_bytes,
+        }
+
+
+class SQLiteSessionStore:
+    """Session store shared between worker processes on one host
+
+    Same interface and eviction rules as SessionStore, backed by a SQLite
+    file so any worker sees every session. It stands in locally for a
+    network store such as Redis. Records are pickled; callers must set()
+    a record again after mutating it. Expired and excess sessions are
+    pruned every prune_every writes rather than on each one, so the store
+    may briefly hold up to prune_every - 1 sessions over max_size. Reads
+    only write back the access time once it is older than refresh_after
+    (a tenth of the TTL by default), so an idle session may expire up to
+    that much early.
+    """
+
+    def __init__(self, path: str, max_size: int = 10000, ttl: float = None, prune_every: int = 100,
+                 refresh_after: float = None):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_size = max_size
+        self.ttl = ttl
+        self.prune_every = prune_every
+        if refresh_after is None:
+            refresh_after = ttl / 10 if ttl is not None else 60.0
+        self.refresh_after = refresh_after
+        self._writes = 0
+        self._conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS sessions ('
+            'key TEXT PRIMARY KEY, '
+            'touched REAL NOT NULL, '
+            'value BLOB NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS sessions_touched ON sessions (touched)')
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return self._conn.execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+
+    def __contains__(self, key):
+        # Expired rows are left for get() or prune() to delete
+        oldest = time.time() - self.ttl if self.ttl is not None else float('-inf')
+        return self._conn.execute(
+            'SELECT 1 FROM sessions WHERE key = ? AND touched >= ?', (str(key), oldest)
+        ).fetchone() is not None
+
+    def get(self, key, default=None):
+        row = self._conn.execute('SELECT touched, value FROM sessions WHERE key = ?', (str(key),)).fetchone()
+        if row is None:
+            return default
+        now = time.time()
+        if self.ttl is not None and now - row[0] > self.ttl:
+            self._conn.execute('DELETE FROM sessions WHERE key = ?', (str(key),))
+            self.expirations += 1
+            return default
+        if now - row[0] > self.refresh_after:
+            self._conn.execute('UPDATE sessions SET touched = ? WHERE key = ?', (now, str(key)))
+        return pickle.loads(row[1])
+
+    def set(self, key, value):
+        now = time.time()
+        self._conn.execute(
+            'INSERT OR REPLACE INTO sessions (key, touched, value) VALUES (?, ?, ?)',
+            (str(key), now, pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        )
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            self.prune(now)
+
+    def prune(self, now: float = None):
+        """Drop expired sessions, then all but the max_size most recently used"""
+        now = time.time() if now is None else now
+        if self.ttl is not None:
+            self.expirations += self._conn.execute(
+                'DELETE FROM sessions WHERE touched < ?', (now - self.ttl,)
+            ).rowcount
+        # One indexed statement; no COUNT(*) over the table
+        self.evictions += self._conn.execute(
+            'DELETE FROM sessions WHERE key IN '
+            '(SELECT key FROM sessions ORDER BY touched DESC LIMIT -1 OFFSET ?)',
+            (self.max_size,)
+        ).rowcount
+
+    def pop(self, key, default=None):
+        row = self._conn.execute('DELETE FROM sessions WHERE key = ? RETURNING value', (str(key),)).fetchone()
+        return default if row is None else pickle.loads(row[0])
+
+    def snapshot(self) -> list:
+        """Nothing to save: sessions are already on disk"""
+        return []
+
+    def restore(self, items, downtime: float = 0.0) -> int:
+        return 0
+
+    def stats(self) -> dict:
+        size = len(self)
+        approx_bytes = self._conn.execute('SELECT COALESCE(SUM(LENGTH(value)), 0) FROM sessions').fetchone()[0]
+        return {
+            'size': size,
+            'max_size': self.max_size,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'approx_bytes': approx_bytes,
+        }
+
+
+def create_session_store(kind: str, path: str, max_size: int, ttl: float = None):
+    """Build a session store from its configured name"""
+    if kind == 'memory':
+        return SessionStore(max_size=max_size, ttl=ttl)
+    if kind == 'sqlite':
+        return SQLiteSessionStore(path, max_size=max_size, ttl=ttl)
+    raise ValueError(f"Unknown session backend: {kind}")
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+🚀 Fast startup
+Webhook entry point that binds the port before anything heavy is loaded.
+The bot (and telegram with it) is imported in a background thread; webhook
+calls that arrive meanwhile are answered from a small preloaded fast path
+(/start, /help, /about) or held in the ingress queue until the application
+runs.
+Every startup phase is timed and reported.
+"""
+
+import asyncio
+import importlib
+import logging
+import os
+import time
+from datetime import datetime
+
+# Imported first: its PROCESS_STARTED is what restart timings are measured from
+import lifecycle  # noqa: F401
+import logs
+from ingress import WebhookIngress
+from templates import WELCOME_TEXT, HELP_TEXT, ABOUT_TEXT, MAIN_MENU
+
+logger = logging.getLogger(__name__)
+
+# Acknowledged updates waiting to be decoded, and how many update ids are remembered for dedup
+WEBHOOK_QUEUE_SIZE = int(os.environ.get('WEBHOOK_QUEUE_SIZE', 1000))
+WEBHOOK_DEDUPE_WINDOW = int(os.environ.get('WEBHOOK_DEDUPE_WINDOW', 10000))
+
+
+class StartupTimer:
+    """Wall-clock time of each startup phase, in order"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.phases = {}
+
+    def mark(self, phase: str):
+        """End the current phase and name it"""
+        now = time.perf_counter()
+        self.phases[phase] = now - self._last
+        self._last = now
+
+    @property
+    def total(self) -> float:
+        return self._last - self.started
+
+    def report(self) -> str:
+        parts = [f"{phase}={seconds * 1000:.0f}ms" for phase, seconds in self.phases.items()]
+        return ' '.join(parts + [f"total={self.total * 1000:.0f}ms"])
+
+
+class FastPath:
+    """Replies built only from preloaded templates, sent as webhook responses"""
+
+    def __init__(self):
+        self.main_menu = {
+            'inline_keyboard': [[{'text': text, 'callback_data': data} for text, data in row] for row in MAIN_MENU]
+        }
+        # (user_id, name, username, joined) from /start calls, saved once the bot is up
+        self.profiles = []
+        self.answered = 0
+        self.first_reply = None
+
+    def answer(self, update: dict):
+        """Bot API call answering the update, or None if it needs the full bot"""
+        message = update.get('message')
+        if not message or not message.get('text', '').startswith('/'):
+            return None
+        # Addressed commands (/help@SomeBot) wait: the bot's username is not known yet
+        command = message['text'].split()[0].lower()
+        user = message.get('from') or {}
+        markup = None
+        if command == '/start':
+            self.profiles.append((user.get('id'), user.get('first_name'), user.get('username'), datetime.now().isoformat()))
+            text = WELCOME_TEXT.render(name=user.get('first_name'))
+            markup = self.main_menu
+        elif command == '/help':
+            text = HELP_TEXT
+        elif command == '/about':
+            text = ABOUT_TEXT
+        else:
+            return None
+        self.answered += 1
+        if self.first_reply is None:
+            self.first_reply = time.time()
+        reply = {'method': 'sendMessage', 'chat_id': message['chat']['id'], 'text': text, 'parse_mode': 'Markdown'}
+        if markup:
+            reply['reply_markup'] = markup
+        return reply
+
+
+def _build(bot_factory):
+    bot = bot_factory()
+    return bot, bot.setup_application(updater=False)
+
+
+async def serve(token: str, webhook_url: str, port: int, bot_factory=None):
+    """Run the bot behind WebhookIngress until SIGTERM or SIGINT, then drain and stop
+
+    Without bot_factory, bot.py is imported and MyAwesomeBot used. Importing
+    and building run in a thread (loading CA certificates alone takes tens of
+    milliseconds), so the event loop keeps answering warm-up updates.
+    """
+    timer = StartupTimer()
+    fast_path = FastPath()
+    ingress = WebhookIngress(token, fast_path, queue_size=WEBHOOK_QUEUE_SIZE, dedupe_window=WEBHOOK_DEDUPE_WINDOW)
+    await ingress.start('0.0.0.0', port)
+    timer.mark('listen')
+    application = None
+    try:
+        if bot_factory is None:
+            bot_module = await asyncio.to_thread(importlib.import_module, 'bot')
+            bot_factory = bot_module.MyAwesomeBot
+            timer.mark('import')
+        bot, application = await asyncio.to_thread(_build, bot_factory)
+        timer.mark('build')
+
+        await application.initialize()
+        await application.post_init(application)
+        timer.mark('initialize')
+        if fast_path.first_reply is not None:
+            bot.lifecycle.responded(fast_path.first_reply)
+
+        await application.start()
+        for profile in fast_path.profiles:
+            await bot.users.save_profile(*profile)
+        replayed = ingress.go_live(application)
+        timer.mark('start')
+        logger.info(
+            "Ready: %s (%d warm-up updates answered early, %d replayed)",
+            timer.report(), fast_path.answered, replayed
+        )
+        phases = bot.metrics.counter('bot_startup_seconds', 'Time spent in each startup phase', ('phase',))
+        for phase, seconds in timer.phases.items():
+            phases.inc(phase, amount=round(seconds, 6))
+        bot.metrics.gauge('bot_warmup_fast_path_replies', 'Updates answered before the bot was ready', lambda: fast_path.answered)
+        bot.metrics.gauge('bot_webhook_queue_depth', 'Acknowledged updates waiting to be decoded', lambda: ingress.queue_depth)
+        bot.metrics.gauge('bot_webhook_duplicates', 'Redelivered updates dropped', lambda: ingress.duplicates)
+        bot.metrics.gauge('bot_webhook_rejected', 'Webhook calls refused with 503 (queue full)', lambda: ingress.rejected)
+
+        bot.lifecycle.install_signal_handlers()
+        # Already serving; Telegram keeps delivering to the old URL until this lands
+        await application.bot.set_webhook(url=f"{webhook_url}/{token}")
+        await bot.lifecycle.wait()
+    finally:
+        # Refuse new calls, hand over what was acknowledged, then let it finish
+        await ingress.stop()
+        logger.info("Webhook ingress stats: %s", ingress.stats())
+        if application is not None and application.running:
+            await bot.lifecycle.drain(application, bot.update_processor)
+            await application.stop()
+            await application.post_stop(application)
+            await application.shutdown()
+            await application.post_shutdown(application)
+
+
+def run(token: str, webhook_url: str, port: int, bot_factory=None):
+    """Blocking wrapper around serve()"""
+    asyncio.run(serve(token, webhook_url, port, bot_factory))
+
+
+def main():
+    token = os.environ.get('BOT_TOKEN')
+    webhook_url = os.environ.get('WEBHOOK_URL', '')
+    if not token or not webhook_url or int(os.environ.get('WORKERS', 1)) > 1:
+        # Nothing to warm up early for: polling, scale-out, or a config error
+        import bot
+        bot.main()
+        return
+    logs.setup_from_env()
+    print(f"🌐 Starting webhook server on port {os.environ.get('PORT', 8000)}...")
+    run(token, webhook_url, int(os.environ.get('PORT', 8000)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,391 @@
+"""
+🏆 Statistics engine
+Every command and game result is appended to a compact binary event log.
+Aggregates (per-command counts, per-user games, wins and streaks) are
+updated incrementally as events arrive. Once the log grows past a size,
+it is folded into an aggregate checkpoint and replaced by an empty one,
+so a start restores the checkpoint and replays only the recent events.
+A leaderboard keyed by wins answers rank and top-N queries in O(log n).
+"""
+
+import asyncio
+import contextlib
+import fcntl
+import logging
+import os
+import pickle
+import struct
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# Record: unix time, user id, event kind, command/game code, writer id
+RECORD = struct.Struct('<IqBBH')
+
+EVENT_COMMAND = 0
+EVENT_WIN = 1
+EVENT_LOSS = 2
+
+# Codes are stored in the log by position: only ever append to these
+COMMANDS = (
+    'other', 'start', 'help', 'roll', 'game', 'quiz', 'joke', 'fact', 'animal',
+    'quote', 'math', 'weather', 'reminder', 'stats', 'about', 'leaderboard',
+)
+GAMES = ('other', 'number_guess', 'quiz')
+_COMMAND_CODES = {name: code for code, name in enumerate(COMMANDS)}
+_GAME_CODES = {name: code for code, name in enumerate(GAMES)}
+
+
+class PlayerStats:
+    """Running game totals for one user"""
+    __slots__ = ('games', 'wins', 'streak', 'best_streak')
+
+    def __init__(self):
+        self.games = 0
+        self.wins = 0
+        self.streak = 0
+        self.best_streak = 0
+
+    @property
+    def win_rate(self) -> float:
+        return self.wins / self.games if self.games else 0.0
+
+
+class Leaderboard:
+    """Users ranked by score, with O(log n) rank and k-th best lookups
+
+    Scores are small non-negative integers, so a Fenwick tree indexed by
+    score counts the users at each score. Users tied on a score keep the
+    order in which they reached it. Users with a score of 0 are unranked.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._tree = [0] * (capacity + 1)
+        self._scores = {}  # user id -> score
+        self._buckets = {}  # score -> {user id: None}, in arrival order
+        self._total = 0
+
+    def __len__(self):
+        return self._total
+
+    def set(self, user_id: int, score: int):
+        old = self._scores.get(user_id, 0)
+        if old == score:
+            return
+        if old:
+            self._add(old, -1)
+            bucket = self._buckets[old]
+            del bucket[user_id]
+            if not bucket:
+                del self._buckets[old]
+        if score:
+            if score >= len(self._tree):
+                self._grow(score)
+            self._add(score, 1)
+            self._buckets.setdefault(score, {})[user_id] = None
+            self._scores[user_id] = score
+        else:
+            self._scores.pop(user_id, None)
+
+    def rank(self, user_id: int):
+        """1-based rank (ties share the best rank), or None if unranked"""
+        score = self._scores.get(user_id)
+        if not score:
+            return None
+        return self._total - self._prefix(score) + 1
+
+    def top(self, count: int):
+        """Up to count (user id, score) pairs, best first"""
+        result = []
+        position = 1
+        while len(result) < count and position <= self._total:
+            score = self._kth_smallest(self._total - position + 1)
+            for user_id in self._buckets[score]:
+                result.append((user_id, score))
+                if len(result) == count:
+                    break
+            position += len(self._buckets[score])
+        return result
+
+    def _add(self, index: int, delta: int):
+        self._total += delta
+        tree = self._tree
+        while index < len(tree):
+            tree[index] += delta
+            index += index & -index
+
+    def _prefix(self, index: int) -> int:
+        """Number of users with a score of at most index"""
+        total = 0
+        tree = self._tree
+        while index > 0:
+            total += tree[index]
+            index -= index & -index
+        return total
+
+    def _kth_smallest(self, k: int) -> int:
+        """Smallest score whose prefix count reaches k"""
+        tree = self._tree
+        index = 0
+        step = 1 << (len(tree) - 1).bit_length()
+        while step:
+            following = index + step
+            if following < len(tree) and tree[following] < k:
+                index = following
+                k -= tree[following]
+            step >>= 1
+        return index + 1
+
+    def _grow(self, score: int):
+        capacity = len(self._tree) - 1
+        while capacity <= score:
+            capacity *= 2
+        self._tree = [0] * (capacity + 1)
+        self._total = 0
+        for bucket_score, bucket in self._buckets.items():
+            for _ in range(len(bucket)):
+                self._add(bucket_score, 1)
+
+
+class StatsEngine:
+    """Event log plus the aggregates derived from it
+
+    Events are applied in memory at once and appended to the log in
+    batches every flush_interval. The same pass reads events appended by
+    other processes (each writer tags its records), so scale-out workers
+    converge on the same totals and leaderboard.
+
+    When the log passes compact_bytes, whichever process notices first
+    folds it into the checkpoint file (built from the previous checkpoint
+    and the log, never from live memory, which may hold unwritten events)
+    and renames an empty log into place. Appends and rotation happen under
+    a file lock; other writers see the log's inode change, read what they
+    had not yet read from the old file and reopen. The checkpoint names
+    the log it covers (inode and size), so a crash between writing it and
+    rotating never counts events twice.
+    """
+
+    def __init__(self, path: str, writer: int = 0, flush_interval: float = 5.0,
+                 compact_bytes: int = 2 * 1024 * 1024):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.checkpoint_path = f"{path}.checkpoint"
+        self.writer = writer
+        self.flush_interval = flush_interval
+        self.compact_bytes = compact_bytes
+        self.players = {}
+        self.commands = Counter()
+        self.leaderboard = Leaderboard()
+        self._buffer = bytearray()
+        self._fd = None
+        self._lock_fd = None
+        self._offset = 0
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+        self.events = 0
+        self.compactions = 0
+
+    def record_command(self, user_id: int, command: str):
+        self._record(user_id, EVENT_COMMAND, _COMMAND_CODES.get(command, 0))
+
+    def record_game(self, user_id: int, game: str, won: bool):
+        self._record(user_id, EVENT_WIN if won else EVENT_LOSS, _GAME_CODES.get(game, 0))
+
+    def _record(self, user_id: int, kind: int, code: int):
+        self._buffer += RECORD.pack(int(time.time()), user_id, kind, code, self.writer)
+        self._apply(user_id, kind, code)
+
+    def _apply(self, user_id: int, kind: int, code: int):
+        self.events += 1
+        if kind == EVENT_COMMAND:
+            self.commands[code] += 1
+            return
+        player = self.players.get(user_id)
+        if player is None:
+            player = self.players[user_id] = PlayerStats()
+        player.games += 1
+        if kind == EVENT_WIN:
+            player.wins += 1
+            player.streak += 1
+            player.best_streak = max(player.best_streak, player.streak)
+            self.leaderboard.set(user_id, player.wins)
+        else:
+            player.streak = 0
+
+    def player(self, user_id: int):
+        return self.players.get(user_id)
+
+    def rank(self, user_id: int):
+        """(rank or None, number of ranked users)"""
+        return self.leaderboard.rank(user_id), len(self.leaderboard)
+
+    def top(self, count: int = 10):
+        return self.leaderboard.top(count)
+
+    def command_counts(self) -> dict:
+        return {COMMANDS[code]: count for code, count in self.commands.most_common()}
+
+    def load(self):
+        """Restore the checkpoint, then replay the complete records logged after it"""
+        self._lock_fd = os.open(f"{self.path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        with self._locked():
+            checkpoint = self._read_checkpoint()
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+            if checkpoint:
+                self._restore(checkpoint)
+                if checkpoint['inode'] == os.fstat(self._fd).st_ino:
+                    # Not rotated after the checkpoint was written
+                    self._offset = checkpoint['offset']
+            data = self._read_new()
+        for _, user_id, kind, code, _ in RECORD.iter_unpack(data):
+            self._apply(user_id, kind, code)
+        replayed = len(data) // RECORD.size
+        logger.info("Restored %d stat events from the checkpoint and replayed %d", self.events - replayed, replayed)
+
+    @contextlib.contextmanager
+    def _locked(self):
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _read_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, 'rb') as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _restore(self, checkpoint: dict):
+        self.events = checkpoint['events']
+        self.commands.update(checkpoint['commands'])
+        for user_id, games, wins, streak, best_streak in checkpoint['players']:
+            player = self.players[user_id] = PlayerStats()
+            player.games, player.wins, player.streak, player.best_streak = games, wins, streak, best_streak
+        # In leaderboard order, so users tied on wins keep their order
+        for user_id in checkpoint['ranked']:
+            self.leaderboard.set(user_id, self.players[user_id].wins)
+
+    def _checkpoint(self, inode: int, offset: int) -> dict:
+        return {
+            'inode': inode,
+            'offset': offset,
+            'events': self.events,
+            'commands': dict(self.commands),
+            'players': [(user_id, p.games, p.wins, p.streak, p.best_streak) for user_id, p in self.players.items()],
+            'ranked': [user_id for bucket in self.leaderboard._buckets.values() for user_id in bucket],
+        }
+
+    def _compact(self) -> bool:
+        """Fold the log into the checkpoint and start an empty log (runs in a thread)"""
+        with self._locked():
+            stat = os.stat(self.path)
+            if stat.st_size < self.compact_bytes:
+                return False  # Another process got here first
+            folded = StatsEngine(self.path)
+            checkpoint = self._read_checkpoint()
+            offset = 0
+            if checkpoint:
+                folded._restore(checkpoint)
+                if checkpoint['inode'] == stat.st_ino:
+                    offset = checkpoint['offset']
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                data = f.read()
+            size = offset + len(data) - len(data) % RECORD.size
+            for _, user_id, kind, code, _ in RECORD.iter_unpack(data[:size - offset]):
+                folded._apply(user_id, kind, code)
+
+            temp_path = f"{self.checkpoint_path}.tmp"
+            with open(temp_path, 'wb') as f:
+                pickle.dump(folded._checkpoint(stat.st_ino, size), f, pickle.HIGHEST_PROTOCOL)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.checkpoint_path)
+            # Appends happen under the lock, so a trailing partial record is left by a crash: drop it
+            empty_path = f"{self.path}.new"
+            open(empty_path, 'wb').close()
+            os.replace(empty_path, self.path)
+        logger.info("Compacted %d stat events into %s", folded.events, self.checkpoint_path)
+        return True
+
+    def _read_new(self) -> bytes:
+        """Whole records appended since the last read"""
+        size = os.fstat(self._fd).st_size
+        size -= (size - self._offset) % RECORD.size
+        if size <= self._offset:
+            return b''
+        data = os.pread(self._fd, size - self._offset, self._offset)
+        self._offset += len(data)
+        return data
+
+    def _write_and_read(self, batch: bytes) -> bytes:
+        with self._locked():
+            data = b''
+            if os.stat(self.path).st_ino != os.fstat(self._fd).st_ino:
+                # Rotated by a compaction: finish the old file, then follow the new one
+                data = self._read_new()
+                os.close(self._fd)
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+                self._offset = 0
+            if batch:
+                # O_APPEND: one write per batch keeps records from different processes whole
+                os.write(self._fd, batch)
+            return data + self._read_new()
+
+    async def flush(self):
+        """Append buffered events and pick up other writers' events"""
+        async with self._flush_lock:
+            batch, self._buffer = bytes(self._buffer), bytearray()
+            try:
+                data = await asyncio.to_thread(self._write_and_read, batch)
+            except OSError as e:
+                logger.error("Failed to write stat events: %s", e)
+                self._buffer[:0] = batch
+                return
+            for _, user_id, kind, code, writer in RECORD.iter_unpack(data):
+                if writer != self.writer:
+                    self._apply(user_id, kind, code)
+            if self._offset >= self.compact_bytes:
+                try:
+                    if await asyncio.to_thread(self._compact):
+                        self.compactions += 1
+                except OSError as e:
+                    logger.error("Failed to compact stat events: %s", e)
+
+    async def start(self):
+        await asyncio.to_thread(self.load)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._fd is not None:
+            await self.flush()
+            os.close(self._fd)
+            os.close(self._lock_fd)
+            self._fd = self._lock_fd = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            'events': self.events,
+            'players': len(self.players),
+            'ranked': len(self.leaderboard),
+            'pending_bytes': len(self._buffer),
+            'log_bytes': self._offset,
+            'compactions': self.compactions,
+        }
@@ -0,0 +1,332 @@
+"""
+💾 User storage
+Pluggable backends for user profiles plus a write-behind layer that batches
+command counters so handlers never wait on disk I/O.
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+from sessions import SessionStore, UserRecord
+
+logger = logging.getLogger(__name__)
+
+
+class UserStoreBackend:
+    """Interface for user storage backends"""
+
+    # Whether calls may block and should run off the event loop
+    blocking = False
+
+    def load_user(self, user_id: int):
+        """Return the stored UserRecord or None"""
+        raise NotImplementedError
+
+    def write_batch(self, profiles: dict, increments: dict) -> set:
+        """Upsert profiles, then apply commands_used increments, atomically
+
+        Increments for users with no stored profile are skipped; their ids
+        are returned.
+        """
+        raise NotImplementedError
+
+    def load_users(self, user_ids) -> dict:
+        """Stored UserRecords for the given ids (missing ids are left out)"""
+        records = {}
+        for user_id in user_ids:
+            record = self.load_user(user_id)
+            if record is not None:
+                records[user_id] = record
+        return records
+
+    def user_ids_after(self, after_id: int, limit: int) -> list:
+        """Up to limit stored user ids greater than after_id, ascending"""
+        raise NotImplementedError
+
+    def delete_users(self, user_ids):
+        """Remove users in one transaction"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemoryUserStore(UserStoreBackend):
+    """In-process backend (data is lost on restart)"""
+
+    def __init__(self):
+        self._users = {}
+
+    def load_user(self, user_id: int):
+        row = self._users.get(user_id)
+        return UserRecord(*row) if row else None
+
+    def write_batch(self, profiles: dict, increments: dict) -> set:
+        for user_id, record in profiles.items():
+            used = self._users[user_id][3] if user_id in self._users else 0
+            self._users[user_id] = (record.name, record.username, record.joined, used)
+        missing = set()
+        for user_id, count in increments.items():
+            row = self._users.get(user_id)
+            if row:
+                self._users[user_id] = row[:3] + (row[3] + count,)
+            else:
+                missing.add(user_id)
+        return missing
+
+    def user_ids_after(self, after_id: int, limit: int) -> list:
+        return sorted(user_id for user_id in self._users if user_id > after_id)[:limit]
+
+    def delete_users(self, user_ids):
+        for user_id in user_ids:
+            self._users.pop(user_id, None)
+
+
+class SQLiteUserStore(UserStoreBackend):
+    """SQLite backend, shareable between processes on the same host"""
+
+    blocking = True
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS users ('
+            'id INTEGER PRIMARY KEY, '
+            'name TEXT, '
+            'username TEXT, '
+            'joined TEXT, '
+            'commands_used INTEGER NOT NULL DEFAULT 0)'
+        )
+        self._conn.commit()
+
+    def load_user(self, user_id: int):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT name, username, joined, commands_used FROM users WHERE id = ?', (user_id,)
+            ).fetchone()
+        return UserRecord(*row) if row else None
+
+    def load_users(self, user_ids) -> dict:
+        user_ids = list(user_ids)
+        records = {}
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(user_ids), 500):
+                chunk = user_ids[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT id, name, username, joined, commands_used FROM users "
+                    f"WHERE id IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+                for user_id, *fields in rows:
+                    records[user_id] = UserRecord(*fields)
+        return records
+
+    def write_batch(self, profiles: dict, increments: dict) -> set:
+        user_ids = list(increments)
+        stored = set()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'INSERT INTO users (id, name, username, joined) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(id) DO UPDATE SET '
+                'name = excluded.name, username = excluded.username, joined = excluded.joined',
+                [(user_id, r.name, r.username, r.joined) for user_id, r in profiles.items()]
+            )
+            for start in range(0, len(user_ids), 500):
+                chunk = user_ids[start:start + 500]
+                stored.update(row[0] for row in self._conn.execute(
+                    f"SELECT id FROM users WHERE id IN ({','.join('?' * len(chunk))})", chunk
+                ))
+            self._conn.executemany(
+                'UPDATE users SET commands_used = commands_used + ? WHERE id = ?',
+                [(count, user_id) for user_id, count in increments.items() if user_id in stored]
+            )
+        return set(user_ids) - stored
+
+    def user_ids_after(self, after_id: int, limit: int) -> list:
+        # Keyset paging on the primary key: each page is an index range scan
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT id FROM users WHERE id > ? ORDER BY id LIMIT ?', (after_id, limit)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def delete_users(self, user_ids):
+        with self._lock, self._conn:
+            self._conn.executemany('DELETE FROM users WHERE id = ?', [(user_id,) for user_id in user_ids])
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def create_backend(kind: str, data_dir: str) -> UserStoreBackend:
+    """Build a backend from its configured name"""
+    if kind == 'memory':
+        return MemoryUserStore()
+    if kind == 'sqlite':
+        return SQLiteUserStore(os.path.join(data_dir, 'users.db'))
+    raise ValueError(f"Unknown user store backend: {kind}")
+
+
+class UserStats:
+    """Write-behind front for a backend
+
+    Profile writes and command increments are coalesced in memory and
+    flushed in one transaction per interval (and at shutdown). Reads go
+    through a bounded cache with pending increments applied. Commands
+    only count for users with a profile: users found to have none are
+    remembered for unknown_ttl seconds (or until they run /start), and
+    their commands are not queued at all.
+    """
+
+    def __init__(self, backend: UserStoreBackend, cache_size: int = 100000, flush_interval: float = 5.0,
+                 unknown_ttl: float = 300.0):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.unknown_ttl = unknown_ttl
+        self._cache = SessionStore(max_size=cache_size)
+        # user id -> when they were found to have no profile; expires, so one saved by another worker is seen
+        self._unknown = SessionStore(max_size=cache_size)
+        self._pending_profiles = {}
+        self._pending_increments = defaultdict(int)
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+        self.flushes = 0
+
+    async def _call(self, func, *args):
+        if self.backend.blocking:
+            return await asyncio.to_thread(func, *args)
+        return func(*args)
+
+    async def save_profile(self, user_id: int, name, username, joined: str):
+        """Create or refresh a user's profile, keeping their command count"""
+        existing = await self.get(user_id)
+        commands_used = existing.commands_used if existing else 0
+        record = UserRecord(name, username, joined, commands_used)
+        self._cache.set(user_id, record)
+        self._pending_profiles[user_id] = record
+        self._unknown.pop(user_id)
+
+    def record_command(self, user_id: int):
+        """Count a command; never touches the backend"""
+        found_missing = self._unknown.get(user_id)
+        if found_missing is not None and time.monotonic() - found_missing < self.unknown_ttl:
+            return
+        self._pending_increments[user_id] += 1
+        cached = self._cache.get(user_id)
+        if cached:
+            cached.commands_used += 1
+
+    async def get(self, user_id: int):
+        """Return the user's record, or None if they never ran /start"""
+        cached = self._cache.get(user_id)
+        if cached:
+            return cached
+        record = await self._call(self.backend.load_user, user_id)
+        if record is None:
+            if user_id not in self._pending_profiles:
+                self._unknown.set(user_id, time.monotonic())
+            return None
+        record.commands_used += self._pending_increments.get(user_id, 0)
+        self._cache.set(user_id, record)
+        return record
+
+    def cached_user_ids(self) -> list:
+        """Ids in the read cache, least recently used first"""
+        return self._cache.keys()
+
+    async def preload(self, user_ids) -> int:
+        """Fill the read cache from the backend in one batch; returns how many were found"""
+        records = await self._call(self.backend.load_users, user_ids)
+        for user_id in user_ids:
+            record = records.get(user_id)
+            if record is not None and user_id not in self._cache:
+                record.commands_used += self._pending_increments.get(user_id, 0)
+                self._cache.set(user_id, record)
+        return len(records)
+
+    async def user_ids(self, chunk_size: int = 500, after_id: int = 0):
+        """Yield lists of stored user ids in ascending order, chunk_size at a time
+
+        Pending profiles are flushed first so users who just ran /start are
+        included. Only one chunk is held in memory at a time.
+        """
+        await self.flush()
+        while True:
+            chunk = await self._call(self.backend.user_ids_after, after_id, chunk_size)
+            if not chunk:
+                return
+            yield chunk
+            after_id = chunk[-1]
+
+    async def remove(self, user_ids):
+        """Forget users entirely (for example after they blocked the bot)"""
+        user_ids = list(user_ids)
+        for user_id in user_ids:
+            self._cache.pop(user_id, None)
+            self._pending_profiles.pop(user_id, None)
+            self._pending_increments.pop(user_id, None)
+        await self._call(self.backend.delete_users, user_ids)
+
+    async def flush(self):
+        """Write all pending changes in one batch"""
+        async with self._flush_lock:
+            if not self._pending_profiles and not self._pending_increments:
+                return
+            profiles, self._pending_profiles = self._pending_profiles, {}
+            increments, self._pending_increments = self._pending_increments, defaultdict(int)
+            try:
+                missing = await self._call(self.backend.write_batch, profiles, dict(increments))
+                self.flushes += 1
+            except Exception as e:
+                logger.error("Failed to flush user stats: %s", e)
+                # Merge back so the next flush retries
+                for user_id, record in profiles.items():
+                    self._pending_profiles.setdefault(user_id, record)
+                for user_id, count in increments.items():
+                    self._pending_increments[user_id] += count
+                return
+            now = time.monotonic()
+            for user_id in missing:
+                if user_id not in self._pending_profiles:
+                    self._unknown.set(user_id, now)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush loop, write what is left and close the backend"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        await self._call(self.backend.close)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            'cache': self._cache.stats(),
+            'pending_profiles': len(self._pending_profiles),
+            'pending_increments': len(self._pending_increments),
+            'unknown_users': len(self._unknown),
+            'flushes': self.flushes,
+        }
@@ -0,0 +1,256 @@
+"""
+🧩 Keyboards and message templates
+Built once at startup and shared by every update. InlineKeyboardMarkup is
+immutable, so one instance can be attached to any number of messages.
+telegram is imported only when the keyboards are built.
+"""
+
+import sys
+from collections import OrderedDict
+from string import Formatter
+
+from quiz import encode_answer
+from sessions import SessionStore
+
+
+class CompiledTemplate:
+    """A str.format-style template parsed once into literal/field pairs"""
+    __slots__ = ('text', '_parts')
+
+    def __init__(self, text: str):
+        self.text = text
+        self._parts = tuple((literal, field) for literal, field, _, _ in Formatter().parse(text))
+
+    def render(self, **values) -> str:
+        out = []
+        for literal, field in self._parts:
+            out.append(literal)
+            if field is not None:
+                out.append(str(values[field]))
+        return ''.join(out)
+
+
+class RenderCache:
+    """Rendered texts by (template, key), each valid only for the inputs it was built from
+
+    A lookup whose inputs differ from the stored ones is a miss, so inputs
+    that change behind the cache's back (another player's win moving your
+    rank) are still picked up; invalidate() drops an entry as soon as its
+    owner knows it is stale. Least recently used texts are evicted to stay
+    under max_bytes.
+    """
+
+    def __init__(self, max_bytes: int = 4 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # (template, key) -> (inputs, text, size)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def render(self, template: str, key, inputs: tuple, build) -> str:
+        """The cached text for these inputs, or build() rendered and stored"""
+        entry_key = (template, key)
+        entry = self._entries.get(entry_key)
+        if entry is not None and entry[0] == inputs:
+            self.hits += 1
+            self._entries.move_to_end(entry_key)
+            return entry[1]
+        self.misses += 1
+        text = build()
+        self._store(entry_key, inputs, text)
+        return text
+
+    def _store(self, entry_key, inputs: tuple, text: str):
+        size = sys.getsizeof(text) + sys.getsizeof(inputs)
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(entry_key, None)
+        if old is not None:
+            self.bytes -= old[2]
+        self._entries[entry_key] = (inputs, text, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, (_, _, evicted) = self._entries.popitem(last=False)
+            self.bytes -= evicted
+            self.evictions += 1
+
+    def invalidate(self, template: str, key):
+        entry = self._entries.pop((template, key), None)
+        if entry is not None:
+            self.bytes -= entry[2]
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
+
+
+WELCOME_TEXT = CompiledTemplate("""
+🎉 **Welcome {name}!** 🎉
+
+I'm your friendly bot assistant! Here's what I can do:
+
+🎮 **Games & Fun:**
+• `/roll` - Roll a dice
+• `/game` - Number guessing game  
+• `/quiz` - Quick trivia questions
+• `/animal` - Random cute animal
+• `/joke` - Funny jokes
+• `/fact` - Amazing fun facts
+
+🔧 **Useful Tools:**
+• `/math` - Simple calculator
+• `/weather` - Weather information
+• `/quote` - Daily inspiration
+• `/reminder` - Set reminders
+• `/help` - Show all commands
+
+✨ **Just send me any message and I'll chat with you!**
+
+Try clicking the buttons below! 👇
+        """)
+
+HELP_TEXT = """
+🤖 **Bot Commands Help** 🤖
+
+**🎮 Games & Entertainment:**
+• `/roll` - Roll a 6-sided dice
+• `/game` - Start number guessing game
+• `/quiz` - Quick trivia questions
+• `/joke` - Get a random joke
+• `/fact` - Learn something amazing
+• `/animal` - See a cute animal
+
+**🔧 Utility Commands:**
+• `/math <expression>` - Calculate math
+• `/weather <city>` - Get weather info
+• `/quote` - Daily inspiration
+• `/reminder <min> <text>` - Set reminder
+• `/stats` - Your personal statistics
+• `/leaderboard` - Top players
+• `/about` - About this bot
+
+**💬 Chat Features:**
+• Send any text for friendly responses
+• Send math like "10+5" and I'll solve it
+• Ask questions and I'll try to help!
+
+Made with ❤️ for you! Need help? Just ask! 😊
+        """
+
+ABOUT_TEXT = """
+🤖 **About This Bot** 🤖
+
+**Version:** 2.0.0
+**Features:** Games, utilities, fun facts, and more!
+**Status:** Running 24/7 on free hosting ⚡
+
+**What I can do:**
+✅ Interactive games and quizzes
+✅ Math calculator and utilities  
+✅ Fun facts and daily inspiration
+✅ Reminders and helpful tools
+✅ Friendly conversations
+
+**Free & Open Source** 💝
+This bot runs on free hosting and is available to everyone!
+
+**Developer:** Made with ❤️ for the Telegram community
+**Support:** If you find issues, let us know!
+
+Enjoy using the bot! 🌟
+        """
+
+QUOTE_TEXT = CompiledTemplate("""
+✨ **Daily Inspiration** ✨
+
+"{quote}"
+
+— {author}
+
+🌟 Have an amazing day! 🌟
+        """)
+
+STATS_TEXT = CompiledTemplate("""
+📊 **Your Bot Statistics** 📊
+
+👤 **Name:** {name}
+📅 **Joined:** {joined}
+🎯 **Commands Used:** {commands_used}
+🏆 **Status:** {status}
+
+🎮 **Games Played:** {games}
+✅ **Win Rate:** {win_rate}
+🔥 **Win Streak:** {streak} (best {best_streak})
+🏅 **Leaderboard:** {rank}
+
+Thanks for using the bot! 🎉
+        """)
+
+
+# Button layouts as plain (text, callback_data) rows, so the warm-up fast
+# path can send them before telegram is imported
+MAIN_MENU = (
+    (("🎲 Roll Dice", "roll"), ("🎮 Play Game", "game")),
+    (("😂 Tell Joke", "joke"), ("🤓 Fun Fact", "fact")),
+    (("🧠 Quick Quiz", "quiz"), ("🐱 Cute Animal", "animal")),
+    (("📊 My Stats", "stats"), ("❓ Help", "help")),
+)
+QUICK_ACTIONS = (
+    (("🎲 Roll Dice", "roll"), ("😂 Tell Joke", "joke")),
+    (("🎮 Play Game", "game"), ("❓ Help", "help")),
+)
+
+
+def _markup(rows):
+    from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(text, callback_data=callback_data) for text, callback_data in row]
+        for row in rows
+    ])
+
+
+def _single(text: str, callback_data: str):
+    return _markup((((text, callback_data),),))
+
+
+class KeyboardRegistry:
+    """Every inline keyboard the bot sends, prebuilt"""
+
+    def __init__(self, quiz_cache_size: int = 1024):
+        self.main_menu = _markup(MAIN_MENU)
+        self.quick_actions = _markup(QUICK_ACTIONS)
+        self.roll_again = _single("🎲 Roll Again", "roll")
+        self.another_joke = _single("😂 Another Joke", "joke")
+        self.another_fact = _single("🤓 Another Fact", "fact")
+        self.another_animal = _single("🐾 Another Animal", "animal")
+        self.another_quote = _single("✨ Another Quote", "quote")
+        self.another_quiz = _single("🧠 Another Quiz", "quiz")
+        # Answer keyboards for recently asked questions
+        self._quiz = SessionStore(max_size=quiz_cache_size)
+
+    def quiz(self, question_id: int, version: int, options):
+        """Answer keyboard for one version of a quiz question"""
+        key = (question_id, version)
+        markup = self._quiz.get(key)
+        if markup is None:
+            markup = _markup(
+                [(option, encode_answer(question_id, version, i))] for i, option in enumerate(options)
+            )
+            self._quiz.set(key, markup)
+        return markup
@@ -0,0 +1,97 @@
+import asyncio
+import os
+import time
+
+from broadcast import Broadcaster
+
+
+class FakeUsers:
+    def __init__(self, count: int):
+        self.ids = list(range(1, count + 1))
+
+    async def user_ids(self, chunk_size: int, after_id: int = 0):
+        remaining = [user_id for user_id in self.ids if user_id > after_id]
+        for start in range(0, len(remaining), chunk_size):
+            yield remaining[start:start + chunk_size]
+
+    async def remove(self, user_ids):
+        pass
+
+
+class FakeBot:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.sent = []
+
+    async def send_message(self, chat_id, text, parse_mode=None, rate_limit_args=None):
+        await asyncio.sleep(self.delay)
+        self.sent.append(chat_id)
+
+
+def test_broadcast_reaches_every_user_and_removes_its_checkpoint(tmp_path):
+    async def scenario():
+        finished = []
+
+        async def on_finish(job):
+            finished.append(job)
+
+        broadcaster = Broadcaster(FakeUsers(25), str(tmp_path / 'broadcast.json'), rate=1000, chunk_size=10,
+                                  on_finish=on_finish)
+        bot = FakeBot()
+        assert broadcaster.start(bot, 'hello')
+        assert not broadcaster.start(bot, 'again')
+        await broadcaster._task
+        return broadcaster, bot, finished
+
+    broadcaster, bot, finished = asyncio.run(scenario())
+    assert sorted(bot.sent) == list(range(1, 26))
+    assert finished[0].sent == 25 and broadcaster.job is None
+    assert not os.path.exists(broadcaster.checkpoint_path)
+
+
+def test_stop_checkpoints_and_resume_continues(tmp_path):
+    async def scenario():
+        path = str(tmp_path / 'broadcast.json')
+        first = Broadcaster(FakeUsers(40), path, rate=1000, chunk_size=10)
+        bot = FakeBot()
+        first.start(bot, 'hello')
+        await asyncio.sleep(0.005)
+        await first.stop()
+        assert os.path.exists(path)
+        paused_after = first.job.last_id
+
+        second = Broadcaster(FakeUsers(40), path, rate=1000, chunk_size=10)
+        assert await second.resume(bot)
+        await second._task
+        return bot, paused_after
+
+    bot, paused_after = asyncio.run(scenario())
+    assert 0 < paused_after < 40
+    assert sorted(set(bot.sent)) == list(range(1, 41))
+
+
+def test_cancel_after_a_timed_out_stop_leaves_no_checkpoint(tmp_path, monkeypatch):
+    async def scenario():
+        broadcaster = Broadcaster(FakeUsers(20), str(tmp_path / 'broadcast.json'), rate=1000, chunk_size=5)
+        save = broadcaster._save_checkpoint
+        writing = asyncio.Event()
+        loop = asyncio.get_running_loop()
+
+        def slow_save(job):
+            loop.call_soon_threadsafe(writing.set)
+            time.sleep(0.2)
+            save(job)
+
+        monkeypatch.setattr(broadcaster, '_save_checkpoint', slow_save)
+        broadcaster.start(FakeBot(), 'hello')
+        await writing.wait()
+        # The stop times out mid-write, then the checkpoint is removed
+        original_stop = broadcaster.stop
+        monkeypatch.setattr(broadcaster, 'stop', lambda: original_stop(timeout=0.01))
+        assert await broadcaster.cancel()
+        await asyncio.sleep(0.3)
+        return broadcaster
+
+    broadcaster = asyncio.run(scenario())
+    assert not broadcaster.running and broadcaster.job is None
+    assert not os.path.exists(broadcaster.checkpoint_path)
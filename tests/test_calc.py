@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+
+from calc import MAX_LENGTH, MathEngine, MathError, evaluate, parse
+
+
+@pytest.mark.parametrize('expression, expected', [
+    ('2+3*4', 14),
+    ('(2+3)*4', 20),
+    ('7//2', 3),
+    ('7%3', 1),
+    ('7/2', 3.5),
+    ('-(2**3)', -8),
+    ('+1.5', 1.5),
+    ('2**-1', 0.5),
+    ('10**100', 10 ** 100),
+    ('((((1))))', 1),
+])
+def test_arithmetic(expression, expected):
+    assert evaluate(expression) == expected
+
+
+@pytest.mark.parametrize('expression, message', [
+    ('9**9**9**9', "Exponent is too large!"),
+    ('2**1001', "Exponent is too large!"),
+    ('10**100*10', "Result is too large!"),
+    ('1' * 150, "Result is too large!"),
+    ('1e400', "Result is too large!"),
+    ('1/0', "Division by zero!"),
+    ('5%0', "Division by zero!"),
+    ('0**-1', "Division by zero!"),
+    ('(-8)**0.5', "Result is not a real number!"),
+    ('-' * 150 + '1', "Expression is too complex!"),
+    ('1+' * 60 + '1', "Expression is too complex!"),
+    ('1' * (MAX_LENGTH + 1), "Expression is too long!"),
+    ('2 +', "Invalid expression!"),
+])
+def test_rejected_values_and_limits(expression, message):
+    with pytest.raises(MathError, match=message.replace('*', r'\*')):
+        evaluate(expression)
+
+
+@pytest.mark.parametrize('expression', [
+    '(1).real',
+    '(1).__class__',
+    'x',
+    '__import__("os")',
+    'print(1)',
+    'lambda: 1',
+    '[1]',
+    '2 if 1 else 3',
+    '2 < 3',
+    '(x := 1)',
+])
+def test_only_numbers_and_operators_are_accepted(expression):
+    with pytest.raises(MathError, match="Only numbers and basic operators allowed!"):
+        parse(expression)
+
+
+@pytest.mark.parametrize('expression', ['"a"', 'True', 'None', '1j', 'b"1"'])
+def test_only_int_and_float_literals(expression):
+    with pytest.raises(MathError, match="Only numbers are allowed!"):
+        parse(expression)
+
+
+@pytest.mark.parametrize('expression', ['1 & 1', '1 | 2', '1 << 3', '~1', 'not 1'])
+def test_unsupported_operators(expression):
+    with pytest.raises(MathError):
+        parse(expression)
+
+
+def test_time_limit():
+    with pytest.raises(MathError, match="Calculation took too long!"):
+        evaluate('1+1', time_limit=-1)
+
+
+def test_results_are_cached():
+    async def scenario():
+        engine = MathEngine()
+        first = await engine.evaluate('2 + 2')
+        second = await engine.evaluate(' 2  +   2 ')
+        return engine, first, second
+
+    engine, first, second = asyncio.run(scenario())
+    assert first == second == 4
+    assert engine.misses == 1 and engine.hits == 1
+
+
+def test_rejections_are_cached_without_growing_tracebacks():
+    def depth(error):
+        frames, traceback = 0, error.__traceback__
+        while traceback:
+            frames, traceback = frames + 1, traceback.tb_next
+        return frames
+
+    async def scenario():
+        engine = MathEngine()
+        errors = []
+        for _ in range(4):
+            try:
+                await engine.evaluate('1/0')
+            except MathError as e:
+                errors.append(e)
+        return engine, errors
+
+    engine, errors = asyncio.run(scenario())
+    assert [str(e) for e in errors] == ["Division by zero!"] * 4
+    assert engine.misses == 1 and engine.hits == 3
+    assert len({id(e) for e in errors}) == 4
+    assert len({depth(e) for e in errors[1:]}) == 1
+
+
+def test_heavy_expressions_run_in_a_worker_process():
+    async def scenario():
+        engine = MathEngine(workers=1, heavy_nodes=0)
+        try:
+            result = await engine.evaluate('(1+2)*3')
+            with pytest.raises(MathError, match="Division by zero!"):
+                await engine.evaluate('1/(2-2)')
+        finally:
+            engine.close()
+        return result
+
+    assert asyncio.run(scenario()) == 9
@@ -0,0 +1,68 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from ingress import WebhookIngress, ordering_key
+from processing import ChatOrderedUpdateProcessor
+
+USER = {'id': 42, 'is_bot': False, 'first_name': 'Ann'}
+CHAT = {'id': -100123, 'type': 'supergroup', 'title': 'Group'}
+
+
+def body(update: dict) -> bytes:
+    return json.dumps(update, separators=(',', ':')).encode()
+
+
+def message(update_id: int, chat: dict = CHAT) -> dict:
+    return {'update_id': update_id, 'message': {
+        'message_id': update_id, 'from': USER, 'sender_chat': {'id': -5, 'type': 'channel'},
+        'chat': chat, 'date': 0, 'text': 'hi',
+        'reply_to_message': {'message_id': 1, 'chat': {'id': 7, 'type': 'private'}, 'date': 0},
+    }}
+
+
+class FakeRequest:
+    def __init__(self, data: bytes):
+        self.data = data
+
+    async def read(self):
+        return self.data
+
+
+def test_ordering_key_matches_the_processor():
+    assert ordering_key(body(message(1))) == CHAT['id']
+    callback = {'update_id': 2, 'callback_query': {
+        'id': '9', 'from': USER, 'chat_instance': '1', 'data': 'roll',
+        'message': {'message_id': 3, 'chat': {'id': 42, 'type': 'private'}, 'date': 0},
+    }}
+    assert ordering_key(body(callback)) == 42
+    inline = {'update_id': 3, 'inline_query': {'id': '1', 'from': USER, 'query': '', 'offset': ''}}
+    assert ordering_key(body(inline)) == ('user', 42)
+    assert ordering_key(body({'update_id': 4})) is None
+
+
+def test_backed_up_chat_is_refused_before_it_is_queued():
+    async def scenario():
+        processor = ChatOrderedUpdateProcessor(max_pending_per_chat=3)
+        ingress = WebhookIngress('token')
+        # Live, but with no consumer running: bodies stay queued
+        ingress.application = SimpleNamespace(update_processor=processor)
+        statuses = [(await ingress._handle(FakeRequest(body(message(i))))).status for i in range(1, 6)]
+        other_chat = await ingress._handle(FakeRequest(body(message(6, {'id': 1, 'type': 'private'}))))
+        redelivered = await ingress._handle(FakeRequest(body(message(4))))
+        return ingress, statuses, other_chat.status, redelivered.status
+
+    ingress, statuses, other_chat, redelivered = asyncio.run(scenario())
+    assert statuses == [200, 200, 200, 503, 503]
+    assert other_chat == 200
+    # Refused updates were not marked as seen, so redelivery is considered again
+    assert redelivered == 503 and ingress.duplicates == 0
+    assert ingress.rejected == 3 and ingress.queue_depth == 4
+
+
+def test_malformed_body_is_rejected():
+    async def scenario():
+        ingress = WebhookIngress('token')
+        return (await ingress._handle(FakeRequest(b'{"message": {}}'))).status
+
+    assert asyncio.run(scenario()) == 400
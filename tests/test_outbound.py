@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+from outbound import PRIORITY_BULK, OutboundLimiter, animation_frame
+
+
+async def send(limiter, chat_id, rate_limit_args=None, delay: float = 0.0):
+    async def call():
+        await asyncio.sleep(delay)
+        return 'sent'
+    return await limiter.process_request(call, (), {}, 'sendMessage', {'chat_id': chat_id}, rate_limit_args)
+
+
+def run(scenario, **options):
+    async def main():
+        limiter = OutboundLimiter(**options)
+        await limiter.initialize()
+        try:
+            return await scenario(limiter)
+        finally:
+            await limiter.shutdown()
+    return asyncio.run(main())
+
+
+def test_private_replies_are_not_paced_per_chat():
+    async def scenario(limiter):
+        started = time.monotonic()
+        results = [await send(limiter, 42) for _ in range(6)]
+        return results, time.monotonic() - started
+
+    results, elapsed = run(scenario)
+    assert results == ['sent'] * 6
+    assert elapsed < 0.5
+
+
+def test_group_and_bulk_sends_are_paced():
+    async def scenario(limiter):
+        started = time.monotonic()
+        await send(limiter, -100)
+        await send(limiter, -100)
+        group = time.monotonic() - started
+        started = time.monotonic()
+        for _ in range(3):
+            await send(limiter, 7, {'priority': PRIORITY_BULK})
+        return group, time.monotonic() - started
+
+    group, bulk = run(scenario, chat_rate=10, chat_burst=2, group_rate=10)
+    assert group >= 0.08
+    assert bulk >= 0.08
+
+
+def test_animation_frames_back_off_after_replies():
+    async def scenario(limiter):
+        for _ in range(3):
+            await send(limiter, 42)
+        return await send(limiter, 42, animation_frame(42, 1))
+
+    # Dropped: the replies used up the chat's burst
+    assert run(scenario) is True
+
+
+def test_newer_frame_supersedes_a_queued_one():
+    async def scenario(limiter):
+        # Hold the global budget so both frames queue
+        limiter._global.tokens = -0.1
+        first = asyncio.create_task(send(limiter, 42, animation_frame(42, 1)))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(send(limiter, 42, animation_frame(42, 1)))
+        results = await asyncio.gather(first, second)
+        return results, limiter.coalesced, dict(limiter._latest_frame)
+
+    results, coalesced, latest = run(scenario, global_rate=10, chat_burst=5)
+    assert results == [True, 'sent'] and coalesced == 1
+    assert latest == {}
+
+
+def test_cancelled_frame_leaves_no_coalescing_entry():
+    async def scenario(limiter):
+        limiter._global.tokens = -10  # nothing leaves the queue for a while
+        frame = asyncio.create_task(send(limiter, 42, animation_frame(42, 1)))
+        await asyncio.sleep(0.01)
+        assert limiter._latest_frame
+        frame.cancel()
+        await asyncio.gather(frame, return_exceptions=True)
+        return dict(limiter._latest_frame)
+
+    assert run(scenario) == {}
@@ -0,0 +1,138 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from processing import ChatOrderedUpdateProcessor
+
+
+def update(update_id: int, chat_id=None, user_id=None):
+    return SimpleNamespace(
+        update_id=update_id,
+        effective_chat=SimpleNamespace(id=chat_id) if chat_id is not None else None,
+        effective_user=SimpleNamespace(id=user_id) if user_id is not None else None,
+    )
+
+
+def handler(log: list, name, delay: float = 0.0):
+    async def run():
+        log.append(('start', name))
+        await asyncio.sleep(delay)
+        log.append(('end', name))
+    return run()
+
+
+async def feed(processor, updates_and_coroutines):
+    """Start every update at once, like the application does, and wait for all of them"""
+    tasks = [asyncio.create_task(processor.process_update(u, c)) for u, c in updates_and_coroutines]
+    await asyncio.gather(*tasks)
+
+
+def test_one_chat_is_handled_in_arrival_order():
+    async def scenario():
+        processor = ChatOrderedUpdateProcessor()
+        log = []
+        # Later updates finish faster, so only the per-chat lock keeps them in order
+        await feed(processor, [(update(i, chat_id=1), handler(log, i, 0.01 * (5 - i))) for i in range(5)])
+        return processor, log
+
+    processor, log = asyncio.run(scenario())
+    assert log == [(event, i) for i in range(5) for event in ('start', 'end')]
+    assert processor.pending == 0 and processor.processed == 5
+
+
+def test_different_chats_run_in_parallel_within_the_global_limit():
+    async def scenario():
+        processor = ChatOrderedUpdateProcessor(max_concurrent_updates=2)
+        peak = 0
+
+        async def work():
+            nonlocal peak
+            peak = max(peak, processor.in_flight)
+            await asyncio.sleep(0.05)
+
+        started = time.monotonic()
+        await feed(processor, [(update(i, chat_id=i), work()) for i in range(4)])
+        return peak, time.monotonic() - started
+
+    peak, elapsed = asyncio.run(scenario())
+    assert peak == 2
+    assert 0.09 < elapsed < 0.2  # two rounds of two, not four in sequence
+
+
+def test_chatless_updates_fall_back_to_the_user_then_to_no_ordering():
+    processor = ChatOrderedUpdateProcessor()
+    assert processor.ordering_key(update(1, chat_id=5, user_id=9)) == 5
+    assert processor.ordering_key(update(2, user_id=9)) == ('user', 9)
+    assert processor.ordering_key(update(3)) is None
+    assert processor.ordering_key(object()) is None
+
+
+def test_backed_up_chat_sheds_new_updates():
+    async def scenario():
+        processor = ChatOrderedUpdateProcessor(max_pending_per_chat=2)
+        log = []
+        await feed(processor, [(update(i, chat_id=1), handler(log, i, 0.01)) for i in range(4)]
+                   + [(update(9, chat_id=2), handler(log, 9))])
+        return processor, log
+
+    processor, log = asyncio.run(scenario())
+    assert processor.shed == 2
+    assert {name for _, name in log} == {0, 1, 9}
+    assert processor.pending == 0 and not processor._chats
+
+
+def test_global_backlog_limit_sheds_across_chats():
+    async def scenario():
+        processor = ChatOrderedUpdateProcessor(max_pending=3)
+        log = []
+        await feed(processor, [(update(i, chat_id=i), handler(log, i, 0.01)) for i in range(5)])
+        return processor, log
+
+    processor, log = asyncio.run(scenario())
+    assert processor.shed == 2
+    assert len(log) == 6
+
+
+def test_admitted_updates_are_never_shed():
+    async def scenario():
+        processor = ChatOrderedUpdateProcessor(max_pending_per_chat=2)
+        first, second, third = (update(i, chat_id=1) for i in range(3))
+        assert processor.admit(first) and processor.admit(second)
+        assert not processor.admit(third)
+        assert processor.pending == 2 and processor.pending_for(1) == 2
+
+        log = []
+        waiting = asyncio.create_task(processor.wait_for_room(third))
+        await asyncio.sleep(0.01)
+        blocked = not waiting.done()
+        # Admitted updates arriving at a full chat still run, and free room as they finish
+        await feed(processor, [(first, handler(log, 0)), (second, handler(log, 1))])
+        await asyncio.wait_for(waiting, 1)
+        await feed(processor, [(third, handler(log, 2))])
+        return processor, log, blocked
+
+    processor, log, blocked = asyncio.run(scenario())
+    assert blocked
+    assert processor.shed == 0
+    assert [name for event, name in log if event == 'end'] == [0, 1, 2]
+    assert processor.pending == 0 and not processor._admitted
+
+
+def test_abort_cancels_queued_and_running_updates():
+    async def scenario():
+        processor = ChatOrderedUpdateProcessor()
+        log = []
+        tasks = [asyncio.create_task(processor.process_update(update(i, chat_id=1), handler(log, i, 10)))
+                 for i in range(3)]
+        await asyncio.sleep(0.01)
+        aborted = processor.abort()
+        # Aborted updates return normally, so the application still marks them done
+        await asyncio.wait_for(asyncio.gather(*tasks), 1)
+        late = asyncio.create_task(processor.process_update(update(9, chat_id=1), handler(log, 9)))
+        await late
+        return processor, log, aborted
+
+    processor, log, aborted = asyncio.run(scenario())
+    assert aborted == 3
+    assert log == [('start', 0)]
+    assert processor.pending == 0 and processor.in_flight == 0
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+from telegram.error import BadRequest, Forbidden, RetryAfter, TimedOut
+
+from reminders import ReminderScheduler, ReminderStore
+
+
+class FlakySender:
+    """Fails each chat's sends with the queued errors, then succeeds"""
+
+    def __init__(self, failures: dict):
+        self.failures = {chat_id: list(errors) for chat_id, errors in failures.items()}
+        self.attempts = []
+        self.delivered = []
+
+    async def __call__(self, chat_id, message):
+        self.attempts.append(chat_id)
+        errors = self.failures.get(chat_id)
+        if errors:
+            raise errors.pop(0)
+        self.delivered.append((chat_id, message))
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / 'reminders.db')
+
+
+def run(store_path, sender, reminders, wait: float, **options):
+    async def scenario():
+        scheduler = ReminderScheduler(ReminderStore(store_path), sender, **options)
+        await scheduler.start()
+        for chat_id in reminders:
+            await scheduler.schedule(chat_id, 0, f"note {chat_id}")
+        await asyncio.sleep(wait)
+        pending = len(scheduler)
+        await scheduler.stop()
+        return pending
+
+    pending = asyncio.run(scenario())
+    store = ReminderStore(store_path)
+    left = sorted(chat_id for _, _, chat_id, _ in store.load_all())
+    store.close()
+    return pending, left
+
+
+def test_delivered_and_undeliverable_reminders_are_removed(store_path):
+    sender = FlakySender({2: [Forbidden("bot was blocked by the user")], 3: [BadRequest("Chat not found")]})
+    pending, left = run(store_path, sender, [1, 2, 3], 0.1)
+    assert sender.delivered == [(1, 'note 1')]
+    assert pending == 0 and left == []
+
+
+def test_transient_failures_are_retried_with_backoff(store_path):
+    sender = FlakySender({1: [TimedOut(), TimedOut()], 2: [RetryAfter(1)]})
+    pending, left = run(store_path, sender, [1, 2], 0.2, retry_delay=0.02)
+    # 1 retried after 0.02s and 0.04s; 2 waits the requested second
+    assert sender.delivered == [(1, 'note 1')]
+    assert sender.attempts.count(1) == 3
+    assert pending == 1 and left == [2]
+
+
+def test_retries_survive_a_restart(store_path):
+    sender = FlakySender({1: [TimedOut()]})
+    _, left = run(store_path, sender, [1], 0.05, retry_delay=0.1)
+    assert left == [1]
+    _, left = run(store_path, sender, [], 0.2)
+    assert sender.delivered == [(1, 'note 1')] and left == []
+
+
+def test_gives_up_after_max_attempts(store_path):
+    sender = FlakySender({1: [TimedOut()] * 5})
+    pending, left = run(store_path, sender, [1], 0.2, retry_delay=0.01, max_attempts=3)
+    assert sender.attempts == [1, 1, 1]
+    assert pending == 0 and left == []
@@ -0,0 +1,74 @@
+import pytest
+
+import sessions
+from sessions import NumberGuessSession, SessionStore, SQLiteSessionStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / 'sessions.db'), max_size=3, ttl=100, prune_every=1)
+    yield store
+    store._conn.close()
+
+
+def touched(store, key):
+    return store._conn.execute('SELECT touched FROM sessions WHERE key = ?', (str(key),)).fetchone()[0]
+
+
+def test_round_trip_and_pop(store):
+    store.set(1, NumberGuessSession(7))
+    session = store.get(1)
+    assert (session.type, session.number) == ('number_guess', 7)
+    assert store.pop(1).number == 7
+    assert store.get(1, 'gone') == 'gone' and 1 not in store
+
+
+def test_reads_only_refresh_stale_access_times(store, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(sessions.time, 'time', lambda: clock[0])
+    store.set(1, NumberGuessSession(7))
+
+    clock[0] += store.refresh_after / 2
+    changes = store._conn.total_changes
+    assert store.get(1) is not None
+    assert store._conn.total_changes == changes and touched(store, 1) == 1000.0
+
+    clock[0] += store.refresh_after
+    assert store.get(1) is not None
+    assert touched(store, 1) == clock[0]
+
+
+def test_contains_neither_unpickles_nor_writes(store, monkeypatch):
+    store.set(1, NumberGuessSession(7))
+    monkeypatch.setattr(sessions.pickle, 'loads', lambda data: pytest.fail("unpickled"))
+    changes = store._conn.total_changes
+    assert 1 in store and 2 not in store
+    assert store._conn.total_changes == changes
+
+
+def test_expired_sessions_are_absent(store, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(sessions.time, 'time', lambda: clock[0])
+    store.set(1, NumberGuessSession(7))
+    clock[0] += store.ttl + 1
+    assert 1 not in store
+    assert store.get(1) is None and store.expirations == 1
+
+
+def test_prune_keeps_the_most_recently_used(store, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(sessions.time, 'time', lambda: clock[0])
+    for key in range(5):
+        clock[0] += 1
+        store.set(key, key)
+    assert len(store) == 3 and store.evictions == 2
+    assert [key in store for key in range(5)] == [False, False, True, True, True]
+
+
+def test_memory_store_evicts_least_recently_used():
+    store = SessionStore(max_size=2)
+    store.set('a', 1)
+    store.set('b', 2)
+    assert store.get('a') == 1
+    store.set('c', 3)
+    assert store.keys() == ['a', 'c'] and store.evictions == 1
@@ -0,0 +1,163 @@
+import asyncio
+import os
+import random
+
+import pytest
+
+import stats
+from stats import RECORD, Leaderboard, StatsEngine
+
+
+def expected_ranking(scores: dict):
+    """(user id, score) best first; ties in the order users reached the score"""
+    return sorted(((user, score) for user, (score, _) in scores.items() if score),
+                  key=lambda item: (-item[1], scores[item[0]][1]))
+
+
+def test_leaderboard_matches_a_sorted_list():
+    rng = random.Random(7)
+    board = Leaderboard(capacity=4)  # small, so it has to grow
+    scores = {}  # user -> (score, order in which it was reached)
+    for step in range(3000):
+        user = rng.randrange(200)
+        score = max(0, scores.get(user, (0, 0))[0] + rng.choice((1, 1, 1, 2, -1, -5)))
+        if score != scores.get(user, (0, 0))[0]:
+            scores[user] = (score, step)
+        board.set(user, score)
+
+        if step % 100 == 0:
+            ranking = expected_ranking(scores)
+            assert len(board) == len(ranking)
+            assert board.top(15) == ranking[:15]
+            for user, (score, _) in scores.items():
+                better = sum(1 for _, s in ranking if s > score)
+                assert board.rank(user) == (better + 1 if score else None)
+    assert board.top(len(board) + 10) == expected_ranking(scores)
+
+
+def test_ties_keep_arrival_order_and_share_a_rank():
+    board = Leaderboard()
+    for user in (3, 1, 2):
+        board.set(user, 5)
+    board.set(4, 7)
+    assert board.top(4) == [(4, 7), (3, 5), (1, 5), (2, 5)]
+    assert [board.rank(user) for user in (4, 3, 1, 2)] == [1, 2, 2, 2]
+    board.set(4, 0)
+    assert board.rank(4) is None and len(board) == 3
+
+
+def play(engines, reference, rng, steps: int):
+    """Random commands and games, each user always on the same engine"""
+    for step in range(steps):
+        user = rng.randrange(40)
+        engine = engines[user % len(engines)]
+        if rng.random() < 0.3:
+            command = rng.choice(('roll', 'joke', 'nope'))
+            for target in (engine, reference):
+                target.record_command(user, command)
+        else:
+            won = rng.random() < 0.5
+            for target in (engine, reference):
+                target.record_game(user, 'quiz', won)
+
+
+def snapshot(engine: StatsEngine):
+    players = {user: (p.games, p.wins, p.streak, p.best_streak) for user, p in engine.players.items()}
+    ranked = {user: engine.rank(user)[0] for user in players}
+    return engine.events, dict(engine.commands), players, ranked
+
+
+@pytest.fixture
+def reference(tmp_path):
+    engine = StatsEngine(str(tmp_path / 'reference.log'), compact_bytes=1 << 40)
+    engine.load()
+    yield engine
+    os.close(engine._fd)
+    os.close(engine._lock_fd)
+
+
+def test_log_is_replayed_on_load(tmp_path, reference):
+    async def scenario():
+        engine = StatsEngine(str(tmp_path / 'events.log'))
+        engine.load()
+        play([engine], reference, random.Random(1), 500)
+        await engine.stop()
+        restarted = StatsEngine(engine.path)
+        restarted.load()
+        return restarted
+
+    restarted = asyncio.run(scenario())
+    assert snapshot(restarted) == snapshot(reference)
+    assert restarted.compactions == 0
+
+
+def test_writers_sharing_a_compacted_log_converge(tmp_path, reference):
+    async def scenario():
+        path = str(tmp_path / 'events.log')
+        writers = [StatsEngine(path, writer=i, compact_bytes=40 * RECORD.size) for i in range(2)]
+        for writer in writers:
+            writer.load()
+        rng = random.Random(2)
+        for _ in range(30):
+            play(writers, reference, rng, 25)
+            for writer in writers:
+                await writer.flush()
+        for writer in writers:
+            await writer.flush()
+        live = [snapshot(writer) for writer in writers]
+        compactions = sum(writer.compactions for writer in writers)
+        for writer in writers:
+            await writer.stop()
+        restarted = StatsEngine(path)
+        restarted.load()
+        return live, compactions, restarted
+
+    live, compactions, restarted = asyncio.run(scenario())
+    assert compactions >= 5
+    assert live[0] == live[1] == snapshot(reference)
+    assert snapshot(restarted) == snapshot(reference)
+    # Only the events since the last compaction are left to replay
+    assert os.path.getsize(restarted.path) < 40 * RECORD.size
+
+
+def test_crash_between_checkpoint_and_rotation_counts_nothing_twice(tmp_path, reference, monkeypatch):
+    async def scenario():
+        engine = StatsEngine(str(tmp_path / 'events.log'), compact_bytes=1 << 40)
+        engine.load()
+        play([engine], reference, random.Random(3), 300)
+        await engine.flush()
+        return engine
+
+    engine = asyncio.run(scenario())
+    replace = os.replace
+
+    def crash_after_checkpoint(source, target):
+        replace(source, target)
+        if target == engine.checkpoint_path:
+            raise OSError("simulated crash")
+
+    monkeypatch.setattr(stats.os, 'replace', crash_after_checkpoint)
+    engine.compact_bytes = 1
+    with pytest.raises(OSError):
+        engine._compact()
+    monkeypatch.setattr(stats.os, 'replace', replace)
+    assert os.path.getsize(engine.path) == 300 * RECORD.size  # the log was not rotated
+
+    restarted = StatsEngine(engine.path)
+    restarted.load()
+    assert snapshot(restarted) == snapshot(reference)
+
+
+def test_trailing_partial_record_is_ignored(tmp_path, reference):
+    async def scenario():
+        engine = StatsEngine(str(tmp_path / 'events.log'))
+        engine.load()
+        play([engine], reference, random.Random(4), 50)
+        await engine.stop()
+        with open(engine.path, 'ab') as f:
+            f.write(b'\x01\x02\x03')  # a write cut short by a crash
+        restarted = StatsEngine(engine.path)
+        restarted.load()
+        return restarted
+
+    assert snapshot(asyncio.run(scenario())) == snapshot(reference)
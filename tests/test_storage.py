@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from sessions import UserRecord
+from storage import MemoryUserStore, SQLiteUserStore, UserStats
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryUserStore()
+    return SQLiteUserStore(str(tmp_path / 'users.db'))
+
+
+def test_commands_are_counted_for_stored_users(backend):
+    async def scenario():
+        users = UserStats(backend)
+        await users.save_profile(1, 'Ada', 'ada', '2024-01-01')
+        users.record_command(1)
+        await users.flush()
+        users.record_command(1)
+        await users.flush()
+        return backend.load_user(1)
+
+    record = asyncio.run(scenario())
+    assert (record.name, record.commands_used) == ('Ada', 2)
+
+
+def test_commands_before_start_in_the_same_batch_count(backend):
+    async def scenario():
+        users = UserStats(backend)
+        users.record_command(1)
+        await users.save_profile(1, 'Ada', 'ada', '2024-01-01')
+        await users.flush()
+        return backend.load_user(1)
+
+    assert asyncio.run(scenario()).commands_used == 1
+
+
+def test_users_without_a_profile_are_skipped(backend):
+    async def scenario():
+        users = UserStats(backend)
+        users.record_command(2)
+        await users.flush()
+        skipped = backend.write_batch({}, {3: 1})
+        # Known to have no profile: not even queued
+        users.record_command(2)
+        pending = users.stats()['pending_increments']
+        await users.save_profile(2, 'Bob', None, '2024-01-02')
+        users.record_command(2)
+        await users.flush()
+        return skipped, pending, backend.load_user(2), backend.user_ids_after(0, 10)
+
+    skipped, pending, record, stored = asyncio.run(scenario())
+    assert skipped == {3} and pending == 0
+    assert record.commands_used == 1
+    assert stored == [2]
+
+
+def test_unknown_users_are_checked_again_after_the_ttl(backend):
+    async def scenario():
+        users = UserStats(backend, unknown_ttl=0.0)
+        assert await users.get(4) is None
+        # Another worker saves the profile
+        backend.write_batch({4: UserRecord('Cy', None, '2024-01-03')}, {})
+        users.record_command(4)
+        await users.flush()
+        return backend.load_user(4)
+
+    assert asyncio.run(scenario()).commands_used == 1
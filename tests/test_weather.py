@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from weather import CircuitBreaker, MockWeatherProvider, WeatherError, WeatherService
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_fresh_entry_is_served_from_cache():
+    async def scenario():
+        provider = MockWeatherProvider()
+        service = WeatherService(provider, ttl=60)
+        first = await service.get('Oslo')
+        second = await service.get('  oslo ')
+        return provider, service, first, second
+
+    provider, service, first, second = run(scenario())
+    assert first == second
+    assert provider.calls == 1
+    assert service.hits == 1 and service.misses == 1
+
+
+def test_concurrent_misses_share_one_fetch():
+    async def scenario():
+        provider = MockWeatherProvider(delay=0.05)
+        service = WeatherService(provider)
+        results = await asyncio.gather(*(service.get('Lima') for _ in range(10)))
+        return provider, service, results
+
+    provider, service, results = run(scenario())
+    assert provider.calls == 1
+    assert service.coalesced == 9
+    assert all(result == results[0] for result in results)
+
+
+def test_stale_entry_is_served_while_one_refresh_runs():
+    async def scenario():
+        provider = MockWeatherProvider()
+        service = WeatherService(provider, ttl=0.01, stale_ttl=60)
+        first = await service.get('Rome')
+        fetched_at = service._cache['rome'][0]
+        await asyncio.sleep(0.02)
+        provider.delay = 0.05
+        # Served at once from the stale entry, without waiting for the refresh
+        stale = await asyncio.wait_for(service.get('Rome'), 0.02)
+        again = await asyncio.wait_for(service.get('Rome'), 0.02)
+        refreshing = 'rome' in service._inflight
+        await asyncio.sleep(0.1)
+        refreshed = service._cache['rome'][0] > fetched_at and 'rome' not in service._inflight
+        return provider, service, first, stale, again, refreshing, refreshed
+
+    provider, service, first, stale, again, refreshing, refreshed = run(scenario())
+    assert stale == again == first
+    assert refreshing and refreshed
+    assert provider.calls == 2  # the first fetch and one background refresh
+    assert service.stale_hits == 2
+
+
+def test_breaker_opens_falls_back_to_cache_and_recovers():
+    async def scenario():
+        provider = MockWeatherProvider()
+        service = WeatherService(provider, ttl=0.01, stale_ttl=0.01)
+        service.breaker = CircuitBreaker(threshold=2, cooldown=0.1)
+        cached = await service.get('Kyiv')
+        await asyncio.sleep(0.02)
+
+        provider.fail = True
+        outage = [await service.get('Kyiv') for _ in range(2)]
+        opened = service.breaker.opened_at is not None
+        calls_when_open = provider.calls
+        while_open = await service.get('Kyiv')
+        skipped_upstream = provider.calls == calls_when_open
+        with pytest.raises(WeatherError):
+            await service.get('Paris')  # nothing cached to fall back on
+
+        await asyncio.sleep(0.12)
+        provider.fail = False
+        recovered = await service.get('Kyiv')
+        return service, cached, outage, opened, while_open, skipped_upstream, recovered
+
+    service, cached, outage, opened, while_open, skipped_upstream, recovered = run(scenario())
+    assert outage == [cached, cached]
+    assert opened
+    assert while_open == cached
+    assert skipped_upstream
+    assert recovered == cached
+    assert service.breaker.opened_at is None and service.breaker.failures == 0
@@ -0,0 +1,115 @@
+"""
+🚦 Inbound throttling
+Per-user budgets checked before any handler runs. Each update costs a few
+units (commands that fan out into several API calls cost more), budgets
+refill over a sliding window, and repeated presses of the same button are
+collapsed into one.
+"""
+
+import time
+
+from sessions import SessionStore
+
+ALLOWED = 'allowed'
+THROTTLED = 'throttled'  # first rejection in a window: tell the user
+SILENCED = 'silenced'  # later rejections: drop quietly
+DUPLICATE = 'duplicate'
+
+# Roughly the number of Bot API calls each command makes
+DEFAULT_COSTS = {'roll': 4, 'weather': 2}
+
+
+class UserWindow:
+    """Sliding-window counter: current and previous fixed-window totals"""
+    __slots__ = ('window_start', 'previous', 'current', 'notified')
+
+    def __init__(self, window_start: float):
+        self.window_start = window_start
+        self.previous = 0
+        self.current = 0
+        self.notified = False
+
+
+class InboundThrottle:
+    """Sliding-window cost budget per user, plus button-press collapsing
+
+    Usage in the last window counts in proportion to how much of it still
+    overlaps the sliding window, so two fixed counters per user approximate
+    a true sliding log. Idle users expire from the bounded store on their
+    own. A limit of 0 disables budgets (press collapsing stays on).
+    """
+
+    def __init__(self, limit: float = 30, window: float = 60, costs: dict = None, default_cost: float = 1,
+                 press_window: float = 1.0, max_users: int = 100000):
+        self.limit = limit
+        self.window = window
+        self.costs = DEFAULT_COSTS if costs is None else costs
+        self.default_cost = default_cost
+        self._users = SessionStore(max_size=max_users, ttl=2 * window)
+        self._presses = SessionStore(max_size=max_users, ttl=press_window) if press_window else None
+        self.throttled = 0
+        self.duplicates = 0
+
+    def __len__(self):
+        return len(self._users)
+
+    def cost(self, update) -> float:
+        """Cost of an update from the command or button it triggers"""
+        query = update.callback_query
+        if query is not None:
+            name = query.data or ''
+        else:
+            message = update.effective_message
+            text = message.text if message is not None else None
+            if not text or not text.startswith('/'):
+                return self.default_cost
+            name = text[1:].split(None, 1)[0].split('@', 1)[0] if len(text) > 1 else ''
+        return self.costs.get(name.lower(), self.default_cost)
+
+    def check(self, update, now: float = None) -> str:
+        user = update.effective_user
+        if user is None:
+            return ALLOWED
+        query = update.callback_query
+        if query is not None and self._presses is not None:
+            message = query.message
+            key = (user.id, message.message_id if message else query.inline_message_id, query.data)
+            if self._presses.get(key) is not None:
+                self.duplicates += 1
+                return DUPLICATE
+            self._presses.set(key, True)
+        if not self.limit:
+            return ALLOWED
+        return self.charge(user.id, self.cost(update), now)
+
+    def charge(self, user_id: int, cost: float, now: float = None) -> str:
+        """Spend cost from the user's budget if it fits"""
+        now = time.monotonic() if now is None else now
+        state = self._users.get(user_id)
+        if state is None:
+            state = UserWindow(now)
+            self._users.set(user_id, state)
+        elapsed = now - state.window_start
+        if elapsed >= self.window:
+            windows = int(elapsed // self.window)
+            state.previous = state.current if windows == 1 else 0
+            state.current = 0
+            state.window_start += windows * self.window
+            state.notified = False
+            elapsed -= windows * self.window
+        used = state.previous * (1 - elapsed / self.window) + state.current
+        if used + cost <= self.limit:
+            state.current += cost
+            return ALLOWED
+        self.throttled += 1
+        if state.notified:
+            return SILENCED
+        state.notified = True
+        return THROTTLED
+
+    def stats(self) -> dict:
+        return {
+            'tracked_users': len(self._users),
+            'throttled': self.throttled,
+            'duplicate_presses': self.duplicates,
+        }
@@ -0,0 +1,220 @@
+"""
+🌤️ Weather service
+OpenWeatherMap client on one pooled aiohttp session, with a per-city TTL
+cache, single-flight request coalescing, stale-while-revalidate and a
+circuit breaker. MockWeatherProvider stands in for the API in tests.
+"""
+
+import asyncio
+import logging
+import random
+import time
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+API_URL = 'https://api.openweathermap.org/data/2.5/weather'
+
+
+class WeatherError(Exception):
+    """Weather lookup failed; the message is safe to show to users"""
+
+
+class CityNotFound(WeatherError):
+    pass
+
+
+class OpenWeatherMapProvider:
+    """Fetches current conditions over a long-lived, pooled session"""
+
+    def __init__(self, api_key: str, timeout: float = 5.0, pool_size: int = 20):
+        self.api_key = api_key
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, ttl_dns_cache=300, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    async def fetch(self, city: str) -> dict:
+        params = {'q': city, 'appid': self.api_key, 'units': 'metric'}
+        async with self._get_session().get(API_URL, params=params) as response:
+            if response.status == 404:
+                raise CityNotFound(f"I couldn't find a city called {city.title()}!")
+            response.raise_for_status()
+            data = await response.json()
+        return {
+            'city': data.get('name', city.title()),
+            'description': data['weather'][0]['description'],
+            'temp': data['main']['temp'],
+            'feels_like': data['main']['feels_like'],
+            'humidity': data['main']['humidity'],
+            'wind': data.get('wind', {}).get('speed', 0),
+        }
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class MockWeatherProvider:
+    """Deterministic offline provider; can simulate latency and outages"""
+
+    def __init__(self, delay: float = 0.0, fail: bool = False):
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    async def fetch(self, city: str) -> dict:
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.fail:
+            raise aiohttp.ClientError("mock provider outage")
+        rng = random.Random(city.lower())
+        return {
+            'city': city.title(),
+            'description': rng.choice(['clear sky', 'few clouds', 'light rain', 'overcast clouds']),
+            'temp': round(rng.uniform(-5, 30), 1),
+            'feels_like': round(rng.uniform(-8, 32), 1),
+            'humidity': rng.randint(30, 95),
+            'wind': round(rng.uniform(0, 12), 1),
+        }
+
+    async def close(self):
+        pass
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures; lets one trial call through after the cooldown"""
+
+    def __init__(self, threshold: int = 5, cooldown: float = 30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            # Half-open: the next failure re-opens immediately
+            self.opened_at = None
+            self.failures = self.threshold - 1
+            return True
+        return False
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+class WeatherService:
+    """Cached, coalesced weather lookups
+
+    Fresh entries (younger than ttl) are served directly. Stale entries
+    (younger than stale_ttl) are served immediately while one background
+    refresh runs. Concurrent misses for the same city share one upstream
+    call.
+    """
+
+    def __init__(self, provider, ttl: float = 600, stale_ttl: float = 3600, max_entries: int = 1000):
+        self.provider = provider
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.breaker = CircuitBreaker()
+        self._cache = {}  # city key -> (fetched_at, data)
+        self._inflight = {}  # city key -> Future
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get(self, city: str) -> dict:
+        key = ' '.join(city.lower().split())
+        entry = self._cache.get(key)
+        now = time.monotonic()
+        if entry is not None:
+            age = now - entry[0]
+            if age < self.ttl:
+                self.hits += 1
+                return entry[1]
+            if age < self.stale_ttl:
+                self.stale_hits += 1
+                if key not in self._inflight and self.breaker.allow():
+                    self._start_fetch(key, city)
+                return entry[1]
+
+        self.misses += 1
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+        elif self.breaker.allow():
+            future = self._start_fetch(key, city)
+        elif entry is not None:
+            # Upstream is down: anything we have beats an error
+            return entry[1]
+        else:
+            raise WeatherError("Weather service is temporarily unavailable. Try again in a minute!")
+        try:
+            return await asyncio.shield(future)
+        except CityNotFound:
+            raise
+        except WeatherError:
+            if entry is not None:
+                return entry[1]
+            raise
+
+    def _start_fetch(self, key: str, city: str) -> asyncio.Future:
+        future = asyncio.ensure_future(self._fetch(key, city))
+        self._inflight[key] = future
+        # Background refreshes may finish with nobody awaiting them
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        return future
+
+    async def _fetch(self, key: str, city: str) -> dict:
+        try:
+            data = await self.provider.fetch(city)
+        except CityNotFound:
+            self.breaker.success()
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError, KeyError, ValueError) as e:
+            self.breaker.failure()
+            logger.warning("Weather lookup for %r failed: %s", city, e)
+            raise WeatherError("Weather service is having trouble right now. Please try again later!")
+        finally:
+            self._inflight.pop(key, None)
+        self.breaker.success()
+        self._cache.pop(key, None)
+        if len(self._cache) >= self.max_entries:
+            # Oldest fetch goes first
+            self._cache.pop(next(iter(self._cache)))
+        self._cache[key] = (time.monotonic(), data)
+        return data
+
+    async def close(self):
+        await self.provider.close()
+
+    def stats(self) -> dict:
+        return {
+            'cached': len(self._cache),
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'breaker_open': self.breaker.opened_at is not None,
+        }